@@ -0,0 +1,8 @@
+"""
+被测模块都在 文件清洗/ 中，彼此按脚本方式导入（from judgment_cleaner import ...），
+这里把该目录加入导入路径，在仓库根目录直接运行 pytest 即可。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "文件清洗"))
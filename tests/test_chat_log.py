@@ -0,0 +1,77 @@
+"""chat_log：按列解析与逐条解析的结果相同，按时间归并与全部读入后排序的结果相同"""
+import datetime
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+import chat_log  # noqa: E402
+from chat_log import (  # noqa: E402
+    ChatEntries, create_rounds_nonIsaac_to_Isaac, iter_blocks_merged_by_speaker, iter_entries_in_time_order,
+    iter_file_entries, iter_merged_by_speaker, load_entries, load_entries_in_time_order, parse_file_columnar,
+)
+
+# 各种不规范的写法：开头的正文、多余与全角空白、\r\n、只有空白的消息、人名后的其他文字、以控制字符结尾的人名
+IRREGULAR_EXPORT = (
+    "导出说明\n"
+    "2022-11-16 14:20:06 Isaac\n hi \n\n  there\r\n"
+    "  2022-11-16  14:20:07\tAlice extra words\n"
+    "　\n"
+    "2022-11-16 14:20:07 张三\n你好\n"
+    "2022-11-16 14:20:08 Bob\n   \n　\n"
+    "2022-11-16 14:20:09 　李四\n内容　\n"
+    "　2022-11-16 14:20:10 Isaac\r\nok\r\n"
+    "2022-11-16 14:20:11 Eve\x1f\ntext\n"
+    "2022-11-16 14:20:12 Isaac\n\x1ctail"
+)
+
+def _random_export(path, seed, count=300, shuffle=False):
+    rng = random.Random(seed)
+    time = datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=seed * 7)
+    blocks = []
+    for i in range(count):
+        time += datetime.timedelta(seconds=rng.choice([0, 0, 1, 5, 60]))
+        body = "\n".join(f"消息 {seed}-{i}-{k}" for k in range(rng.randint(0, 3)))
+        separator = rng.choice([" ", "  "])
+        blocks.append(f"{time:%Y-%m-%d}{separator}{time:%H:%M:%S} {rng.choice(['Isaac', 'Alice', 'Bob'])}\n{body}\n")
+    if shuffle:
+        rng.shuffle(blocks)
+    path.write_text("开头的说明\n" + "".join(blocks), encoding="utf-8")
+    return str(path)
+
+@pytest.fixture
+def exports(tmp_path):
+    paths = [_random_export(tmp_path / f"chat{i}.txt", i, shuffle=i == 2) for i in range(4)]
+    irregular = tmp_path / "irregular.txt"
+    irregular.write_bytes(IRREGULAR_EXPORT.encode("utf-8"))
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    return paths + [str(irregular), str(empty)]
+
+def test_columnar_parser_matches_iter_file_entries(exports):
+    for path in exports:
+        for chunk_size in (chat_log.READ_CHUNK_BYTES, 64):
+            with parse_file_columnar(path, chunk_size) as entries:
+                assert list(entries) == list(iter_file_entries(path))
+
+def test_sorted_table_matches_streaming_merge(exports):
+    expected = list(iter_entries_in_time_order(exports))
+    with load_entries_in_time_order(exports) as entries:
+        assert list(entries) == expected
+        assert list(entries.iter_merged_by_speaker()) == list(iter_merged_by_speaker(expected))
+
+@pytest.mark.parametrize("block_size", [1, 7, chat_log.MERGE_BLOCK_SIZE])
+def test_k_way_merge_matches_stable_sort(exports, block_size):
+    expected = list(iter_entries_in_time_order(exports))
+    with load_entries(exports) as entries:
+        blocks = list(entries.iter_time_ordered(block_size))
+        assert [entry for block in blocks for entry in block] == expected
+        merged = list(iter_blocks_merged_by_speaker(entries.iter_time_ordered(block_size)))
+    assert merged == list(iter_merged_by_speaker(expected))
+    assert create_rounds_nonIsaac_to_Isaac(merged) == create_rounds_nonIsaac_to_Isaac(iter_merged_by_speaker(expected))
+
+def test_concat_renumbers_speakers(exports):
+    tables = [parse_file_columnar(path) for path in exports[:2]]
+    with ChatEntries.concat(tables) as entries:
+        assert list(entries) == [entry for path in exports[:2] for entry in iter_file_entries(path)]
+        assert len(set(entries.speakers)) == len(entries.speakers)
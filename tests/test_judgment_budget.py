@@ -0,0 +1,79 @@
+"""judgment_budget：剥离前后提取的结果相同，超出预算的页面被隔离，时间预算在非主线程中改由子进程执行"""
+import io
+import json
+import random
+import threading
+
+import pytest
+
+import judgment_cleaner
+from benchmark_cleaner import make_judgment_html
+from judgment_budget import BudgetExceeded, read_stripped_html, time_limit_blocked
+from judgment_cleaner import TaskRunner, extract_case_fields, run_parallel_extraction
+
+# 注释与 CDATA 中的标签、正文中形如属性的 data:、跨块的标签与属性值、大小写与各种引号
+TRICKY_BODY = (
+    '<p>甲=data:不是属性 x = "data:也不是"</p><!-- <script> 注释里的脚本 </div> -->'
+    '<img src="data:image/png;base64,' + "QUJD" * 500 + '" alt="图">'
+    "<![CDATA[ <style> 不是样式 ]]><p>注释之后的正文</p>"
+    "<SCRIPT type=text/javascript>var a = '</div>'; b = data:1;</SCRIPT >"
+    "<style>p { background: url(data:x) }</style><p title='a>b' data-src=DATA:xyz>属性中的 > 号</p>"
+    '<span a=b"c>无引号的值</span><b=data:x>标签名</b=data:x><!DOCTYPE html><p>结尾</p>'
+)
+TRICKY_PAGE = ('<div class="detail_bigtitle">标题</div><div class="detail_txt">' + TRICKY_BODY
+               + '</div><div class="compile">责任编辑：王五</div>')
+
+def _strip(html, chunk_size):
+    return read_stripped_html(io.BytesIO(html.encode("utf-8")), chunk_size=chunk_size).decode("utf-8")
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1024 * 1024])
+def test_stripping_keeps_extracted_fields(chunk_size):
+    stripped = _strip(TRICKY_PAGE, chunk_size)
+    assert len(stripped) < len(TRICKY_PAGE) - 1500
+    assert "var a" not in stripped and "QUJD" not in stripped
+    assert "<!-- <script> 注释里的脚本 </div> -->" in stripped and "甲=data:不是属性" in stripped
+    assert extract_case_fields(stripped, "stream") == extract_case_fields(TRICKY_PAGE, "stream")
+
+def test_stripping_keeps_extracted_fields_with_bs4():
+    pytest.importorskip("bs4")
+    rng = random.Random(0)
+    for html in [TRICKY_PAGE] + [make_judgment_html(rng, size_kb=8) for _ in range(3)]:
+        assert extract_case_fields(_strip(html, 97), "bs4") == extract_case_fields(html, "bs4")
+
+def test_memory_budget_is_checked_after_stripping():
+    page = TRICKY_PAGE.encode("utf-8")
+    assert read_stripped_html(io.BytesIO(page), max_bytes=len(page) - 1500)
+    with pytest.raises(BudgetExceeded):
+        read_stripped_html(io.BytesIO(page), max_bytes=100)
+
+def test_time_limited_tasks_leave_non_main_threads():
+    assert TaskRunner(1, time_limited=True).in_process
+    runners = []
+    thread = threading.Thread(target=lambda: runners.extend([TaskRunner(1, time_limited=True), TaskRunner(1)]))
+    thread.start()
+    thread.join()
+    assert time_limit_blocked() is False
+    assert [runner.in_process for runner in runners] == [False, True]
+
+def test_oversized_page_is_quarantined_until_budget_changes(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    rng = random.Random(1)
+    (input_dir / "a.html").write_text(make_judgment_html(rng, size_kb=4).replace(
+        "</body>", '<img src="data:image/png;base64,' + "A" * 200000 + '"></body>'), encoding="utf-8")
+    (input_dir / "b.html").write_text(make_judgment_html(rng, size_kb=200), encoding="utf-8")
+
+    def run(max_html_bytes):
+        return run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream",
+                                       incremental=True, max_html_bytes=max_html_bytes)
+
+    first = run(64 * 1024)
+    assert (first["success"], first["fail"], first["quarantined"]) == (1, 0, 1)
+    report = [json.loads(line) for line in open(first["error_report"], encoding="utf-8")]
+    assert [(error["source"], error["quarantined"]) for error in report] == [("b.html", True)]
+    assert not (output_dir / judgment_cleaner.output_file_name_for("b.html")).exists()
+    second = run(64 * 1024)
+    assert (second["success"], second["quarantined"], second["skipped"]) == (0, 0, 2)
+    third = run(None)
+    assert (third["success"], third["quarantined"]) == (1, 0)
@@ -0,0 +1,258 @@
+"""judgment_cleaner：两种解析方式的输出一致，增量清单与分片输出的维护，压缩包输入，各阶段耗时与错误报告，命令行的退出码"""
+import json
+import os
+import random
+import tarfile
+import zipfile
+
+import pytest
+
+import judgment_cleaner
+from benchmark_cleaner import generate_corpus, make_judgment_html
+from judgment_cleaner import (
+    MANIFEST_FILE_NAME, extract_case_fields, list_shards, open_shard, output_file_name_for, run_parallel_extraction,
+)
+
+# 容易让两种解析方式产生差异的写法：实体、注释、CDATA、未闭合与大写的标签、嵌套的同名元素、字段缺失等
+EDGE_CASES = [
+    '<div class="detail_bigtitle">甲&amp;乙&nbsp;纠纷&#x4e00;案&copy;</div>'
+    '<div class="detail_txt"><p>第一段<br>换行<p>未闭合的段落<!-- 注释 --><P>大写</P></div>'
+    '<div class="compile">责任编辑：<b>王</b>五</div>',
+    '<div class="detail_txt"><div class="detail_txt">嵌套</div><div>内层</div>外层<script>var a = "</div>";</script>'
+    '<style>p {}</style></div><div class="compile">编辑</div>',
+    '<html><body><div class="detail_bigtitle">只有标题</div></body></html>',
+    '<div class="detail_txt"><![CDATA[ 数据 ]]><p>&#12345;&#x;&bogus; &lt;p&gt;</p><img src="a.png"/></div>',
+    '<DIV CLASS="detail_bigtitle">属性大写</DIV><div class=detail_txt>无引号属性<p>段落</div>',
+    '<div class="other detail_txt extra">多个类名<table><tr><td>单元格</td><td>二</td></tr></table></div>',
+    '',
+]
+
+def _write_corpus(directory, count=6, seed=1):
+    generate_corpus(str(directory), count, size_kb=4, seed=seed)
+    return sorted(os.listdir(directory))
+
+def _read_shard_records(output_dir):
+    records = []
+    for shard in list_shards(str(output_dir)):
+        with open_shard(os.path.join(str(output_dir), shard), "rb") as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+# ------------------ 解析方式 ------------------ #
+@pytest.mark.parametrize("html", EDGE_CASES)
+def test_stream_backend_matches_bs4_on_edge_cases(html):
+    pytest.importorskip("bs4")
+    assert extract_case_fields(html, "stream") == extract_case_fields(html, "bs4")
+
+def test_stream_backend_matches_bs4_on_generated_pages():
+    pytest.importorskip("bs4")
+    rng = random.Random(0)
+    for _ in range(5):
+        html = make_judgment_html(rng, size_kb=8)
+        assert extract_case_fields(html, "stream") == extract_case_fields(html, "bs4")
+
+def test_stream_backend_output_files_are_byte_identical(tmp_path):
+    pytest.importorskip("bs4")
+    names = _write_corpus(tmp_path / "in")
+    outputs = {}
+    for backend in ("bs4", "stream"):
+        output_dir = tmp_path / backend
+        output_dir.mkdir()
+        stats = run_parallel_extraction(str(tmp_path / "in"), str(output_dir), workers=1, backend=backend)
+        assert stats["success"] == len(names) and stats["fail"] == 0
+        outputs[backend] = {name: (output_dir / output_file_name_for(name)).read_bytes() for name in names}
+    assert outputs["stream"] == outputs["bs4"]
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        extract_case_fields("<div></div>", "lxml")
+
+# ------------------ 增量清单 ------------------ #
+def test_incremental_run_skips_unchanged_and_cleans_up(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    output_dir.mkdir()
+    names = _write_corpus(input_dir)
+
+    def run():
+        return run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream",
+                                       incremental=True)
+
+    first = run()
+    assert first["success"] == len(names)
+    assert (output_dir / MANIFEST_FILE_NAME).exists()
+
+    second = run()
+    assert (second["success"], second["skipped"]) == (0, len(names))
+
+    changed, removed = names[0], names[1]
+    path = input_dir / changed
+    path.write_bytes(path.read_bytes().replace("原告".encode("utf-8"), "申请人".encode("utf-8"), 1))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    (input_dir / removed).unlink()
+    third = run()
+    assert (third["success"], third["skipped"], third["removed"]) == (1, len(names) - 2, 1)
+    assert not (output_dir / output_file_name_for(removed)).exists()
+    record = json.loads((output_dir / output_file_name_for(changed)).read_text(encoding="utf-8"))
+    assert "申请人" in json.dumps(record, ensure_ascii=False)
+
+def test_manifest_is_ignored_when_settings_change(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    output_dir.mkdir()
+    names = _write_corpus(input_dir, count=3)
+    run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream", incremental=True)
+    stats = run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream",
+                                    incremental=True, sections=False)
+    assert stats["success"] == len(names)
+
+# ------------------ 分片输出 ------------------ #
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_sharded_output_rotates_and_replaces_stale_records(tmp_path, compression):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    output_dir.mkdir()
+    names = _write_corpus(input_dir, count=7)
+
+    def run(incremental):
+        return run_parallel_extraction(
+            str(input_dir), str(output_dir), workers=1, backend="stream", incremental=incremental,
+            output_mode="sharded", shard_max_records=3, compression=compression)
+
+    run(False)
+    shards = list_shards(str(output_dir))
+    assert len(shards) == 3
+    assert all(shard.endswith(judgment_cleaner.SHARD_COMPRESSIONS[compression]) for shard in shards)
+    assert [record["source"] for record in _read_shard_records(output_dir)] == names
+
+    changed, removed = names[2], names[5]
+    path = input_dir / changed
+    path.write_bytes(path.read_bytes().replace("原告".encode("utf-8"), "申请人".encode("utf-8"), 1))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    (input_dir / removed).unlink()
+    stats = run(True)
+    assert (stats["success"], stats["removed"]) == (1, 1)
+    records = _read_shard_records(output_dir)
+    assert sorted(record["source"] for record in records) == sorted(set(names) - {removed})
+    updated = next(record for record in records if record["source"] == changed)
+    assert "申请人" in json.dumps(updated, ensure_ascii=False)
+
+    # 非增量运行先删除旧分片，不会留下重复的记录
+    run(False)
+    assert [record["source"] for record in _read_shard_records(output_dir)] == sorted(set(names) - {removed})
+    assert len(list_shards(str(output_dir))) == 2
+
+# ------------------ 压缩包输入 ------------------ #
+def _pack_corpus(input_dir, names, archive_dir):
+    """把语料分别打成 zip、tar.gz 与 tar，返回 {来源名: 原文件名}"""
+    sources = {}
+    groups = {"a.zip": names[:3], "b.tar.gz": names[3:5], "c.tar": names[5:]}
+    for archive, members in groups.items():
+        path = archive_dir / archive
+        if archive.endswith(".zip"):
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+                for name in members:
+                    zf.write(input_dir / name, f"dir/{name}")
+        else:
+            with tarfile.open(path, "w:gz" if archive.endswith(".gz") else "w") as tf:
+                for name in members:
+                    tf.add(input_dir / name, f"dir/{name}")
+        sources.update((f"{archive}:dir/{name}", name) for name in members)
+    return sources
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_archive_members_match_plain_files(tmp_path, workers):
+    plain_dir, archive_dir = tmp_path / "plain", tmp_path / "archives"
+    archive_dir.mkdir()
+    names = _write_corpus(plain_dir, count=7)
+    sources = _pack_corpus(plain_dir, names, archive_dir)
+    for directory in ("plain_out", "archive_out", "ignored_out"):
+        (tmp_path / directory).mkdir()
+    run_parallel_extraction(str(plain_dir), str(tmp_path / "plain_out"), workers=1, backend="stream")
+    stats = run_parallel_extraction(str(archive_dir), str(tmp_path / "archive_out"), workers=workers,
+                                    backend="stream", incremental=True)
+    assert (stats["success"], stats["fail"]) == (len(names), 0)
+    for source, name in sources.items():
+        archived = tmp_path / "archive_out" / output_file_name_for(source)
+        assert archived.read_bytes() == (tmp_path / "plain_out" / output_file_name_for(name)).read_bytes()
+    again = run_parallel_extraction(str(archive_dir), str(tmp_path / "archive_out"), workers=workers,
+                                    backend="stream", incremental=True)
+    assert (again["success"], again["skipped"]) == (0, len(names))
+    ignored = run_parallel_extraction(str(archive_dir), str(tmp_path / "ignored_out"), workers=workers,
+                                      backend="stream", read_archives=False)
+    assert ignored["success"] == 0
+
+def test_changed_zip_member_and_unreadable_archive(tmp_path):
+    plain_dir, archive_dir, output_dir = tmp_path / "plain", tmp_path / "archives", tmp_path / "out"
+    archive_dir.mkdir()
+    output_dir.mkdir()
+    names = _write_corpus(plain_dir, count=7)
+    sources = _pack_corpus(plain_dir, names, archive_dir)
+    run_parallel_extraction(str(archive_dir), str(output_dir), workers=1, backend="stream", incremental=True)
+
+    # 重新打包 zip，只改动一个成员：其余成员的 CRC 不变，不必重新处理
+    changed = plain_dir / names[0]
+    changed.write_bytes(changed.read_bytes().replace("原告".encode("utf-8"), "申请人".encode("utf-8"), 1))
+    (archive_dir / "a.zip").unlink()
+    _pack_corpus(plain_dir, names, archive_dir)
+    # 损坏的压缩包记一次失败，其成员以前的输出不会被当成已删除
+    (archive_dir / "c.tar").write_bytes(b"not a tar archive")
+    stats = run_parallel_extraction(str(archive_dir), str(output_dir), workers=1, backend="stream",
+                                    incremental=True)
+    assert (stats["success"], stats["fail"], stats["removed"]) == (1, 1, 0)
+    assert [error["source"] for error in map(json.loads, open(stats["error_report"], encoding="utf-8"))] == ["c.tar"]
+    for source in sources:
+        assert (output_dir / output_file_name_for(source)).exists()
+
+# ------------------ 耗时与错误报告 ------------------ #
+def test_timings_slowest_files_and_error_report(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    output_dir.mkdir()
+    names = _write_corpus(input_dir, count=judgment_cleaner.SLOWEST_FILES_KEPT + 2)
+    (input_dir / "broken.html").write_bytes(b"<div class=\"detail_txt\">\xff\xfe</div>")
+    errors = []
+    stats = run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream",
+                                    error_callback=errors.append)
+    assert (stats["success"], stats["fail"]) == (len(names), 1)
+    assert set(stats["timings"]) == set(judgment_cleaner.TIMING_STAGES) | {"wall"}
+    assert stats["timings"]["parse"] > 0 and stats["timings"]["wall"] > 0
+    slowest = stats["slowest"]
+    assert len(slowest) == judgment_cleaner.SLOWEST_FILES_KEPT
+    assert [item["seconds"] for item in slowest] == sorted((item["seconds"] for item in slowest), reverse=True)
+    assert all(item["seconds"] == pytest.approx(sum(item[stage] for stage in judgment_cleaner.TIMING_STAGES))
+               for item in slowest)
+    lines = judgment_cleaner.format_timings(stats, top=3)
+    assert lines[0].startswith("各阶段耗时：") and lines[1] == "最慢的文件：" and len(lines) == 5
+
+    report = [json.loads(line) for line in open(stats["error_report"], encoding="utf-8")]
+    assert [(error["source"], error["stage"], error["exception"]) for error in report] == [
+        ("broken.html", "read", "UnicodeDecodeError")]
+    assert report[0]["path"] == str(input_dir / "broken.html") and "Traceback" in report[0]["traceback"]
+    assert errors == [{key: value for key, value in report[0].items() if key != "time"}]
+    assert stats["errors"] == [judgment_cleaner.format_error(errors[0])]
+
+    # 下次运行没有失败时，旧的错误报告被删除
+    (input_dir / "broken.html").unlink()
+    stats = run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream")
+    assert stats["error_report"] is None
+    assert not os.path.exists(os.path.join(str(output_dir), judgment_cleaner.ERROR_REPORT_FILE_NAME))
+
+# ------------------ 命令行 ------------------ #
+def test_cli_exit_codes_and_summary(tmp_path, capsys):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    names = _write_corpus(input_dir, count=3)
+    args = ["-i", str(input_dir), "-o", str(output_dir), "-w", "1", "--backend", "stream", "--incremental", "-q"]
+    assert judgment_cleaner.main(args) == 0
+    assert "处理完成：成功 3 个，失败 0 个" in capsys.readouterr().out
+    assert all((output_dir / output_file_name_for(name)).exists() for name in names)
+    assert judgment_cleaner.main(args) == 0
+    assert "未变化跳过 3 个" in capsys.readouterr().out
+
+    (input_dir / "broken.html").write_bytes(b"\xff\xfe")
+    assert judgment_cleaner.main(args) == 1
+    assert "错误报告：" in capsys.readouterr().out
+
+    (tmp_path / "rules.json").write_text("{}", encoding="utf-8")
+    assert judgment_cleaner.main(["-i", str(tmp_path / "missing"), "-o", str(output_dir)]) == 2
+    assert judgment_cleaner.main(args + ["--rules", str(tmp_path / "rules.json")]) == 2
+    assert judgment_cleaner.main(args + ["--watch", "--dedup", "drop"]) == 2
+    assert "错误：" in capsys.readouterr().err
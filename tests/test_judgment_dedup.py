@@ -0,0 +1,88 @@
+"""judgment_dedup：SimHash 与逐位投票的实现相同，分段索引与逐个比较的结果相同；清洗时去掉或标记副本"""
+import json
+import random
+from hashlib import blake2b
+
+import pytest
+
+from benchmark_cleaner import make_judgment_html
+from judgment_cleaner import extract_case_fields, output_file_name_for, run_parallel_extraction
+from judgment_dedup import SimHashIndex, simhash
+
+def _reference_simhash(text, shingle_size=4):
+    text = "".join(text.split())
+    if not text:
+        return None
+    shingles = [text[i:i + shingle_size] for i in range(max(1, len(text) - shingle_size + 1))]
+    votes = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            votes[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if votes[bit] > 0)
+
+def test_simhash_matches_bitwise_voting():
+    rng = random.Random(0)
+    for length in (1, 3, 4, 5, 50, 2000):
+        text = "".join(rng.choice("原告被告本院认为判决如下 \n，。") for _ in range(length))
+        assert simhash(text) == _reference_simhash(text), length
+    assert simhash(" \n\t") is None
+    assert simhash("本院 认为\n合法") == simhash("本院认为合法")
+
+def test_small_edits_keep_fingerprints_close():
+    rng = random.Random(1)
+    texts = [extract_case_fields(make_judgment_html(rng, size_kb=8), "stream")["content"] for _ in range(10)]
+    edited = texts[0].replace("原告", "原吿", 1) + "（本文已更新）"
+    assert (simhash(texts[0]) ^ simhash(edited)).bit_count() <= 3
+    assert all((simhash(texts[0]) ^ simhash(text)).bit_count() > 3 for text in texts[1:])
+
+def test_index_matches_linear_scan():
+    rng = random.Random(2)
+    fingerprints = [rng.getrandbits(64) for _ in range(300)]
+    # 一部分指纹是前面某个指纹翻转 0 到 4 位得到的
+    for _ in range(300):
+        fingerprint = rng.choice(fingerprints)
+        for bit in rng.sample(range(64), rng.randint(0, 4)):
+            fingerprint ^= 1 << bit
+        fingerprints.append(fingerprint)
+    index = SimHashIndex(3)
+    for i, fingerprint in enumerate(fingerprints):
+        expected = next((j for j in range(i) if (fingerprints[j] ^ fingerprint).bit_count() <= 3), None)
+        assert index.find(fingerprint) == expected
+        index.add(fingerprint, i)
+    assert len(index) == len(fingerprints)
+    assert index.find(fingerprints[0], exclude=0) != 0
+
+def test_index_rejects_unsupported_distance():
+    with pytest.raises(ValueError):
+        SimHashIndex(4)
+
+@pytest.mark.parametrize("mode", ["tag", "drop"])
+def test_cleaner_tags_or_drops_near_duplicates(tmp_path, mode):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    rng = random.Random(3)
+    original = make_judgment_html(rng, size_kb=6)
+    (input_dir / "a.html").write_text(original, encoding="utf-8")
+    (input_dir / "b.html").write_text(make_judgment_html(rng, size_kb=6), encoding="utf-8")
+    (input_dir / "c.html").write_text(original.replace("原告", "原吿", 1), encoding="utf-8")
+
+    def run():
+        return run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream",
+                                       incremental=True, dedup=mode)
+
+    stats = run()
+    assert (stats["success"], stats["duplicates"]) == (3, 1)
+    copy = output_dir / output_file_name_for("c.html")
+    if mode == "tag":
+        assert json.loads(copy.read_text(encoding="utf-8"))["duplicate_of"] == "a.html"
+    else:
+        assert not copy.exists()
+    assert (run()["skipped"], run()["duplicates"]) == (3, 0)
+
+    # 原文件消失后，副本重新解析并成为原文件
+    (input_dir / "a.html").unlink()
+    stats = run()
+    assert (stats["success"], stats["duplicates"], stats["removed"]) == (1, 0, 1)
+    assert "duplicate_of" not in json.loads(copy.read_text(encoding="utf-8"))
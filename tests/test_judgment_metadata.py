@@ -0,0 +1,102 @@
+"""judgment_metadata：从正文识别案号、法院、裁判日期与案由，写出索引后按条件筛选并导出"""
+import json
+import random
+
+import pytest
+
+from benchmark_cleaner import make_judgment_html
+from judgment_metadata import extract_metadata, parse_decision_date
+
+CONTENT = "\n".join([
+    "北京市海淀区人民法院",
+    "民事判决书",
+    "（2023）京0108民初1234号",
+    "原告：张三丰，男，1980年1月1日出生。",
+    "被告(反诉原告)：张三，女，2000年1月1日出生。",
+    "原告张三丰与被告张三民间借贷纠纷一案，本院于2023年3月1日立案。",
+    "本院认为，合法的借贷关系受法律保护。",
+    "审判员　王五",
+    "二〇二三年十二月三十一日",
+    "书记员　赵六",
+])
+
+@pytest.mark.parametrize("text, expected", [
+    ("二〇二三年十二月三十一日", "2023-12-31"),
+    ("二○一九年二月十日", "2019-02-10"),
+    ("2023年 5 月 1 日", "2023-05-01"),
+    ("2023-5-1", "2023-05-01"),
+    ("于2022年1月1日立案，2023/02/03 宣判", "2023-02-03"),
+    # 不存在的日期跳过，取前一个有效日期
+    ("二〇二三年一月五日 二〇二三年二月三十日", "2023-01-05"),
+    ("没有日期", None),
+])
+def test_parse_decision_date(text, expected):
+    assert parse_decision_date(text) == expected
+
+def test_metadata_from_content():
+    record = {"case_name": "张三丰与张三民间借贷纠纷一审民事判决书", "content": CONTENT, "editor": "责任编辑：李四"}
+    assert extract_metadata(record) == {
+        "case_number": "（2023）京0108民初1234号",
+        "court": "北京市海淀区人民法院",
+        "decision_date": "2023-12-31",
+        # 先去掉较长的“张三丰”，再去掉“张三”
+        "cause": "民间借贷纠纷",
+        "editor": "李四",
+        "case_name": "张三丰与张三民间借贷纠纷一审民事判决书",
+    }
+
+def test_rule_set_fields_take_precedence():
+    record = {"case_name": "", "content": CONTENT, "case_number": "（2024）京01民终1号",
+              "court": "北京市第一中级人民法院", "decision_date": "2024年6月1日", "cause": "借款合同纠纷"}
+    metadata = extract_metadata(record)
+    assert (metadata["case_number"], metadata["court"], metadata["decision_date"], metadata["cause"]) == (
+        "（2024）京01民终1号", "北京市第一中级人民法院", "2024-06-01", "借款合同纠纷")
+
+def test_missing_fields_are_none():
+    assert extract_metadata({"content": "无法识别的正文", "editor": "责任编辑："}) == dict.fromkeys(
+        ("case_number", "court", "decision_date", "cause", "editor", "case_name"))
+
+# ------------------ 列式索引 ------------------ #
+@pytest.fixture
+def indexed_output(tmp_path):
+    pytest.importorskip("pyarrow")
+    from judgment_cleaner import run_parallel_extraction
+
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    rng = random.Random(5)
+    for i in range(12):
+        (input_dir / f"{i:02d}.html").write_text(make_judgment_html(rng, size_kb=2), encoding="utf-8")
+    stats = run_parallel_extraction(str(input_dir), str(output_dir), workers=1, backend="stream",
+                                    output_mode="sharded", metadata_index=True)
+    assert stats["success"] == 12
+    return output_dir
+
+def test_query_index_filters(indexed_output):
+    from judgment_metadata import query_index
+
+    rows = query_index(str(indexed_output)).to_pylist()
+    assert len(rows) == 12 and all(row["court"] and row["cause"] and row["year"] for row in rows)
+    court, cause, year = rows[0]["court"], rows[0]["cause"], rows[0]["year"]
+    expected = sorted(row["source"] for row in rows
+                      if court in row["court"] and cause[:2] in row["cause"] and row["year"] == year)
+    selected = query_index(str(indexed_output), court=court, cause=cause[:2], year=[year, 1900])
+    assert sorted(selected["source"].to_pylist()) == expected
+    date = rows[0]["decision_date"].isoformat()
+    assert query_index(str(indexed_output), date_from=date, date_to=date)["decision_date"].to_pylist() == [
+        row["decision_date"] for row in rows if row["decision_date"].isoformat() == date]
+    assert query_index(str(indexed_output), cause="不存在的案由").num_rows == 0
+
+def test_export_cli_writes_selected_records(indexed_output, tmp_path):
+    from judgment_metadata import main, query_index
+
+    cause = query_index(str(indexed_output))["cause"].to_pylist()[0]
+    expected = query_index(str(indexed_output), cause=cause)["source"].to_pylist()
+    export, listing = tmp_path / "selected.jsonl", tmp_path / "files.txt"
+    assert main([str(indexed_output), "--cause", cause, "--export", str(export), "--list", str(listing)]) == 0
+    records = [json.loads(line) for line in export.read_text(encoding="utf-8").splitlines()]
+    assert sorted(record["source"] for record in records) == sorted(expected)
+    assert all(record["content"] for record in records)
+    assert listing.read_text(encoding="utf-8").splitlines()
+    assert main([str(tmp_path / "missing")]) == 2
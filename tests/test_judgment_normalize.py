@@ -0,0 +1,60 @@
+"""judgment_normalize 的批量实现与逐行逐字处理的对照实现结果相同"""
+import random
+
+from judgment_normalize import normalize_record, normalize_text, normalize_texts
+
+_SPACES = set("\t\x0b\x0c\xa0\u3000\u202f\u205f") | {chr(code) for code in range(0x2000, 0x200b)}
+_DELETED = set("\x00\xad\u200b\u200c\u200d\u2060\ufeff")
+_PUNCTUATION = {",": "，", ";": "；", ":": "：", "?": "？", "!": "！"}
+
+def _naive_normalize(text):
+    """按 judgment_normalize 的规则逐行逐字处理，作为对照"""
+    lines = []
+    for line in text.split("\n"):
+        chars = []
+        for ch in line:
+            code = ord(ch)
+            if ch in _SPACES:
+                ch = " "
+            elif ch in _DELETED:
+                continue
+            elif 0xFF10 <= code <= 0xFF19 or 0xFF21 <= code <= 0xFF3A or 0xFF41 <= code <= 0xFF5A:
+                ch = chr(code - 0xFEE0)
+            elif ch in _PUNCTUATION and chars and (
+                    "\u3400" <= chars[-1] <= "\u9fff" or "\uf900" <= chars[-1] <= "\ufaff"):
+                ch = _PUNCTUATION[ch]
+            chars.append(ch)
+        line = " ".join(part for part in "".join(chars).split(" ") if part)
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+# 覆盖各类被替换、删除或保留的字符，以及段落分隔
+ALPHABET = (
+    list("原告被告本院认为abcXYZ019") + list(",;:?!，。") + [" ", "\t", "\n", "\n", "\r\n"]
+    + ["\xa0", "　", " ", " ", " ", " ", "\x0b", "\x0c"]
+    + ["\x00", "\xad", "​", "‍", "⁠", "﻿"]
+    + ["０", "９", "Ａ", "ｚ", "！", "豈", "㐀"]
+)
+
+def _random_text(rng, length):
+    return "".join(rng.choice(ALPHABET) for _ in range(length))
+
+def test_normalize_text_matches_naive_implementation():
+    rng = random.Random(0)
+    for _ in range(500):
+        text = _random_text(rng, rng.randint(0, 60))
+        assert normalize_text(text) == _naive_normalize(text), repr(text)
+
+def test_normalize_texts_matches_one_by_one():
+    rng = random.Random(1)
+    for _ in range(100):
+        texts = [_random_text(rng, rng.randint(0, 30)) for _ in range(rng.randint(0, 6))]
+        assert normalize_texts(texts) == [_naive_normalize(text) for text in texts]
+
+def test_normalize_record_skips_source_and_non_strings():
+    record = {"source": "a  b.html", "content": "原告 ,被告\n\n　本院", "sections": {"facts": [0, 1]}}
+    normalized = normalize_record(record)
+    assert normalized == {"source": "a  b.html", "content": _naive_normalize(record["content"]),
+                          "sections": {"facts": [0, 1]}}
+    assert record["content"] == "原告 ,被告\n\n　本院"
@@ -0,0 +1,88 @@
+"""judgment_rules：选择器与规则集的编译、按页面特征选择规则集、未命中时使用内置规则"""
+import json
+
+import pytest
+
+from judgment_cleaner import extract_case_fields
+from judgment_rules import (
+    DEFAULT_RULE_SET, compile_rule_set, compile_rule_sets, detect_rule_set, load_rule_specs, parse_selector,
+    rule_specs_digest,
+)
+
+SITE_RULES = {
+    "name": "某法院网",
+    "markers": ["wenshu-detail", "裁判文书"],
+    "fields": [
+        {"name": "case_name", "selector": "h1.title"},
+        {"name": "content", "selector": "div#article", "separator": "\n"},
+        {"name": "editor", "selector": "span[data-role=editor]"},
+    ],
+}
+SITE_PAGE = (
+    '<html class="wenshu-detail"><title>裁判文书</title><h1 class="big title">张三与李四借款纠纷</h1>'
+    '<div id=article><p>第一段</p><p>第二段</p></div><span data-role="editor">王五</span>'
+    '<div class="detail_txt">内置模板的正文</div></html>'
+)
+
+@pytest.mark.parametrize("selector, expected", [
+    ("div", ("div", None, None)),
+    ("DIV.detail_txt", ("div", "class", "detail_txt")),
+    (".title", (None, "class", "title")),
+    ("div#article", ("div", "id", "article")),
+    ("span[data-role=editor]", ("span", "data-role", "editor")),
+    ("span[data-role='editor']", ("span", "data-role", "editor")),
+])
+def test_parse_selector(selector, expected):
+    assert parse_selector(selector) == expected
+
+@pytest.mark.parametrize("selector", ["", "div p", "div > p", "div.a.b", "#", "div[data-role]", "a:hover"])
+def test_parse_selector_rejects_unsupported(selector):
+    with pytest.raises(ValueError):
+        parse_selector(selector)
+
+@pytest.mark.parametrize("spec", [
+    {"markers": [], "fields": [{"name": "content", "selector": "div"}]},
+    {"name": "x", "fields": [{"selector": "div"}]},
+    {"name": "x", "fields": [{"name": "content", "selector": "div p"}]},
+    {"name": "x", "fields": []},
+    {"name": "x", "fields": None},
+])
+def test_invalid_rule_sets_are_rejected(spec):
+    with pytest.raises(ValueError):
+        compile_rule_set(spec)
+
+def test_builtin_rule_set_is_the_fallback():
+    rule_sets = compile_rule_sets([SITE_RULES])
+    assert [rule_set.name for rule_set in rule_sets] == ["某法院网", "default"]
+    assert detect_rule_set(SITE_PAGE, rule_sets).name == "某法院网"
+    # markers 要全部出现才命中
+    assert detect_rule_set(SITE_PAGE.replace("裁判文书", ""), rule_sets).name == "default"
+    replaced = dict(DEFAULT_RULE_SET, fields=[{"name": "content", "selector": "p"}])
+    rule_sets = compile_rule_sets([replaced, SITE_RULES])
+    assert [rule_set.name for rule_set in rule_sets] == ["某法院网", "default"]
+    assert [field.tag for field in rule_sets[-1].fields] == ["p"]
+
+@pytest.mark.parametrize("backend", ["stream", "bs4"])
+def test_extraction_uses_detected_template(backend):
+    if backend == "bs4":
+        pytest.importorskip("bs4")
+    rule_sets = compile_rule_sets([SITE_RULES])
+    assert extract_case_fields(SITE_PAGE, backend, rule_sets) == {
+        "case_name": "张三与李四借款纠纷", "content": "第一段\n第二段", "editor": "王五"}
+    fallback = extract_case_fields(SITE_PAGE.replace("wenshu-detail", "other"), backend, rule_sets)
+    assert fallback == {"case_name": "", "content": "内置模板的正文", "editor": ""}
+
+def test_load_rule_specs(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rule_sets": [SITE_RULES]}, ensure_ascii=False), encoding="utf-8")
+    assert load_rule_specs(str(path)) == [SITE_RULES]
+    path.write_text(json.dumps([SITE_RULES], ensure_ascii=False), encoding="utf-8")
+    assert load_rule_specs(str(path)) == [SITE_RULES]
+    path.write_text(json.dumps({"rules": []}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_rule_specs(str(path))
+
+def test_digest_ignores_key_order():
+    reordered = {key: SITE_RULES[key] for key in reversed(list(SITE_RULES))}
+    assert rule_specs_digest([SITE_RULES]) == rule_specs_digest([reordered])
+    assert rule_specs_digest([SITE_RULES]) != rule_specs_digest([dict(SITE_RULES, markers=[])])
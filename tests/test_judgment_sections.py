@@ -0,0 +1,53 @@
+"""judgment_sections：按段落分段，生成问答对时默认保留开头与当事人，省去审理经过与落款"""
+import json
+
+from judgment_sections import PROMPT_SECTIONS, build_case_content, section_text, segment_judgment
+
+JUDGMENT = "\n".join([
+    "北京市海淀区人民法院",
+    "民事判决书",
+    "（2023）京0108民初1234号",
+    "原告：张三，男，1980年1月1日出生。",
+    "被告：李四，女，1985年2月2日出生。",
+    "原告张三与被告李四民间借贷纠纷一案，本院于2023年3月1日立案后，依法适用简易程序公开开庭进行了审理。",
+    "张三向本院提出诉讼请求：1.判令被告偿还借款10万元。",
+    "李四辩称，借款已经归还。",
+    "本院经审理查明：2022年1月1日，被告向原告借款10万元。",
+    "本院认为，合法的借贷关系受法律保护。依照《中华人民共和国民法典》第六百七十五条的规定，判决如下：",
+    "被告李四于本判决生效之日起十日内偿还原告张三借款10万元。",
+    "如不服本判决，可以在判决书送达之日起十五日内提起上诉。",
+    "审判员　王五",
+    "二〇二三年五月一日",
+    "书记员　赵六",
+])
+
+def test_segments_follow_document_order():
+    spans = segment_judgment(JUDGMENT)
+    assert list(spans) == ["header", "parties", "procedure", "claims", "facts", "reasoning", "judgment", "tail"]
+    record = {"content": JUDGMENT, "sections": spans}
+    assert section_text(record, ["parties"]) == "原告：张三，男，1980年1月1日出生。\n被告：李四，女，1985年2月2日出生。"
+    # “判决如下：”所在的段落仍属于本院认为
+    assert section_text(record, ["reasoning"]).endswith("判决如下：")
+    assert section_text(record, ["tail"]) == "审判员　王五\n二〇二三年五月一日\n书记员　赵六"
+    # 各段首尾相接，覆盖整篇正文
+    assert "\n".join(section_text(record, [name]) for name in spans) == JUDGMENT
+
+def test_facts_quoting_later_cues_do_not_go_back():
+    content = "本院经审理查明：被告曾称“本院认为应当驳回”。\n原告：张三"
+    assert list(segment_judgment(content)) == ["facts"]
+
+def test_prompt_content_keeps_header_and_parties():
+    record = {"source": "a.html", "title": "张三与李四民间借贷纠纷", "content": JUDGMENT,
+              "sections": segment_judgment(JUDGMENT)}
+    case = json.loads(build_case_content(record))
+    assert "sections" not in case and case["title"] == record["title"]
+    assert case["content"] == section_text(record, PROMPT_SECTIONS)
+    assert "（2023）京0108民初1234号" in case["content"] and "原告：张三" in case["content"]
+    assert "依法适用简易程序" not in case["content"] and "书记员" not in case["content"]
+    assert json.loads(build_case_content(record, ["facts"]))["content"].startswith("本院经审理查明")
+
+def test_prompt_content_falls_back_to_whole_record():
+    plain = {"source": "a.html", "content": JUDGMENT}
+    assert json.loads(build_case_content(plain)) == plain
+    unmatched = {"content": "正文", "sections": {"tail": [0, 2]}}
+    assert json.loads(build_case_content(unmatched)) == {"content": "正文"}
@@ -0,0 +1,80 @@
+"""judgment_watch：轮询器发现新文件与原地改写，监视模式处理各批并在页面被隔离时删除旧输出"""
+import json
+import os
+import random
+import threading
+
+from benchmark_cleaner import make_judgment_html
+from judgment_cleaner import output_file_name_for
+from judgment_watch import WATCH_JOURNAL_FILE_NAME, DirectoryPoller, watch_directory
+
+def _write(path, text, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime, mtime))
+
+def test_poller_finds_new_files_in_subdirectories(tmp_path):
+    _write(tmp_path / "a.html", "a", 1_000_000_000)
+    _write(tmp_path / "sub" / "b.html", "b", 1_000_000_000)
+    _write(tmp_path / "c.txt", "c", 1_000_000_000)
+    poller = DirectoryPoller(str(tmp_path), {"a.html": (1, 1_000_000_000)}, settle_seconds=0)
+    ready = poller.poll()
+    assert [item[0] for item in ready] == ["sub/b.html"]
+    # 与 watch_directory 一样，处理后记入 known
+    poller.known.update((source, (size, mtime)) for source, _, size, mtime in ready)
+    assert poller.poll() == []
+    _write(tmp_path / "sub" / "d.html", "dd", 2_000_000_000)
+    os.utime(tmp_path / "sub", ns=(3_000_000_000, 3_000_000_000))
+    assert poller.poll() == [("sub/d.html", str(tmp_path / "sub" / "d.html"), 2, 2_000_000_000)]
+
+def test_poller_rechecks_known_files_rewritten_in_place(tmp_path):
+    names = [f"{i}.html" for i in range(5)]
+    for name in names:
+        _write(tmp_path / name, "x", 1_000_000_000)
+    known = {name: (1, 1_000_000_000) for name in names}
+    poller = DirectoryPoller(str(tmp_path), known, settle_seconds=0, rescan_interval=3600, recheck_per_poll=2)
+    assert poller.poll() == []
+    # 原地改写：目录的修改时间不变，完整扫描要等 rescan_interval 之后
+    directory_mtime = os.stat(tmp_path).st_mtime_ns
+    _write(tmp_path / "3.html", "rewritten", 2_000_000_000)
+    os.utime(tmp_path, ns=(directory_mtime, directory_mtime))
+    found = []
+    for _ in range(3):
+        found += poller.poll()
+    assert [item[0] for item in found] == ["3.html"]
+
+def _watch_once(input_dir, output_dir, **kwargs):
+    """处理一批后停止，返回 (累计统计, 各批统计)"""
+    stop = threading.Event()
+    batches = []
+
+    def on_batch(batch):
+        batches.append(batch)
+        stop.set()
+
+    totals = watch_directory(str(input_dir), str(output_dir), workers=1, backend="stream", settle_seconds=0,
+                             poll_interval=0.01, stop_event=stop, batch_callback=on_batch, **kwargs)
+    return totals, batches
+
+def test_watch_processes_batches_and_quarantine_drops_old_output(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    output_dir.mkdir()
+    rng = random.Random(0)
+    _write(input_dir / "a.html", make_judgment_html(rng, size_kb=4), 1_000_000_000)
+    _write(input_dir / "sub" / "b.html", make_judgment_html(rng, size_kb=4), 1_000_000_000)
+    totals, batches = _watch_once(input_dir, output_dir, max_html_bytes=64 * 1024)
+    assert totals == {"success": 2, "fail": 0, "batches": 1}
+    assert batches[0]["files"] == 2 and batches[0]["backlog"] == 0
+    output = output_dir / output_file_name_for("sub/b.html")
+    assert json.loads(output.read_text(encoding="utf-8"))["content"]
+
+    # 重启后只处理变化的文件；变大后被隔离的页面不再保留旧输出
+    _write(input_dir / "sub" / "b.html", make_judgment_html(rng, size_kb=200), 2_000_000_000)
+    errors = []
+    totals, batches = _watch_once(input_dir, output_dir, max_html_bytes=64 * 1024, error_callback=errors.append)
+    assert totals == {"success": 0, "fail": 1, "batches": 1}
+    assert [(error["source"], error["quarantined"]) for error in errors] == [("sub/b.html", True)]
+    assert not output.exists() and (output_dir / output_file_name_for("a.html")).exists()
+    with open(output_dir / WATCH_JOURNAL_FILE_NAME, encoding="utf-8") as f:
+        journal = [json.loads(line) for line in f][1:]
+    assert journal[-1]["source"] == "sub/b.html" and "output" not in journal[-1]
@@ -0,0 +1,346 @@
+"""training_log：各种日志格式的解析，平滑与 LTTB 降采样与逐点实现的结果相同，输出格式，跟踪模式，多次运行对比，命令行"""
+import math
+import os
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import training_log  # noqa: E402
+from training_log import STEP, LogFollower, downsample_columns, ema, lttb, moving_average, parse_log  # noqa: E402
+
+def _parse_text(tmp_path, text, **kwargs):
+    path = tmp_path / "train.log"
+    path.write_text(text, encoding="utf-8")
+    return parse_log(str(path), **kwargs)
+
+def _as_lists(columns):
+    return {name: [None if isinstance(v, float) and math.isnan(v) else v for v in column.tolist()]
+            for name, column in columns.items()}
+
+# ------------------ 日志格式 ------------------ #
+def test_parses_llama_factory_jsonl(tmp_path):
+    columns = _parse_text(tmp_path, (
+        '{"current_steps": 10, "total_steps": 100, "loss": 2.485, "learning_rate": 5.06e-04, "epoch": 0.01}\n'
+        '{"current_steps": 20, "total_steps": 100, "loss": 2.1, "learning_rate": 4.9e-04, "epoch": 0.02}\n'
+    ))
+    assert _as_lists(columns) == {
+        STEP: [10, 20], "total_steps": [100.0, 100.0], "loss": [2.485, 2.1],
+        "learning_rate": [5.06e-04, 4.9e-04], "epoch": [0.01, 0.02],
+    }
+
+def test_parses_hf_trainer_dicts_without_steps(tmp_path):
+    columns = _parse_text(tmp_path, (
+        "[INFO|trainer.py:3000] 2024-05-01 12:00:00 >> ***** Running training *****\n"
+        "{'loss': 2.5, 'grad_norm': 1.25, 'learning_rate': 4.999999999999999e-05, 'epoch': 0.01}\n"
+        "{'loss': 2.4, 'learning_rate': 4.8e-05, 'epoch': 0.02}\n"
+        "{'eval_loss': 2.6, 'epoch': 0.02}\n"
+    ))
+    # 没有步数的记录按先后编号；文件名中的 py:3000 不是指标，键两侧的引号不属于键名
+    assert _as_lists(columns) == {
+        STEP: [1, 2, 3],
+        "loss": [2.5, 2.4, None],
+        "grad_norm": [1.25, None, None],
+        "learning_rate": [4.999999999999999e-05, 4.8e-05, None],
+        "epoch": [0.01, 0.02, 0.02],
+        "eval_loss": [None, None, 2.6],
+    }
+
+def test_parses_key_value_lines_with_step_markers(tmp_path):
+    columns = _parse_text(tmp_path, (
+        "config: lr=0.5 warmup=100\n"
+        "[2024-05-01 12:00:00] (8400/44160) loss:2.485 lr:0.000506674126 grad_norm:0.91 tokens/s:5123.4\n"
+        "[2024-05-01 12:00:05] (8401/44160) loss = 2.480 lr:0.0005 substep 7 3loss:9\n"
+        "eval step 8500: eval_loss:2.61 ppl:13.6\n"
+    ))
+    # 第一个步数之前的配置行被丢弃；substep 不是步数，3loss 不是键
+    assert _as_lists(columns) == {
+        STEP: [8400, 8401, 8500],
+        "loss": [2.485, 2.48, None],
+        "lr": [0.000506674126, 0.0005, None],
+        "grad_norm": [0.91, None, None],
+        "tokens/s": [5123.4, None, None],
+        "eval_loss": [None, None, 2.61],
+        "ppl": [None, None, 13.6],
+    }
+
+def test_step_keys_and_selected_metrics(tmp_path):
+    text = "".join(f"global_step={i} loss={1 / i} lr={i * 1e-5} 'note': text\n" for i in range(1, 6))
+    columns = _parse_text(tmp_path, text, metrics=["loss"])
+    assert list(columns) == [STEP, "loss"]
+    assert columns[STEP].tolist() == [1, 2, 3, 4, 5]
+    assert columns["loss"].tolist() == [1 / i for i in range(1, 6)]
+
+def test_long_keys_and_values_and_chunking(tmp_path):
+    key = "a_very_long_metric_name_" * 4
+    lines = [f"step {i} {key}: {i}.00000000000000000000000001 loss: -{i}e-3\n" for i in range(200)]
+    whole = _parse_text(tmp_path, "".join(lines))
+    chunked = _parse_text(tmp_path, "".join(lines), chunk_size=97)
+    assert whole[key].tolist() == [float(f"{i}.00000000000000000000000001") for i in range(200)]
+    assert whole["loss"].tolist() == [float(f"-{i}e-3") for i in range(200)]
+    assert _as_lists(chunked) == _as_lists(whole)
+
+def test_steps_of_marker_only_lines_carry_across_chunks(tmp_path):
+    # 保存检查点等只有步数的行之后的评估行取这一步数，与它们是否被切到不同的块无关
+    lines = [f"({i}/100000) loss: {i / 1000}\n" if i % 7 else f"({i}/100000) saving checkpoint\neval_loss: {i}\n"
+             for i in range(1, 200)]
+    whole = _parse_text(tmp_path, "".join(lines))
+    eval_rows = ~np.isnan(whole["eval_loss"])
+    assert whole[STEP][eval_rows].tolist() == whole["eval_loss"][eval_rows].astype(int).tolist()
+    for chunk_size in (1, 23, 97):
+        assert _as_lists(_parse_text(tmp_path, "".join(lines), chunk_size=chunk_size)) == _as_lists(whole)
+
+def test_multiprocess_parsing_matches_single_process(tmp_path):
+    # workers 大于 1 时块至少 1 MB，日志要大于几个块才会真的分到多个进程
+    lines = [f"({i}/100000) loss: {i / 1000} lr: {i}e-7\n" if i % 5 else f"({i}/100000) saving\neval_loss: {i}\n"
+             for i in range(1, 120000)]
+    whole = _parse_text(tmp_path, "".join(lines))
+    assert len(training_log.chunk_bounds(b"".join(line.encode() for line in lines), 1024 * 1024)) > 2
+    assert _as_lists(parse_log(str(tmp_path / "train.log"), workers=3)) == _as_lists(whole)
+    selected = parse_log(str(tmp_path / "train.log"), metrics=["eval_loss"])
+    assert selected[STEP].tolist() == list(range(5, 120000, 5))
+    assert _as_lists(parse_log(str(tmp_path / "train.log"), workers=3, metrics=["eval_loss"])) == _as_lists(selected)
+
+def test_follower_checkpoint_keeps_step_of_marker_only_lines(tmp_path):
+    path = tmp_path / "train.log"
+    path.write_text("(10/100) loss: 1.5\n(20/100) saving checkpoint\n", encoding="utf-8")
+    with LogFollower(str(path)) as follower:
+        assert follower.poll()[STEP].tolist() == [10]
+        checkpoint = follower.checkpoint()
+    assert checkpoint["last_step"] == 20
+    with path.open("a", encoding="utf-8") as f:
+        f.write("eval_loss: 2.0\n")
+    with LogFollower(str(path), checkpoint["offset"], checkpoint["identity"], bytes.fromhex(checkpoint["tail"]),
+                     checkpoint["last_step"]) as follower:
+        assert _as_lists(follower.poll()) == {STEP: [20], "eval_loss": [2.0]}
+
+# ------------------ 平滑与降采样 ------------------ #
+def _reference_ema(values, weight):
+    result, last, count = [], 0.0, 0
+    for value in values:
+        if math.isnan(value):
+            result.append(value)
+            continue
+        last = weight * last + (1 - weight) * value
+        count += 1
+        result.append(last / (1 - weight ** count))
+    return result
+
+def _reference_moving_average(values, window):
+    result, seen = [], []
+    for value in values:
+        if math.isnan(value):
+            result.append(value)
+            continue
+        seen.append(value)
+        result.append(sum(seen[-window:]) / len(seen[-window:]))
+    return result
+
+def _reference_lttb(x, y, points):
+    """Steinarsson 论文中的逐点实现"""
+    n = len(x)
+    if points >= n or n <= 2:
+        return list(range(n))
+    every = (n - 2) / (points - 2)
+    selected, a = [0], 0
+    for i in range(points - 2):
+        next_start, next_stop = int((i + 1) * every) + 1, min(int((i + 2) * every) + 1, n)
+        mean_x = sum(x[next_start:next_stop]) / (next_stop - next_start)
+        mean_y = sum(y[next_start:next_stop]) / (next_stop - next_start)
+        start, stop = int(i * every) + 1, int((i + 1) * every) + 1
+        a = max(range(start, stop), key=lambda j: abs((x[a] - mean_x) * (y[j] - y[a])
+                                                       - (x[a] - x[j]) * (mean_y - y[a])))
+        selected.append(a)
+    return selected + [n - 1]
+
+def _noisy_curve(n, seed, missing=0.0):
+    rng = random.Random(seed)
+    return [math.nan if rng.random() < missing else 3 * math.exp(-i / 300) + rng.gauss(0, 0.1)
+            for i in range(n)]
+
+@pytest.mark.parametrize("weight", [0.0, 0.6, 0.99, 0.999])
+def test_ema_matches_recurrence(weight):
+    values = _noisy_curve(5000, 0, missing=0.1)
+    np.testing.assert_allclose(ema(values, weight), _reference_ema(values, weight), rtol=1e-9, atol=1e-12)
+
+@pytest.mark.parametrize("window", [1, 7, 100, 10000])
+def test_moving_average_matches_window_mean(window):
+    values = _noisy_curve(3000, 1, missing=0.1)
+    np.testing.assert_allclose(moving_average(values, window), _reference_moving_average(values, window),
+                               rtol=1e-9, atol=1e-12)
+
+def test_smoothing_rejects_bad_parameters():
+    with pytest.raises(ValueError):
+        ema([1.0], 1.0)
+    with pytest.raises(ValueError):
+        moving_average([1.0], 0)
+
+@pytest.mark.parametrize("n, points", [(1000, 50), (1001, 3), (777, 100), (10, 10), (5, 20)])
+def test_lttb_matches_reference(n, points):
+    x = [float(i * 2) for i in range(n)]
+    y = _noisy_curve(n, n)
+    assert lttb(np.array(x), np.array(y), points).tolist() == _reference_lttb(x, y, points)
+
+def test_downsample_keeps_union_of_selected_rows():
+    steps = np.arange(1, 2001)
+    columns = {STEP: steps, "loss": np.array(_noisy_curve(2000, 2)),
+               "eval_loss": np.where(steps % 100 == 0, 1.0 / steps, np.nan)}
+    result = downsample_columns(columns, 50)
+    assert len(result[STEP]) <= 100
+    assert result[STEP][0] == 1 and result[STEP][-1] == 2000
+    # 稀疏指标的点全部保留（不超过 points 个）
+    assert np.count_nonzero(~np.isnan(result["eval_loss"])) == 20
+    assert set(training_log.metric_names(result)) == {"loss", "eval_loss"}
+
+# ------------------ 输出 ------------------ #
+def _table(rows):
+    pd = pytest.importorskip("pandas")
+    return pd.DataFrame({"步数": np.arange(1, rows + 1), "损失率": np.linspace(3.0, 1.0, rows)})
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather", "excel"])
+def test_write_table_round_trips(tmp_path, fmt):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl" if fmt == "excel" else "pyarrow")
+    df = _table(20)
+    path = str(tmp_path / ("out" + training_log.OUTPUT_FORMATS[fmt]))
+    assert training_log.write_table(df, path, fmt) == path
+    reader = {"csv": pd.read_csv, "parquet": pd.read_parquet, "feather": pd.read_feather, "excel": pd.read_excel}[fmt]
+    pd.testing.assert_frame_equal(reader(path), df, check_dtype=False)
+
+def test_write_table_auto_format(tmp_path, monkeypatch):
+    pytest.importorskip("openpyxl")
+    monkeypatch.setattr(training_log, "AUTO_EXCEL_MAX_ROWS", 10)
+    # 扩展名可以识别时按扩展名，否则按行数选择并换上所选格式的扩展名
+    assert training_log.write_table(_table(20), str(tmp_path / "a.csv")) == str(tmp_path / "a.csv")
+    assert training_log.write_table(_table(10), str(tmp_path / "b.out")) == str(tmp_path / "b.xlsx")
+    monkeypatch.setattr(training_log, "_has_pyarrow", lambda: False)
+    assert training_log.write_table(_table(20), str(tmp_path / "c")) == str(tmp_path / "c.csv")
+
+def test_write_table_refuses_to_truncate_excel(tmp_path, monkeypatch):
+    monkeypatch.setattr(training_log, "EXCEL_MAX_ROWS", 10)
+    with pytest.raises(ValueError):
+        training_log.write_table(_table(11), str(tmp_path / "a.xlsx"))
+    with pytest.raises(ValueError):
+        training_log.write_table(_table(1), str(tmp_path / "a.txt"), "txt")
+    assert not (tmp_path / "a.xlsx").exists()
+
+# ------------------ 跟踪模式 ------------------ #
+def test_follower_reads_complete_lines_and_handles_rotation_and_truncation(tmp_path):
+    path = tmp_path / "train.log"
+    path.write_text("(1/9) loss: 1.0\n(2/9) loss: 2", encoding="utf-8")
+    with LogFollower(str(path)) as follower:
+        # 末尾没写完的半行留到下一次
+        assert follower.poll()[STEP].tolist() == [1]
+        with path.open("a", encoding="utf-8") as f:
+            f.write(".5\n")
+        assert _as_lists(follower.poll()) == {STEP: [2], "loss": [2.5]}
+        assert follower.poll()[STEP].tolist() == []
+
+        # 轮转：先读完旧文件剩余的行，再从新文件开头读起
+        with path.open("a", encoding="utf-8") as f:
+            f.write("(3/9) loss: 3.0\n")
+        path.rename(tmp_path / "train.log.1")
+        path.write_text("(4/9) loss: 4.0\n", encoding="utf-8")
+        assert follower.poll()[STEP].tolist() == [3, 4]
+        assert follower.rotations == 1
+
+        # 截断后重新写到 offset 以上：offset 之前的字节已经变了，从头读起
+        path.write_text("(5/9) loss: 5.0\n(6/9) loss: 6.0\n", encoding="utf-8")
+        mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+        os.utime(path, ns=(mtime, mtime))
+        assert follower.poll()[STEP].tolist() == [5, 6]
+        assert follower.truncations == 1
+
+def test_follow_log_appends_csv_and_resumes_from_checkpoint(tmp_path):
+    pd = pytest.importorskip("pandas")
+    import threading
+
+    path, output = tmp_path / "train.log", tmp_path / "train.csv"
+    path.write_text("(1/9) loss: 1.0\n(2/9) loss: 2.0\n", encoding="utf-8")
+    stop = threading.Event()
+    stop.set()
+    # stop 已被设置时只轮询一次
+    assert training_log.follow_log(str(path), str(output), stop_event=stop, interval=0) == 2
+    assert os.path.exists(training_log.checkpoint_path_for(str(output)))
+    # 重启后从检查点继续；中途出现的新指标使 CSV 加上一列
+    with path.open("a", encoding="utf-8") as f:
+        f.write("(3/9) loss: 3.0 grad_norm: 0.5\n")
+    assert training_log.follow_log(str(path), str(output), stop_event=stop, interval=0) == 1
+    df = pd.read_csv(output)
+    assert df["步数"].tolist() == [1, 2, 3]
+    assert df["grad_norm"].isna().tolist() == [True, True, False]
+    assert training_log.follow_log(str(path), str(output), stop_event=stop, interval=0) == 0
+    # 检查点记录的是另一个日志时从头开始
+    assert training_log.load_checkpoint(training_log.checkpoint_path_for(str(output)), str(tmp_path / "x.log")) == (
+        0, None, b"", None)
+
+# ------------------ 多次运行对比 ------------------ #
+def test_run_names_add_parent_directories_on_clashes(tmp_path):
+    paths = [str(tmp_path / "a" / "trainer_log.jsonl"), str(tmp_path / "b" / "trainer_log.jsonl"),
+             str(tmp_path / "b" / "eval.log"), str(tmp_path / "a" / "trainer_log.jsonl")]
+    assert training_log.run_names(paths) == ["a/trainer_log", "b/trainer_log", "eval", "a/trainer_log#2"]
+
+def test_merge_runs_aligns_steps(tmp_path):
+    pytest.importorskip("pandas")
+    first, second = tmp_path / "first.log", tmp_path / "second.log"
+    # 从检查点恢复后重复的第 20 步取最后一次
+    first.write_text("(10/99) loss: 3.0 lr: 1e-4\n(20/99) loss: 2.0\n(20/99) loss: 1.8\n", encoding="utf-8")
+    second.write_text("(20/99) loss: 2.5\n(30/99) loss: 2.4\neval_loss: 2.6\n", encoding="utf-8")
+    runs = training_log.parse_logs([str(first), str(second)], workers=2)
+    assert list(runs) == ["first", "second"]
+    df = training_log.merge_runs(runs)
+    assert list(df.columns) == ["步数", "first:损失率", "first:lr*10000", "second:损失率", "second:eval_loss"]
+    assert _as_lists({name: df[name].to_numpy() for name in df.columns}) == {
+        "步数": [10, 20, 30],
+        "first:损失率": [3.0, 1.8, None],
+        "first:lr*10000": [1.0, None, None],
+        "second:损失率": [None, 2.5, 2.4],
+        "second:eval_loss": [None, None, 2.6],
+    }
+
+def test_merge_runs_resamples_to_grid():
+    pytest.importorskip("pandas")
+    runs = {"long": {STEP: np.array([0, 100]), "loss": np.array([1.0, 0.0])},
+            "short": {STEP: np.array([50, 60]), "loss": np.array([5.0, 6.0])}}
+    df = training_log.merge_runs(runs, metrics=["loss"], grid_step=30)
+    assert df["步数"].tolist() == [0, 30, 60, 90, 100]
+    np.testing.assert_allclose(df["long:损失率"], [1.0, 0.7, 0.4, 0.1, 0.0])
+    # 网格点超出该运行的步数范围时为空值
+    assert _as_lists({"short": df["short:损失率"].to_numpy()}) == {"short": [None, None, 6.0, None, None]}
+    with pytest.raises(ValueError):
+        training_log.merge_runs(runs, grid_step=0)
+
+# ------------------ 命令行 ------------------ #
+def test_cli_converts_directories(tmp_path, capsys, monkeypatch):
+    pytest.importorskip("pandas")
+    for run in ("a", "b"):
+        (tmp_path / run).mkdir()
+        (tmp_path / run / "trainer_log.jsonl").write_text(
+            "".join(f'{{"current_steps": {i}, "loss": {1 / i}}}\n' for i in range(1, 6)), encoding="utf-8")
+    output_dir = tmp_path / "out"
+    inputs = [str(tmp_path / "a"), str(tmp_path / "b")]
+    assert training_log.main(inputs + ["-o", str(output_dir), "-f", "csv", "-w", "1", "--points", "3", "-q"]) == 0
+    assert sorted(os.listdir(output_dir)) == ["a_trainer_log.csv", "b_trainer_log.csv"]
+    assert capsys.readouterr().err == ""
+
+    monkeypatch.setattr(training_log, "EXCEL_MAX_ROWS", 4)
+    assert training_log.main(inputs + ["-o", str(output_dir), "-f", "excel", "-w", "1"]) == 1
+    assert "失败：" in capsys.readouterr().err
+    assert training_log.main([str(tmp_path / "missing.log")]) == 2
+    assert training_log.main(inputs + ["--smoothing", "ema", "--smoothing-amount", "1"]) == 2
+    assert training_log.main(inputs + ["--smoothing", "moving_average", "--smoothing-amount", "2.5"]) == 2
+    assert training_log.main(inputs + ["--points", "2"]) == 2
+
+def test_gui_module_imports_without_tkinter(tmp_path):
+    import subprocess
+    import sys
+
+    log = tmp_path / "train.log"
+    log.write_text("(1/2) loss: 1.0\n(2/2) loss: 0.5\n", encoding="utf-8")
+    los2 = os.path.join(os.path.dirname(training_log.__file__), "los2.py")
+    # 屏蔽 tkinter 后仍能导入 los2，带参数运行时走命令行
+    code = ("import runpy, sys; sys.modules['tkinter'] = None; "
+            f"sys.argv = [{los2!r}, {str(log)!r}, '-f', 'csv', '-q']; runpy.run_path({los2!r}, run_name='__main__')")
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(los2), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "train.csv").exists()
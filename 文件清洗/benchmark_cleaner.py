@@ -0,0 +1,357 @@
+"""
+judgment_cleaner 的基准测试：生成合成的裁判文书 HTML 语料，分别计时各种解析方式，
+输出 文件数/秒、MB/秒 与峰值内存，结果保存为 JSON，可与之前的结果对比。
+
+    python benchmark_cleaner.py --count 2000 --size-kb 40 -o bench.json
+    python benchmark_cleaner.py --count 2000 --size-kb 40 --compare bench.json
+
+每项测试都在单独启动（spawn）的进程中运行，峰值内存互不影响；
+pipeline 测试调用 run_parallel_extraction（即界面上“开始处理”的全部流程），
+extract 测试只在单个进程内对内存中的文本调用 extract_case_fields，不含磁盘读写；
+normalize 测试对提取出的字段做规范化，batch 为 judgment_normalize 的批量实现，
+naive 为逐行逐字处理的等价实现，作为对照。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from queue import Empty
+
+# 结果文件格式版本
+RESULT_SCHEMA = 1
+
+# ------------------ 合成语料 ------------------ #
+_COURTS = ["最高人民法院", "北京市高级人民法院", "上海市第一中级人民法院", "广东省深圳市中级人民法院",
+           "浙江省杭州市西湖区人民法院", "四川省成都市中级人民法院"]
+_CAUSES = ["买卖合同纠纷", "民间借贷纠纷", "劳动争议", "机动车交通事故责任纠纷", "房屋租赁合同纠纷",
+           "建设工程施工合同纠纷", "离婚纠纷", "金融借款合同纠纷"]
+_SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+_GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华"
+_PHRASES = [
+    "根据双方提交的证据及庭审陈述", "本院对案件事实认定如下", "上述事实有合同、收据及当事人陈述在案佐证",
+    "双方于签订协议后", "被告未按约定履行付款义务", "原告多次催要未果", "经核算尚欠货款",
+    "依照《中华人民共和国民法典》第五百七十七条之规定", "当事人对自己提出的主张有责任提供证据",
+    "双方当事人均无异议", "本院予以确认", "该抗辩意见缺乏事实和法律依据", "本院不予支持",
+    "逾期付款利息以未付款项为基数", "按照全国银行间同业拆借中心公布的贷款市场报价利率计算",
+]
+_DIGITS = "〇一二三四五六七八九"
+
+def _chinese_year(year):
+    return "".join(_DIGITS[int(d)] for d in str(year))
+
+def _chinese_number(n):
+    """1-31 的中文写法"""
+    if n < 10:
+        return _DIGITS[n]
+    tens, ones = divmod(n, 10)
+    return ("" if tens == 1 else _DIGITS[tens]) + "十" + (_DIGITS[ones] if ones else "")
+
+def _person(rng):
+    return rng.choice(_SURNAMES) + "".join(rng.choice(_GIVEN) for _ in range(rng.randint(1, 2)))
+
+def _paragraphs(rng, min_chars):
+    """生成至少 min_chars 个字符的若干段落"""
+    paragraphs, total = [], 0
+    while total < min_chars:
+        sentence = "，".join(rng.choice(_PHRASES) for _ in range(rng.randint(2, 5))) + "。"
+        if rng.random() < 0.3:
+            sentence += f"金额共计{rng.randint(1000, 9999999)}元&nbsp;（含利息）。"
+        paragraphs.append(sentence)
+        total += len(sentence)
+    return paragraphs
+
+def make_judgment_html(rng, size_kb=40):
+    """
+    生成一篇结构接近真实页面的裁判文书 HTML：导航、脚本、样式、内嵌图片等噪声，
+    加上 detail_bigtitle / detail_txt / compile 三个字段，正文含法院与案号、当事人、审理经过、事实、本院认为与判决主文。
+    size_kb 为大致的目标大小（按 UTF-8 计）。
+    """
+    year = rng.randint(2015, 2024)
+    court = rng.choice(_COURTS)
+    cause = rng.choice(_CAUSES)
+    case_number = f"（{year}）{rng.choice(['京', '沪', '粤', '浙', '川', '最高法'])}{rng.randint(1, 99):02d}民初{rng.randint(1, 20000)}号"
+    plaintiff, defendant, judge, editor = (_person(rng) for _ in range(4))
+    date = f"{_chinese_year(year)}年{_chinese_number(rng.randint(1, 12))}月{_chinese_number(rng.randint(1, 28))}日"
+
+    # 正文各部分的字数按目标大小分配（中文约 3 字节/字，噪声约占 1/4）
+    body_chars = max(200, size_kb * 1024 * 3 // 4 // 3)
+    sections = [
+        [court, "民事判决书", case_number],
+        [f"原告：{plaintiff}，男，汉族，住{court[:3]}。", f"被告：{defendant}，女，汉族，住{court[:3]}。"],
+        [f"原告{plaintiff}与被告{defendant}{cause}一案，本院于{_chinese_year(year)}年立案后，依法适用普通程序，公开开庭进行了审理。"]
+        + _paragraphs(rng, body_chars // 8),
+        [f"{plaintiff}向本院提出诉讼请求："] + _paragraphs(rng, body_chars // 4),
+        ["本院查明："] + _paragraphs(rng, body_chars // 4),
+        ["本院认为，"] + _paragraphs(rng, body_chars // 4),
+        ["判决如下：", f"一、被告{defendant}于本判决生效之日起十日内支付原告{plaintiff}款项；", "二、驳回原告的其他诉讼请求。",
+         "如不服本判决，可以在判决书送达之日起十五日内提起上诉。"],
+        [f"审判长　{judge}", date, "书记员　" + _person(rng)],
+    ]
+    body = "\n".join(
+        f"<p style=\"text-indent:2em\">{paragraph}</p>" for section in sections for paragraph in section
+    )
+    noise = "\n".join(
+        f"<li><a href=\"/list?page={i}&amp;type={rng.randint(1, 9)}\">栏目{i}</a></li>" for i in range(40)
+    )
+    script = "var config = " + json.dumps({"items": [rng.random() for _ in range(size_kb * 4)]}) + ";"
+    image = "data:image/png;base64," + "iVBORw0KGgo" * (size_kb * 8)
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{cause}_{court}</title>
+<style>.detail_txt p {{ line-height: 2; }} .nav li {{ float: left; }}</style>
+<script>{script}</script></head>
+<body><div class="nav"><ul>{noise}</ul></div>
+<div class="detail">
+<div class="detail_bigtitle">{plaintiff}与{defendant}{cause}一审民事判决书</div>
+<div class="detail_pnr"><span>{court}</span> <span>{case_number}</span></div>
+<div class="detail_txt">
+{body}
+</div>
+<div class="compile">责任编辑：{editor}</div>
+</div>
+<img src="{image}">
+<div class="footer">版权所有 &copy; 中国法院网</div>
+</body></html>
+"""
+
+def generate_corpus(output_dir, count, size_kb=40, seed=0):
+    """在 output_dir 中生成 count 篇合成文书，大小在 size_kb 的 0.5~1.5 倍之间浮动；返回总字节数"""
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    total_bytes = 0
+    for i in range(count):
+        data = make_judgment_html(rng, max(1, int(size_kb * rng.uniform(0.5, 1.5)))).encode("utf-8")
+        with open(os.path.join(output_dir, f"case_{i:06d}.html"), "wb") as f:
+            f.write(data)
+        total_bytes += len(data)
+    return total_bytes
+
+# ------------------ 规范化对照 ------------------ #
+_NAIVE_SPACES = set("\t\x0b\x0c\xa0\u3000\u202f\u205f") | {chr(code) for code in range(0x2000, 0x200b)}
+_NAIVE_DELETED = set("\x00\xad\u200b\u200c\u200d\u2060\ufeff")
+_NAIVE_PUNCTUATION = {",": "，", ";": "；", ":": "：", "?": "？", "!": "！"}
+
+def _naive_normalize(text):
+    """与 judgment_normalize.normalize_text 结果相同，但逐行逐字在 Python 中处理"""
+    lines = []
+    for line in text.split("\n"):
+        chars = []
+        for ch in line:
+            code = ord(ch)
+            if ch in _NAIVE_SPACES:
+                ch = " "
+            elif ch in _NAIVE_DELETED:
+                continue
+            elif 0xFF10 <= code <= 0xFF19 or 0xFF21 <= code <= 0xFF3A or 0xFF41 <= code <= 0xFF5A:
+                ch = chr(code - 0xFEE0)
+            elif ch in _NAIVE_PUNCTUATION and chars and (
+                    "\u3400" <= chars[-1] <= "\u9fff" or "\uf900" <= chars[-1] <= "\ufaff"):
+                ch = _NAIVE_PUNCTUATION[ch]
+            chars.append(ch)
+        line = " ".join(part for part in "".join(chars).split(" ") if part)
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+# ------------------ 计时 ------------------ #
+def _peak_rss_kb():
+    """本进程与已结束子进程的峰值常驻内存（KB）；Windows 下没有 resource 模块，返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1024 if sys.platform == "darwin" else 1  # macOS 的单位是字节
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    return max(self_rss, children_rss)
+
+def _run_case(case, corpus_dir, work_dir, queue):
+    """在独立进程中运行一项测试，把 (耗时, 峰值内存) 放入 queue"""
+    try:
+        import judgment_cleaner
+        if case["kind"] == "extract":
+            documents = []
+            for name in sorted(os.listdir(corpus_dir)):
+                with open(os.path.join(corpus_dir, name), "r", encoding="utf-8") as f:
+                    documents.append(f.read())
+            started = time.perf_counter()
+            for document in documents:
+                judgment_cleaner.extract_case_fields(document, case["backend"])
+            seconds = time.perf_counter() - started
+        elif case["kind"] == "normalize":
+            from judgment_cleaner import TASK_BATCH_SIZE
+            from judgment_normalize import normalize_texts
+            texts = []
+            for name in sorted(os.listdir(corpus_dir)):
+                with open(os.path.join(corpus_dir, name), "r", encoding="utf-8") as f:
+                    record = judgment_cleaner.extract_case_fields(f.read(), "stream")
+                texts.extend(value for value in record.values() if isinstance(value, str))
+            started = time.perf_counter()
+            if case["method"] == "batch":
+                result = []
+                for i in range(0, len(texts), TASK_BATCH_SIZE):
+                    result.extend(normalize_texts(texts[i:i + TASK_BATCH_SIZE]))
+            else:
+                result = [_naive_normalize(text) for text in texts]
+            seconds = time.perf_counter() - started
+            if result != [_naive_normalize(text) for text in texts]:
+                raise RuntimeError("规范化结果与对照实现不一致")
+        else:
+            started = time.perf_counter()
+            stats = judgment_cleaner.run_parallel_extraction(
+                corpus_dir, work_dir, workers=case["workers"], backend=case["backend"],
+                output_mode=case["output_mode"],
+            )
+            seconds = time.perf_counter() - started
+            if stats["fail"]:
+                raise RuntimeError(f"{stats['fail']} 个文件处理失败：{stats['errors'][:3]}")
+        queue.put((seconds, _peak_rss_kb(), None))
+    except Exception as e:
+        queue.put((None, None, f"{type(e).__name__}: {e}"))
+
+def run_case(case, corpus_dir, repeat=3):
+    """重复运行一项测试，返回最快一次的耗时与各次中的最大峰值内存"""
+    context = multiprocessing.get_context("spawn")
+    best, peak = None, None
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix="cleaner_bench_out_")
+        try:
+            queue = context.Queue()
+            process = context.Process(target=_run_case, args=(case, corpus_dir, work_dir, queue))
+            process.start()
+            process.join()
+            # 结果只有几个数字，子进程退出前就能写完；队列为空说明子进程异常退出（如被 OOM 终止）
+            try:
+                seconds, rss, error = queue.get(timeout=5)
+            except Empty:
+                seconds, rss, error = None, None, f"进程异常退出，退出码 {process.exitcode}"
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if error:
+            raise RuntimeError(f"{case['name']} 运行失败：{error}")
+        best = seconds if best is None else min(best, seconds)
+        if rss is not None:
+            peak = rss if peak is None else max(peak, rss)
+    return best, peak
+
+def available_backends():
+    """bs4 未安装时只测 stream"""
+    from judgment_cleaner import EXTRACT_BACKENDS
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        return [backend for backend in EXTRACT_BACKENDS if backend != "bs4"]
+    return list(EXTRACT_BACKENDS)
+
+def build_cases(backends, workers_list, output_modes):
+    cases = []
+    for backend in backends:
+        cases.append({"name": f"extract/{backend}", "kind": "extract", "backend": backend})
+        for workers in workers_list:
+            for output_mode in output_modes:
+                cases.append({
+                    "name": f"pipeline/{backend}/{output_mode}/w{workers}", "kind": "pipeline",
+                    "backend": backend, "workers": workers, "output_mode": output_mode,
+                })
+    for method in ("naive", "batch"):
+        cases.append({"name": f"normalize/{method}", "kind": "normalize", "method": method})
+    return cases
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import bs4
+        info["bs4"] = bs4.__version__
+    except ImportError:
+        pass
+    return info
+
+def compare_results(current, baseline):
+    """按测试名对比两次结果，返回输出行；速度为 文件数/秒 的相对变化，正数表示更快"""
+    old = {result["name"]: result for result in baseline.get("results", [])}
+    lines = []
+    for result in current["results"]:
+        previous = old.get(result["name"])
+        if not previous:
+            lines.append(f"{result['name']:<40} 无对比数据")
+            continue
+        speed = result["files_per_sec"] / previous["files_per_sec"] - 1
+        line = f"{result['name']:<40} 速度 {speed:+.1%}"
+        if result.get("peak_rss_kb") and previous.get("peak_rss_kb"):
+            line += f"，峰值内存 {result['peak_rss_kb'] / previous['peak_rss_kb'] - 1:+.1%}"
+        lines.append(line)
+    if baseline.get("corpus") != current["corpus"]:
+        lines.append("注意：两次结果的语料参数不同，对比仅供参考")
+    return lines
+
+# ------------------ 命令行入口 ------------------ #
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="judgment_cleaner 基准测试")
+    parser.add_argument("--count", type=int, default=1000, help="合成文书的数量")
+    parser.add_argument("--size-kb", type=int, default=40, help="每篇文书的大致大小（KB）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，相同参数生成的语料完全相同")
+    parser.add_argument("--corpus-dir", default=None, help="语料目录；已存在时直接使用，默认使用临时目录")
+    parser.add_argument("--backends", nargs="+", default=None, help="要测试的解析方式，默认为全部可用的")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="pipeline 测试的进程数")
+    parser.add_argument("--output-modes", nargs="+", default=["per_file"], help="pipeline 测试的输出方式")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数，取最快一次")
+    parser.add_argument("-o", "--output", default=None, help="把结果写入该 JSON 文件")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="cleaner_bench_corpus_")
+    try:
+        if not os.path.isdir(corpus_dir) or not os.listdir(corpus_dir):
+            print(f"生成语料：{args.count} 篇，约 {args.size_kb} KB/篇 -> {corpus_dir}", file=sys.stderr)
+            generate_corpus(corpus_dir, args.count, args.size_kb, args.seed)
+        names = [name for name in os.listdir(corpus_dir) if name.lower().endswith(".html")]
+        total_bytes = sum(os.path.getsize(os.path.join(corpus_dir, name)) for name in names)
+
+        report = {
+            "schema": RESULT_SCHEMA,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment_info(),
+            "corpus": {"files": len(names), "bytes": total_bytes, "size_kb": args.size_kb, "seed": args.seed},
+            "results": [],
+        }
+        for case in build_cases(args.backends or available_backends(), sorted(set(args.workers)), args.output_modes):
+            seconds, peak_rss_kb = run_case(case, corpus_dir, args.repeat)
+            result = dict(case, seconds=round(seconds, 4),
+                          files_per_sec=round(len(names) / seconds, 2),
+                          mb_per_sec=round(total_bytes / 1024 / 1024 / seconds, 2),
+                          peak_rss_kb=peak_rss_kb)
+            report["results"].append(result)
+            print(f"{case['name']:<40} {result['files_per_sec']:>10.1f} 文件/秒 {result['mb_per_sec']:>8.2f} MB/秒 "
+                  f"峰值内存 {peak_rss_kb if peak_rss_kb is not None else '-'} KB", file=sys.stderr)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for line in compare_results(report, baseline):
+            print(line, file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+training_log 的基准测试：生成合成的训练日志，分别计时原来的逐行三次 re.search 写法（legacy）
+与单遍解析（single_pass 单进程提取全部指标，selected 单进程只提取 loss 与 lr，parallel 使用 --workers 个进程），以及单遍解析后写出各种格式（write_csv 等）的总耗时，输出 行数/秒、MB/秒 与峰值内存，结果保存为 JSON。
+
+    python benchmark_training_log.py --lines 10000000 -o bench_log.json
+    python benchmark_training_log.py --lines 10000000 --log-file big.log --compare bench_log.json
+
+legacy 与各解析测试只算到得到 DataFrame 为止，不含写文件；legacy 只保留同时有步数、loss、lr 的行，
+单遍解析还保留评估行等只有部分指标的行，记录数因此略多。write_* 写到临时文件，
+write_excel 超过 Excel 行数上限时会失败，请配合较小的 --lines 使用。每项测试在单独启动（spawn）的进程中运行，
+峰值内存互不影响。合成日志每行约 150 字节，一千万行约 1.5 GB。
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from queue import Empty
+
+from benchmark_cleaner import _peak_rss_kb, environment_info
+
+RESULT_SCHEMA = 1
+CASES = ("legacy", "single_pass", "selected", "parallel", "write_csv", "write_parquet", "write_feather", "write_excel")
+DEFAULT_CASES = ("legacy", "single_pass", "selected", "parallel", "write_csv", "write_parquet")
+
+# ------------------ 合成日志 ------------------ #
+def generate_log(path, lines, seed=0, eval_every=500):
+    """
+    写入 lines 行合成训练日志：大部分是带 (步数/总步数)、loss、lr、grad_norm 等字段的训练行，
+    每 eval_every 步一行评估结果，另有少量不含指标的杂项行。返回文件字节数。
+    """
+    rng = random.Random(seed)
+    total_steps = lines
+    loss = 3.0
+    with open(path, "w", encoding="utf-8") as f:
+        buffer = []
+        for step in range(1, lines + 1):
+            loss = max(0.05, loss * 0.99995 + rng.gauss(0, 0.01))
+            lr = 5e-4 * min(1.0, step / 2000) * (1 - step / (total_steps + 1))
+            if step % eval_every == 0:
+                buffer.append(f"[2024-05-01 12:00:00] INFO eval step {step}: eval_loss:{loss * 1.05:.4f}\n")
+            elif step % 997 == 0:
+                buffer.append(f"[2024-05-01 12:00:00] INFO saving checkpoint to output/checkpoint-{step}\n")
+            else:
+                buffer.append(
+                    f"[2024-05-01 12:00:00] INFO epoch:{step * 3 // total_steps} ({step}/{total_steps}) "
+                    f"loss:{loss:.4f} lr:{lr:.12f} grad_norm:{rng.uniform(0.2, 2.0):.4f} "
+                    f"tokens/s:{rng.uniform(4000, 6000):.1f}\n"
+                )
+            if len(buffer) >= 100000:
+                f.write("".join(buffer))
+                buffer.clear()
+        f.write("".join(buffer))
+    return os.path.getsize(path)
+
+# ------------------ 原来的写法（对照） ------------------ #
+def _legacy_dataframe(path):
+    """los2.convert_file 原来的解析：每行三次 re.search，先攒成列表再建 DataFrame"""
+    import pandas as pd
+
+    data = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            step_match = re.search(r'\((\d+)/', line)
+            loss_match = re.search(r'loss:(\d+\.?\d*)', line)
+            lr_match = re.search(r'lr:(\d+\.?\d*)', line)
+            if step_match and loss_match and lr_match:
+                data.append([step_match.group(1), loss_match.group(1), float(lr_match.group(1)) * 10000])
+    return pd.DataFrame(data, columns=["步数", "损失率", "lr*10000"])
+
+# ------------------ 计时 ------------------ #
+def _run_case(case, log_path, workers, queue):
+    """在独立进程中运行一项测试，把 (耗时, 行数, 峰值内存, 错误) 放入 queue"""
+    try:
+        started = time.perf_counter()
+        if case == "legacy":
+            rows = len(_legacy_dataframe(log_path))
+        elif case in ("single_pass", "parallel"):
+            from training_log import parse_log, to_dataframe
+            rows = len(to_dataframe(parse_log(log_path, workers=workers if case == "parallel" else 1)))
+        elif case == "selected":
+            from training_log import parse_log, to_dataframe
+            metrics = ("loss", "lr")
+            rows = len(to_dataframe(parse_log(log_path, metrics=metrics), metrics))
+        else:
+            from training_log import OUTPUT_FORMATS, parse_log, to_dataframe, write_table
+            fmt = case[len("write_"):]
+            df = to_dataframe(parse_log(log_path))
+            fd, output_path = tempfile.mkstemp(prefix="training_log_bench_", suffix=OUTPUT_FORMATS[fmt])
+            os.close(fd)
+            try:
+                write_table(df, output_path, fmt)
+            finally:
+                os.remove(output_path)
+            rows = len(df)
+        queue.put((time.perf_counter() - started, rows, _peak_rss_kb(), None))
+    except Exception as e:
+        queue.put((None, None, None, f"{type(e).__name__}: {e}"))
+
+def run_case(case, log_path, repeat=1, workers=None):
+    """重复运行一项测试，返回最快一次的耗时、记录行数与最大峰值内存"""
+    context = multiprocessing.get_context("spawn")
+    best, rows, peak = None, None, None
+    for _ in range(repeat):
+        queue = context.Queue()
+        process = context.Process(target=_run_case, args=(case, log_path, workers, queue))
+        process.start()
+        process.join()
+        try:
+            seconds, rows, rss, error = queue.get(timeout=5)
+        except Empty:
+            seconds, rss, error = None, None, f"进程异常退出，退出码 {process.exitcode}"
+        if error:
+            raise RuntimeError(f"{case} 运行失败：{error}")
+        best = seconds if best is None else min(best, seconds)
+        if rss is not None:
+            peak = rss if peak is None else max(peak, rss)
+    return best, rows, peak
+
+# ------------------ 命令行入口 ------------------ #
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="training_log 基准测试")
+    parser.add_argument("--lines", type=int, default=10_000_000, help="合成日志的行数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--log-file", default=None, help="日志文件路径；已存在时直接使用，默认使用临时文件")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(DEFAULT_CASES), help="要运行的测试")
+    parser.add_argument("--workers", type=int, default=None, help="parallel 使用的进程数，默认全部 CPU 核心")
+    parser.add_argument("--repeat", type=int, default=1, help="每项测试重复次数，取最快一次")
+    parser.add_argument("-o", "--output", default=None, help="把结果写入该 JSON 文件")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.log_file:
+        log_path = args.log_file
+    else:
+        fd, log_path = tempfile.mkstemp(prefix="training_log_bench_", suffix=".log")
+        os.close(fd)
+    try:
+        if not os.path.exists(log_path) or not os.path.getsize(log_path):
+            print(f"生成日志：{args.lines} 行 -> {log_path}", file=sys.stderr)
+            generate_log(log_path, args.lines, args.seed)
+        total_bytes = os.path.getsize(log_path)
+        report = {
+            "schema": RESULT_SCHEMA,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment_info(),
+            "log": {"lines": args.lines, "bytes": total_bytes, "seed": args.seed},
+            "workers": args.workers or os.cpu_count(),
+            "results": [],
+        }
+        for case in args.cases:
+            seconds, rows, peak_rss_kb = run_case(case, log_path, args.repeat, args.workers)
+            result = {
+                "name": case, "seconds": round(seconds, 4), "rows": rows,
+                "lines_per_sec": round(args.lines / seconds, 1),
+                "mb_per_sec": round(total_bytes / 1024 / 1024 / seconds, 2),
+                "peak_rss_kb": peak_rss_kb,
+            }
+            report["results"].append(result)
+            print(f"{case:<12} {result['lines_per_sec']:>12.0f} 行/秒 {result['mb_per_sec']:>8.2f} MB/秒 "
+                  f"峰值内存 {peak_rss_kb if peak_rss_kb is not None else '-'} KB（{rows} 条记录）", file=sys.stderr)
+    finally:
+        if not args.log_file and os.path.exists(log_path):
+            os.remove(log_path)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = {result["name"]: result for result in json.load(f).get("results", [])}
+        for result in report["results"]:
+            previous = baseline.get(result["name"])
+            if previous:
+                print(f"{result['name']:<12} 速度 {result['lines_per_sec'] / previous['lines_per_sec'] - 1:+.1%}",
+                      file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+"""
+聊天记录导出文件的解析与合并逻辑，不依赖任何界面；cex.py 是它的 Tk 图形界面。
+
+导出文件中每条消息以“日期 时间 说话人”一行开头，其后若干行为发言内容，例如：
+
+    2022-11-16 14:20:06 Isaac
+    你好
+    2022-11-16 14:20:31 Alice
+    在吗
+
+大量消息用 ChatEntries 按列紧凑存储：时间为 epoch 秒数组，说话人为编号，正文只记录在文件映射（mmap）中的位置，
+每条消息约 30 字节，几千万条消息也能在一台机器上解析并保存（load_entries）。多个文件的表按时间做 k 路归并
+（ChatEntries.iter_time_ordered），每次只产出一小块按时间排列的消息，不做全局排序，也不复制整个表。
+
+也可以逐条处理：多个文件按时间合并时不再全部读入后排序：每个文件惰性地逐条解析，用堆做 k 路归并（heapq.merge），
+内存只与文件数有关，耗时 O(n log k)。导出文件本身按时间排列，归并前只扫描一遍各文件的时间戳确认这一点，
+个别时间乱序的文件才整个读入后排序。合并同一说话人、配对问答也都逐条处理，整个流程只保存输出的问答对。
+
+逐条处理只用标准库；按列存储（ChatEntries 及 parse_file_columnar、load_entries 等）需要 numpy，在用到时才导入。
+"""
+import re
+import mmap
+import heapq
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+# 形如 "2022-11-16 14:20:06 Isaac" 的行；group(1) 是日期，group(2) 是时间，group(3) 是人名
+HEADER_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})\s+(\d{2}:\d{2}:\d{2})\s+(\S+)')
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 问答对中作为 output 的说话人，按聊天记录中的名字修改
+ISAAC_NAME = "Isaac"
+# 按列解析时每次处理的字节数，块内的切分结果是 Python 对象，块越大占用的内存越多
+READ_CHUNK_BYTES = 16 * 1024 * 1024
+# 按时间归并 ChatEntries 时每个文件每次最多取出的消息数
+MERGE_BLOCK_SIZE = 64 * 1024
+# str.strip 会去掉的空白字符的 UTF-8 编码，按字节匹配消息开头的行时用它与按行 strip 后的结果保持一致
+_SPACE = rb'(?:[\t\x0b\x0c\r\x1c-\x1f ]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)'
+# 按字节切分时消息开头的行，含前面的换行；以字面量换行开头，正则引擎可以快速跳过正文
+_HEADER_LINE = re.compile(
+    rb'(\n' + _SPACE + rb'*\d{4}-\d\d-\d\d' + _SPACE + rb'+\d\d:\d\d:\d\d' + _SPACE + rb'+[^\s][^\n]*)'
+)
+# 不是“日期 单个空格 时间 单个空格 人名”标准排列的行，用它取出各部分
+_HEADER_FIELDS = re.compile(
+    rb'\n' + _SPACE + rb'*(\d{4}-\d\d-\d\d)' + _SPACE + rb'+(\d\d:\d\d:\d\d)' + _SPACE + rb'+(.*)', re.S
+)
+_EPOCH = datetime(1970, 1, 1)
+
+# ------------------ 单个文件 ------------------ #
+def _parse_timestamp(date, time):
+    """
+    "2022-11-16" 与 "14:20:06" 按固定位置切片转为 datetime，比 datetime.strptime 快得多；
+    日期或时间无效时同样抛出 ValueError
+    """
+    return datetime(int(date[:4]), int(date[5:7]), int(date[8:10]), int(time[:2]), int(time[3:5]), int(time[6:8]))
+
+def iter_file_entries(file_path):
+    """
+    逐条解析单个文件，依次产出 (datetime 对象, 说话人, 发言内容)，发言内容的多行以换行连接，
+    空行与第一条消息之前的内容忽略，没有内容的消息不产出。不做同一个人连续发言的合并，也不排序。
+    """
+    current_timestamp = None
+    current_speaker = None
+    current_text_lines = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            raw = line.rstrip('\n').strip()
+            if not raw:
+                continue
+            match = HEADER_PATTERN.match(raw)
+            if match:
+                # 遇到新的“日期时间+人名”行，先产出上一条
+                if current_timestamp and current_text_lines:
+                    yield current_timestamp, current_speaker, "\n".join(current_text_lines)
+                current_timestamp = _parse_timestamp(match.group(1), match.group(2))
+                current_speaker = match.group(3)
+                current_text_lines = []
+            else:
+                current_text_lines.append(raw)
+    if current_timestamp and current_text_lines:
+        yield current_timestamp, current_speaker, "\n".join(current_text_lines)
+
+def parse_file_to_entries(file_path):
+    """解析单个文件，返回 [(datetime 对象, 说话人, 发言内容), ...]，见 iter_file_entries"""
+    return list(iter_file_entries(file_path))
+
+def is_time_ordered(file_path):
+    """
+    文件中各消息的时间是否非递减。只匹配消息开头的行、比较时间字符串（固定格式，字符串顺序即时间顺序），
+    不解析 datetime 也不保存内容，比完整解析快得多。没有内容的消息不会被产出，其时间也不参与比较。
+    """
+    previous = None
+    pending = None
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            raw = line.strip()
+            if not raw:
+                continue
+            match = HEADER_PATTERN.match(raw)
+            if match:
+                pending = (match.group(1), match.group(2))
+            elif pending is not None:
+                # 消息有了内容，才会出现在解析结果中
+                if previous is not None and pending < previous:
+                    return False
+                previous, pending = pending, None
+    return True
+
+# ------------------ 多个文件 ------------------ #
+def iter_entries_in_time_order(file_paths):
+    """
+    按时间顺序逐条产出多个文件中的全部消息 (datetime 对象, 说话人, 发言内容)。
+    按时间排列的文件惰性解析后用 heapq.merge 做 k 路归并；时间乱序的文件整个读入后排序再参与归并。
+    时间相同的消息，先给出的文件在前，同一文件内保持原来的顺序，与全部读入后稳定排序的结果相同。
+    """
+    streams = []
+    for path in file_paths:
+        if is_time_ordered(path):
+            streams.append(iter_file_entries(path))
+        else:
+            streams.append(sorted(iter_file_entries(path), key=itemgetter(0)))
+    return heapq.merge(*streams, key=itemgetter(0))
+
+def parse_multiple_files_with_time_sort(file_paths):
+    """
+    解析多个文件，按时间顺序返回 [(datetime 对象, 说话人, 发言内容), ...]，不进行同说话人的合并。
+    结果整个放在内存中；大量数据请直接迭代 iter_entries_in_time_order。
+    """
+    return list(iter_entries_in_time_order(file_paths))
+
+# ------------------ 合并与配对 ------------------ #
+def iter_merged_by_speaker(entries):
+    """
+    对按时间排列的消息（列表或迭代器）逐条处理：相邻的同一说话人的发言合并为一条，
+    依次产出 (说话人, 合并后的内容)。合并后只用于问答配对，不再需要时间。
+    """
+    current_speaker = None
+    current_texts = []
+    for _, speaker, text in entries:
+        if current_texts and speaker != current_speaker:
+            yield current_speaker, "\n".join(current_texts)
+            current_texts = []
+        current_speaker = speaker
+        current_texts.append(text)
+    if current_texts:
+        yield current_speaker, "\n".join(current_texts)
+
+def merge_consecutive_same_speaker(sorted_entries):
+    """返回 [(说话人, 合并后的内容), ...]，见 iter_merged_by_speaker"""
+    return list(iter_merged_by_speaker(sorted_entries))
+
+def create_rounds_nonIsaac_to_Isaac(merged_list, output_speaker=ISAAC_NAME):
+    """
+    只保留 (非 output_speaker) -> (output_speaker) 这样的相邻对话，
+    instruction 为前者，output 为后者；已配对的两条不再参与下一次配对。merged_list 可以是迭代器。
+    """
+    rounds = []
+    previous = None
+    for speaker, text in merged_list:
+        if previous is not None and previous[0] != output_speaker and speaker == output_speaker:
+            rounds.append({
+                "instruction": previous[1],
+                "output": text
+            })
+            previous = None
+        else:
+            previous = (speaker, text)
+    return rounds
+
+# ------------------ 按列存储 ------------------ #
+def _clean_text(raw):
+    """正文的原始字节转为发言内容：每行去掉首尾空白、去掉空行，以换行连接，与 iter_file_entries 相同"""
+    lines = raw.decode("utf-8").replace("\r", "\n").split("\n")
+    return "\n".join(line for line in (line.strip() for line in lines) if line)
+
+def _has_text(stripped):
+    """去掉 ASCII 空白后的正文中是否还有非空白字符；开头是其他空白字符时才需要解码判断"""
+    if not stripped:
+        return False
+    first = stripped[0]
+    return not (first >= 0x80 or 0x1c <= first <= 0x1f) or not stripped.decode("utf-8", "replace").isspace()
+
+def _chunk_bounds(data, chunk_size):
+    """把 data（bytes 或 mmap）切成约 chunk_size 字节、在换行之后结束的区间，返回 [(起, 止), ...]"""
+    bounds = []
+    start, size = 0, len(data)
+    while start < size:
+        end = data.find(b"\n", min(start + chunk_size, size) - 1)
+        end = size if end < 0 else end + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def _is_ascii_digit(column):
+    return (column >= ord("0")) & (column <= ord("9"))
+
+def _digits_text(digits):
+    """_epoch_seconds 中减去 ord("0") 后的一行数字还原为文字"""
+    import numpy as np
+    return (digits + ord("0")).astype(np.uint8).tobytes().decode()
+
+def _epoch_seconds(dates, times):
+    """
+    dates 为 (n, 10) 的 "YYYY-MM-DD" 字节矩阵，times 为 (n, 8) 的 "HH:MM:SS" 字节矩阵，按固定位置取数字，
+    整体换算为 epoch 秒数（把时间当作 UTC）；有无效的日期或时间时抛出 ValueError
+    """
+    import numpy as np
+    dates = dates.astype(np.int64) - ord("0")
+    times = times.astype(np.int64) - ord("0")
+    year = dates[:, 0] * 1000 + dates[:, 1] * 100 + dates[:, 2] * 10 + dates[:, 3]
+    month = dates[:, 5] * 10 + dates[:, 6]
+    day = dates[:, 8] * 10 + dates[:, 9]
+    hour = times[:, 0] * 10 + times[:, 1]
+    minute = times[:, 3] * 10 + times[:, 4]
+    second = times[:, 6] * 10 + times[:, 7]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[np.clip(month, 0, 12)]
+    month_days = month_days + (leap & (month == 2))
+    invalid = ((year < 1) | (month < 1) | (month > 12) | (day < 1) | (day > month_days)
+               | (hour > 23) | (minute > 59) | (second > 59))
+    if invalid.any():
+        row = np.flatnonzero(invalid)[0]
+        raise ValueError(f"无效的时间：{_digits_text(dates[row])} {_digits_text(times[row])}")
+    # 公历日期到 1970-01-01 的天数（H. Hinnant 的 days_from_civil）
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+    return days * 86400 + hour * 3600 + minute * 60 + second
+
+class _SpeakerIds(dict):
+    """{消息开头行中时间之后的原始字节: 说话人编号}；新出现时解码取出人名，同名的说话人共用一个编号"""
+
+    def __init__(self):
+        super().__init__()
+        self.names = []
+        self._by_name = {}
+
+    def __missing__(self, raw):
+        name = re.match(r"\S+", raw.decode("utf-8")).group()
+        index = self._by_name.setdefault(name, len(self.names))
+        if index == len(self.names):
+            self.names.append(name)
+        self[raw] = index
+        return index
+
+class ChatEntries:
+    """
+    按列紧凑存储的消息表，每条消息约 30 字节（另加文件映射本身，由操作系统按需换入换出）：
+      - times：int64 数组，时间的 epoch 秒数（把记录中的时间当作 UTC，只用于排序与还原，不做时区换算）；
+      - speaker_ids：int32 数组，说话人在 speakers 列表中的编号，同名说话人只存一份；
+      - sources、starts、ends：正文在第几个缓冲区（文件的 mmap）中的 [起, 止) 字节位置。
+    正文在访问时才从缓冲区中取出、解码并去掉空行与每行首尾的空白，与 iter_file_entries 的结果相同。
+    迭代时产出 (datetime 对象, 说话人, 发言内容)。take、concat 得到的表与原表共用缓冲区，
+    全部用完后调用 close()（或用 with）关闭映射。
+    """
+
+    def __init__(self, times, speaker_ids, speakers, sources, starts, ends, buffers):
+        self.times = times
+        self.speaker_ids = speaker_ids
+        self.speakers = speakers
+        self.sources = sources
+        self.starts = starts
+        self.ends = ends
+        self.buffers = buffers
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for i in range(len(self.times)):
+            yield self.timestamp(i), self.speaker(i), self.text(i)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for buffer in self.buffers:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    def timestamp(self, i):
+        return _EPOCH + timedelta(seconds=int(self.times[i]))
+
+    def speaker(self, i):
+        return self.speakers[self.speaker_ids[i]]
+
+    def text(self, i):
+        return _clean_text(self.buffers[self.sources[i]][self.starts[i]:self.ends[i]])
+
+    def take(self, index):
+        """按下标数组（或布尔数组）取出部分消息，组成新的表"""
+        return ChatEntries(self.times[index], self.speaker_ids[index], self.speakers, self.sources[index],
+                           self.starts[index], self.ends[index], self.buffers)
+
+    def sort_by_time(self):
+        """按时间稳定排序：时间相同的消息保持原来的先后顺序"""
+        import numpy as np
+        return self.take(np.argsort(self.times, kind="stable"))
+
+    def iter_time_ordered(self, block_size=MERGE_BLOCK_SIZE):
+        """
+        按时间顺序依次产出若干小表，连起来与 sort_by_time() 相同，但不做全局排序，也不复制整个表。
+        来自同一缓冲区（文件）的相邻消息为一段，各段先各自按时间排列（本身有序的段不动，乱序的段只排序这一段），
+        再做 k 路归并：每一步以各段接下来 block_size 条消息中最后时间的最小值为界，
+        用二分查找取出各段中不晚于界的消息，只对这一块稳定排序后产出。每块最多约 block_size × 段数条消息。
+        """
+        import numpy as np
+        bounds = np.flatnonzero(self.sources[1:] != self.sources[:-1]) + 1
+        runs = []
+        for begin, end in zip([0] + bounds.tolist(), bounds.tolist() + [len(self)]):
+            times = self.times[begin:end]
+            if np.all(times[1:] >= times[:-1]):
+                runs.append((times, begin, None))
+            else:
+                order = np.argsort(times, kind="stable")
+                runs.append((times[order], begin, order + begin))
+        cursors = [0] * len(runs)
+        while True:
+            live = [i for i, (times, _, _) in enumerate(runs) if cursors[i] < len(times)]
+            if not live:
+                return
+            cutoff = min(runs[i][0][min(cursors[i] + block_size, len(runs[i][0])) - 1] for i in live)
+            pieces = []
+            for i in live:
+                times, begin, order = runs[i]
+                stop = cursors[i] + int(np.searchsorted(times[cursors[i]:], cutoff, "right"))
+                if order is None:
+                    pieces.append(np.arange(begin + cursors[i], begin + stop))
+                else:
+                    pieces.append(order[cursors[i]:stop])
+                cursors[i] = stop
+            index = np.concatenate(pieces)
+            if len(pieces) > 1:
+                # 各段按先后拼接后稳定排序，时间相同的消息仍按原来的先后顺序
+                index = index[np.argsort(self.times[index], kind="stable")]
+            yield self.take(index)
+
+    @classmethod
+    def concat(cls, tables):
+        """按顺序拼接多个表，说话人按名字重新编号"""
+        import numpy as np
+        tables = list(tables)
+        buffers = [buffer for table in tables for buffer in table.buffers]
+        if len(buffers) > np.iinfo(np.uint16).max + 1:
+            raise ValueError("一次最多合并 65536 个文件")
+        by_name = {}
+        speaker_ids, sources = [np.empty(0, np.int32)], [np.empty(0, np.uint16)]
+        base = 0
+        for table in tables:
+            mapping = np.array([by_name.setdefault(name, len(by_name)) for name in table.speakers], np.int32)
+            speaker_ids.append(mapping[table.speaker_ids] if len(mapping) else table.speaker_ids)
+            sources.append((table.sources + base).astype(np.uint16))
+            base += len(table.buffers)
+
+        def joined(name):
+            return np.concatenate([np.empty(0, np.int64)] + [getattr(table, name) for table in tables])
+
+        return cls(joined("times"), np.concatenate(speaker_ids), list(by_name), np.concatenate(sources),
+                   joined("starts"), joined("ends"), buffers)
+
+    def iter_merged_by_speaker(self):
+        """同 iter_merged_by_speaker(self)：相邻同一说话人的发言合并，但按编号整体找出各段，不必逐条比较与生成时间"""
+        return iter_blocks_merged_by_speaker([self])
+
+def iter_blocks_merged_by_speaker(blocks):
+    """
+    对依次给出的若干 ChatEntries（如 iter_time_ordered 产出的各块，说话人编号相同）做 iter_merged_by_speaker：
+    每块内按编号整体找出同一说话人的各段，块末尾的一段与下一块开头同一说话人的消息继续合并。
+    """
+    import numpy as np
+    speaker, texts = None, []
+    for block in blocks:
+        if not len(block):
+            continue
+        bounds = np.flatnonzero(block.speaker_ids[1:] != block.speaker_ids[:-1]) + 1
+        starts = np.concatenate(([0], bounds)).tolist()
+        stops = np.concatenate((bounds, [len(block)])).tolist()
+        for start, stop in zip(starts, stops):
+            name = block.speaker(start)
+            if texts and name != speaker:
+                yield speaker, "\n".join(texts)
+                texts = []
+            speaker = name
+            texts.extend(block.text(i) for i in range(start, stop))
+    if texts:
+        yield speaker, "\n".join(texts)
+
+def _parse_chunk_columns(data, start, speaker_ids):
+    """
+    解析从 start 开始、在换行处结束的一块 data（前面补了一个换行），返回
+    (首条消息之前的正文的 [起, 止)、是否有内容, 各列数组)。各消息正文的位置为文件中的绝对位置。
+    """
+    import numpy as np
+    pieces = _HEADER_LINE.split(data)
+    # pieces 为 [首条消息之前的正文, 开头行, 正文, 开头行, 正文, ...]；位置由各段长度累加得到，
+    # 补的换行使位置整体后移一个字节
+    lengths = np.fromiter(map(len, pieces), np.int64, len(pieces))
+    positions = np.concatenate(([0], np.cumsum(lengths))) + (start - 1)
+    lead = (positions[0], positions[1], _has_text(pieces[0].strip()))
+    headers = pieces[1::2]
+    count = len(headers)
+    if not count:
+        return lead, None
+
+    # 标准排列“\n日期 时间 人名”时按固定位置切片，其余的行用正则取出各部分；
+    # 人名的首字节可能是其他空白字符的开头（0xc2、0xe1、0xe2、0xe3）时也交给正则，常用汉字不在其中
+    header_bytes = np.frombuffer(b"".join(headers), np.uint8)
+    offsets = np.concatenate(([0], np.cumsum(lengths[1::2])[:-1]))
+    name_start = header_bytes[offsets + 21]
+    standard = (_is_ascii_digit(header_bytes[offsets + 1]) & (header_bytes[offsets + 11] == ord(" "))
+                & _is_ascii_digit(header_bytes[offsets + 12]) & (header_bytes[offsets + 20] == ord(" "))
+                & (name_start > ord(" ")) & ~np.isin(name_start, (0x1c, 0x1d, 0x1e, 0x1f, 0xc2, 0xe1, 0xe2, 0xe3)))
+    dates = header_bytes[offsets[:, None] + np.arange(1, 11)]
+    times = header_bytes[offsets[:, None] + np.arange(12, 20)]
+    rest = [header[21:] for header in headers]
+    for row in np.flatnonzero(~standard).tolist():
+        date, time, rest[row] = _HEADER_FIELDS.match(headers[row]).groups()
+        dates[row] = np.frombuffer(date, np.uint8)
+        times[row] = np.frombuffer(time, np.uint8)
+
+    columns = {
+        "times": _epoch_seconds(dates, times),
+        "speaker_ids": np.fromiter(map(speaker_ids.__getitem__, rest), np.int32, count),
+        "starts": positions[2::2],
+        "ends": positions[3::2],
+        "has_text": np.fromiter(map(_has_text, map(bytes.strip, pieces[2::2])), bool, count),
+    }
+    return lead, columns
+
+def parse_file_columnar(file_path, chunk_size=READ_CHUNK_BYTES):
+    """
+    解析单个文件为 ChatEntries，消息与 iter_file_entries 相同、顺序也相同。
+    文件以 mmap 映射，按约 chunk_size 字节在换行处切块；每块用一次正则切分找出所有消息开头的行，
+    时间按固定位置整体换算，说话人经字典映射为编号，正文只记录位置。没有内容的消息去掉。
+    """
+    import numpy as np
+    with open(file_path, "rb") as f:
+        size = f.seek(0, 2)
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+    speaker_ids = _SpeakerIds()
+    parts = []
+    try:
+        for start, end in _chunk_bounds(buffer, chunk_size):
+            lead, columns = _parse_chunk_columns(b"\n" + buffer[start:end], start, speaker_ids)
+            if parts:
+                # 块开头的正文属于上一块的最后一条消息
+                previous = parts[-1]
+                previous["ends"][-1] = lead[1]
+                previous["has_text"][-1] |= lead[2]
+            if columns is not None:
+                parts.append(columns)
+    except Exception:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+        raise
+    if parts:
+        keep = np.concatenate([part["has_text"] for part in parts])
+        columns = {name: np.concatenate([part[name] for part in parts])[keep]
+                   for name in ("times", "speaker_ids", "starts", "ends")}
+    else:
+        columns = {"times": np.empty(0, np.int64), "speaker_ids": np.empty(0, np.int32),
+                   "starts": np.empty(0, np.int64), "ends": np.empty(0, np.int64)}
+    sources = np.zeros(len(columns["times"]), np.uint16)
+    return ChatEntries(columns["times"], columns["speaker_ids"], speaker_ids.names, sources,
+                       columns["starts"], columns["ends"], [buffer])
+
+def load_entries(file_paths, chunk_size=READ_CHUNK_BYTES):
+    """
+    解析多个文件，按文件顺序拼接为一个 ChatEntries（不排序）；用 iter_time_ordered 按时间逐块取出，
+    结果与 iter_entries_in_time_order 相同。
+    """
+    return ChatEntries.concat([parse_file_columnar(path, chunk_size) for path in file_paths])
+
+def load_entries_in_time_order(file_paths, chunk_size=READ_CHUNK_BYTES):
+    """
+    解析多个文件，按时间稳定排序后返回一个 ChatEntries，顺序与 iter_entries_in_time_order 相同。
+    排序后的表是整个表的一份副本；只需按顺序处理一遍时用 load_entries 与 iter_time_ordered。
+    """
+    return load_entries(file_paths, chunk_size).sort_by_time()
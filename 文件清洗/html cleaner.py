@@ -1,8 +1,11 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
-import json
-from bs4 import BeautifulSoup
+import threading
+import time
+# 提取、增量清单与分片输出等逻辑都在 judgment_cleaner.py 中，命令行批量处理也请直接运行它
+from judgment_cleaner import DEDUP_MODES, EXTRACT_BACKENDS, OUTPUT_MODES, format_timings, run_parallel_extraction
+from judgment_rules import compile_rule_sets, load_rule_specs
 
 def select_input_directory():
     """选择存放 HTML 文件的文件夹"""
@@ -16,8 +19,14 @@ def select_output_directory():
     if directory:
         output_dir_var.set(directory)
 
+def select_rules_file():
+    """选择提取规则集 JSON 文件（可选）"""
+    path = filedialog.askopenfilename(filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")])
+    if path:
+        rules_file_var.set(path)
+
 def process_html_files():
-    """处理选定目录下的所有 HTML 文件，只保留案件名称到责任编辑的内容，并生成 -c.jsonl 文件"""
+    """处理选定目录下的所有 HTML 文件，只保留案件名称到责任编辑的内容，并生成 -c.jsonl 文件或合并分片"""
     input_dir = input_dir_var.get().strip()
     output_dir = output_dir_var.get().strip()
 
@@ -27,80 +36,174 @@ def process_html_files():
     if not os.path.isdir(output_dir):
         messagebox.showerror("错误", "请输入正确的输出目录")
         return
-
-    # 统计处理成功与失败的文件数量
-    success_count = 0
-    fail_count = 0
-
-    # 遍历目录下的所有文件
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith(".html"):
-            html_path = os.path.join(input_dir, filename)
-            try:
-                with open(html_path, "r", encoding="utf-8") as f:
-                    html_content = f.read()
-                soup = BeautifulSoup(html_content, "html.parser")
-
-                # 1) 找到案件名称所在的位置（例如 class="detail_bigtitle"）
-                title_div = soup.find("div", class_="detail_bigtitle")
-                case_name = title_div.get_text(strip=True) if title_div else ""
-
-                # 2) 找到正文内容所在的位置（例如 class="detail_txt"）
-                content_div = soup.find("div", class_="detail_txt")
-                content_text = content_div.get_text("\n", strip=True) if content_div else ""
-
-                # 3) 找到责任编辑（例如 class="compile" 且包含"责任编辑"）
-                editor_div = soup.find("div", class_="compile")
-                editor_text = editor_div.get_text(strip=True) if editor_div else ""
-                # 比如 editor_div 里可能是 "责任编辑：XX"，可视需要再做拆分
-                # 如果只想要人名，可以再做进一步处理:
-                # if "责任编辑：" in editor_text:
-                #     editor_text = editor_text.split("责任编辑：")[-1].strip()
-
-                # 组装我们需要的“案件名称 ~ 正文 ~ 责任编辑” 这部分内容
-                # 实际使用时，可根据需求自由拼接
-                filtered_content = {
-                    "case_name": case_name,
-                    "content": content_text,
-                    "editor": editor_text
-                }
-
-                # 输出的文件名：原文件名 + "-c.jsonl"
-                base_name, _ = os.path.splitext(filename)
-                output_file_name = base_name + "-c.jsonl"
-                output_file_path = os.path.join(output_dir, output_file_name)
-
-                # 写入 JSON Lines 格式（简单起见，这里只写一行）
-                with open(output_file_path, "w", encoding="utf-8") as out_f:
-                    json.dump(filtered_content, out_f, ensure_ascii=False)
-                    out_f.write("\n")
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                print(f"处理文件 {filename} 时出现错误：{e}")
-
-    messagebox.showinfo("完成", f"处理完成：\n成功 {success_count} 个，失败 {fail_count} 个。")
+    try:
+        workers = int(workers_var.get())
+    except (tk.TclError, ValueError):
+        messagebox.showerror("错误", "请输入正确的进程数")
+        return
+    try:
+        shard_max_records = int(shard_records_var.get())
+    except (tk.TclError, ValueError):
+        messagebox.showerror("错误", "请输入正确的分片条数")
+        return
+    rules_file = rules_file_var.get().strip()
+    try:
+        rule_specs = load_rule_specs(rules_file) if rules_file else None
+        compile_rule_sets(rule_specs or ())
+    except (OSError, ValueError) as e:
+        messagebox.showerror("错误", f"无法读取规则集文件：\n{e}")
+        return
+    compression = compression_var.get()
+    dedup = dedup_var.get()
+    options = {
+        "workers": workers,
+        "backend": backend_var.get(),
+        "incremental": incremental_var.get(),
+        "read_archives": archives_var.get(),
+        "output_mode": output_mode_var.get(),
+        "shard_max_records": shard_max_records,
+        "compression": None if compression == "无" else compression,
+        "dedup": None if dedup == "不去重" else dedup,
+        "rule_specs": rule_specs,
+        "sections": sections_var.get(),
+        "normalize": normalize_var.get(),
+        "metadata_index": index_var.get(),
+    }
+
+    start_button.config(state=tk.DISABLED)
+    status_label.config(text="处理中...")
+    # 在后台线程中调度进程池，防止界面卡顿；界面更新统一交回主线程
+    worker_thread = threading.Thread(
+        target=run_extraction_job,
+        args=(input_dir, output_dir, options),
+        daemon=True
+    )
+    worker_thread.start()
+
+def run_extraction_job(input_dir, output_dir, options):
+    """后台线程：执行并行处理，并把进度与结果交给主线程显示；options 为 run_parallel_extraction 的关键字参数"""
+    started = time.time()
+
+    def on_progress(done, total):
+        elapsed = time.time() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        root.after(0, status_label.config, {"text": f"处理中... {done}/{total}（{rate:.1f} 个/秒）"})
+
+    try:
+        stats = run_parallel_extraction(input_dir, output_dir, progress_callback=on_progress, **options)
+    except Exception as e:
+        root.after(0, finish_job, None, str(e))
+    else:
+        root.after(0, finish_job, stats, None)
+
+def finish_job(stats, error):
+    """主线程：恢复按钮并弹出结果"""
+    start_button.config(state=tk.NORMAL)
+    if error:
+        status_label.config(text="发生错误")
+        messagebox.showerror("错误", f"处理失败：\n{error}")
+        return
+    status_label.config(text=f"处理完成，用时 {stats['timings']['wall']:.1f} 秒")
+    worker_lines = "\n".join(
+        f"进程 {pid}: 成功 {s['success']} 个，失败 {s['fail']} 个"
+        for pid, s in sorted(stats["per_worker"].items())
+    )
+    messagebox.showinfo(
+        "完成",
+        f"处理完成：\n成功 {stats['success']} 个，失败 {stats['fail']} 个。\n"
+        f"未变化跳过 {stats['skipped']} 个，删除过期输出 {stats['removed']} 个。\n"
+        f"近重复 {stats['duplicates']} 个，超出预算隔离 {stats['quarantined']} 个。\n\n{worker_lines}\n\n"
+        + "\n".join(format_timings(stats, top=3))
+        + (f"\n\n错误报告：{stats['error_report']}" if stats["error_report"] else "")
+        + (f"\n元数据索引：{stats['index']}" if stats["index"] else "")
+    )
 
 # ------------------ GUI 部分 ------------------ #
-root = tk.Tk()
-root.title("HTML内容筛选并导出JSONL")
-
-# 输入目录与输出目录变量
-input_dir_var = tk.StringVar()
-output_dir_var = tk.StringVar()
-
-# 标签 + 文本框 + 按钮（选择 HTML 目录）
-tk.Label(root, text="HTML目录:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
-tk.Entry(root, textvariable=input_dir_var, width=40).grid(row=0, column=1, padx=5, pady=5)
-tk.Button(root, text="选择HTML目录", command=select_input_directory).grid(row=0, column=2, padx=5, pady=5)
-
-# 标签 + 文本框 + 按钮（选择输出目录）
-tk.Label(root, text="输出目录:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
-tk.Entry(root, textvariable=output_dir_var, width=40).grid(row=1, column=1, padx=5, pady=5)
-tk.Button(root, text="选择输出目录", command=select_output_directory).grid(row=1, column=2, padx=5, pady=5)
-
-# 开始处理按钮
-tk.Button(root, text="开始处理", command=process_html_files, width=15).grid(row=2, column=1, pady=10)
-
-root.mainloop()
+# 进程池在 Windows 下以 spawn 方式启动子进程，会重新导入本文件，
+# 因此界面只能在 __main__ 中创建
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("HTML内容筛选并导出JSONL")
+
+    # 输入目录与输出目录变量
+    input_dir_var = tk.StringVar()
+    output_dir_var = tk.StringVar()
+    # 并行进程数，默认使用全部 CPU 核心
+    workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+    # 解析方式，默认仍使用 bs4
+    backend_var = tk.StringVar(value=EXTRACT_BACKENDS[0])
+    # 增量处理：只处理新增或修改的文件
+    incremental_var = tk.BooleanVar(value=True)
+    # 对正文分段，生成问答对时可以只发送需要的部分
+    sections_var = tk.BooleanVar(value=True)
+    # 规范化空白与标点、去掉空行
+    normalize_var = tk.BooleanVar(value=True)
+    # 生成案号、法院、裁判日期、案由的元数据索引（需要 pyarrow）
+    index_var = tk.BooleanVar(value=False)
+    # 同时读取目录中的 zip/tar 压缩包
+    archives_var = tk.BooleanVar(value=True)
+    # 输出方式、分片压缩方式与每个分片的最大条数
+    output_mode_var = tk.StringVar(value=OUTPUT_MODES[0])
+    compression_var = tk.StringVar(value="无")
+    shard_records_var = tk.StringVar(value="100000")
+    # 近重复检测：drop 丢弃副本，tag 保留并标注
+    dedup_var = tk.StringVar(value="不去重")
+    # 其他网站页面模板的提取规则集文件，留空则只用内置规则
+    rules_file_var = tk.StringVar()
+
+    # 标签 + 文本框 + 按钮（选择 HTML 目录）
+    tk.Label(root, text="HTML目录:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+    tk.Entry(root, textvariable=input_dir_var, width=40).grid(row=0, column=1, padx=5, pady=5)
+    tk.Button(root, text="选择HTML目录", command=select_input_directory).grid(row=0, column=2, padx=5, pady=5)
+
+    # 标签 + 文本框 + 按钮（选择输出目录）
+    tk.Label(root, text="输出目录:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+    tk.Entry(root, textvariable=output_dir_var, width=40).grid(row=1, column=1, padx=5, pady=5)
+    tk.Button(root, text="选择输出目录", command=select_output_directory).grid(row=1, column=2, padx=5, pady=5)
+
+    # 标签 + 数字框（并行进程数）
+    tk.Label(root, text="进程数:").grid(row=2, column=0, padx=5, pady=5, sticky="e")
+    tk.Spinbox(root, from_=1, to=256, textvariable=workers_var, width=8).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
+    # 标签 + 下拉框（解析方式）
+    tk.Label(root, text="解析方式:").grid(row=3, column=0, padx=5, pady=5, sticky="e")
+    tk.OptionMenu(root, backend_var, *EXTRACT_BACKENDS).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+    tk.Checkbutton(root, text="正文分段（当事人/事实/本院认为/判决主文等）", variable=sections_var).grid(
+        row=3, column=2, padx=5, pady=5, sticky="w")
+
+    # 复选框（增量处理、读取压缩包）
+    tk.Checkbutton(root, text="增量处理（仅处理新增或修改的文件）", variable=incremental_var).grid(
+        row=4, column=1, padx=5, pady=5, sticky="w")
+    tk.Checkbutton(root, text="读取zip/tar压缩包", variable=archives_var).grid(
+        row=4, column=2, padx=5, pady=5, sticky="w")
+
+    # 标签 + 下拉框（输出方式与分片设置）
+    tk.Label(root, text="输出方式:").grid(row=5, column=0, padx=5, pady=5, sticky="e")
+    tk.OptionMenu(root, output_mode_var, *OUTPUT_MODES).grid(row=5, column=1, padx=5, pady=5, sticky="w")
+    tk.Checkbutton(root, text="规范化空白与标点", variable=normalize_var).grid(
+        row=5, column=2, padx=5, pady=5, sticky="w")
+    tk.Label(root, text="分片压缩:").grid(row=6, column=0, padx=5, pady=5, sticky="e")
+    tk.OptionMenu(root, compression_var, "无", "gzip", "zstd").grid(row=6, column=1, padx=5, pady=5, sticky="w")
+    tk.Label(root, text="每个分片条数:").grid(row=7, column=0, padx=5, pady=5, sticky="e")
+    tk.Entry(root, textvariable=shard_records_var, width=10).grid(row=7, column=1, padx=5, pady=5, sticky="w")
+
+    # 标签 + 下拉框（近重复检测）
+    tk.Label(root, text="近重复检测:").grid(row=8, column=0, padx=5, pady=5, sticky="e")
+    tk.OptionMenu(root, dedup_var, "不去重", *DEDUP_MODES).grid(row=8, column=1, padx=5, pady=5, sticky="w")
+    tk.Checkbutton(root, text="生成元数据索引（案号/法院/日期/案由）", variable=index_var).grid(
+        row=8, column=2, padx=5, pady=5, sticky="w")
+
+    # 标签 + 文本框 + 按钮（选择规则集文件）
+    tk.Label(root, text="规则集文件:").grid(row=9, column=0, padx=5, pady=5, sticky="e")
+    tk.Entry(root, textvariable=rules_file_var, width=40).grid(row=9, column=1, padx=5, pady=5)
+    tk.Button(root, text="选择规则文件", command=select_rules_file).grid(row=9, column=2, padx=5, pady=5)
+
+    # 开始处理按钮
+    start_button = tk.Button(root, text="开始处理", command=process_html_files, width=15)
+    start_button.grid(row=10, column=1, pady=10)
+
+    # 状态显示标签
+    status_label = tk.Label(root, text="等待处理")
+    status_label.grid(row=11, column=0, columnspan=3, pady=(0, 10))
+
+    root.mainloop()
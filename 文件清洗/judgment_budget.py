@@ -0,0 +1,198 @@
+"""
+单个页面的处理预算：防止个别超大或异常的页面拖垮整个批次。
+
+- 内存：超过 STRIP_THRESHOLD_BYTES 的页面分块读入，边读边去掉 <script>、<style> 的内容
+  和属性中 data: URI 的载荷（内嵌的图片、字体往往占了页面的绝大部分），
+  剥离后仍超过 max_bytes 的页面立即停止读取；
+- 时间：读取、解析与提取的总耗时超过 max_seconds 时中断。
+
+超出预算时抛出 BudgetExceeded，judgment_cleaner 把这样的页面记为“已隔离”，
+写入错误报告与清单，在文件变化或预算调整之前不再重试。
+
+剥离只清空内容、保留标签本身，并按 html.parser 的方式划分标记：注释、CDATA 与声明原样保留，
+data: 只在开始标签的属性值中剥离，正文里形如 x=data: 的文字不受影响，提取出的文字与不剥离时相同；
+但规则集的 markers 若只出现在脚本里，剥离后将无法命中，超大页面的模板特征应取自页面结构。
+"""
+import re
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+# 超过该大小的页面才边读边剥离，普通页面照常整体读入
+STRIP_THRESHOLD_BYTES = 1024 * 1024
+# 分块读取的块大小
+STRIP_CHUNK_BYTES = 1024 * 1024
+# 默认预算：剥离后的页面字节数与单个页面的处理秒数
+DEFAULT_MAX_HTML_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_SECONDS = 120.0
+
+# 开始标签的名字与 html.parser 的划分相同；script、style 的内容要剥离，其余标签只处理属性
+_TAG_NAME = rb"[a-zA-Z][^\t\n\r\f />\x00]*"
+_RAW_TEXT_TAGS = rb"(?i:script|style)(?![^\t\n\r\f />\x00])"
+# 开始标签中不含 data: URI 的属性，一直匹配到 > 之前。属性值必须完整地在缓冲区中（引号闭合、无引号的值之后
+# 还有空白或 >，= 之后至少还有 6 个字节可以判断是不是 data:），否则停在这个 = 处，由 _HtmlStripper 逐步处理
+_PLAIN_ATTRIBUTES = (rb"""(?:[^>=]+|=+\s*(?!["']?(?i:data):)(?=[\s\S]{6})"""
+                     rb"""(?:"[^"]*"|'[^']*'|[^>\s"'][^>\s]*(?=[>\s])|(?=[>\s])))*""")
+# 不需要剥离的内容：文字、结束标签，以及属性中没有 data: URI 的完整开始标签（script、style 除外）。
+# 一次 match 就能跳过页面的绝大部分，只有需要处理的位置才回到 Python 中。
+# 开始标签先在前瞻中匹配、再用反向引用取出，相当于原子分组：找不到 > 时不会回溯重试（否则是指数级的）
+_PLAIN = re.compile(rb"(?:[^<]+|<(?=[^a-zA-Z!?/])|</[^>]*>|<(?!" + _RAW_TEXT_TAGS + rb")(?=(?P<tag>" + _TAG_NAME
+                    + _PLAIN_ATTRIBUTES + rb"))(?P=tag)>)*")
+_PLAIN_TAG_ATTRIBUTES = re.compile(_PLAIN_ATTRIBUTES)
+# 需要处理的标记：注释、CDATA、其他 <! <? </ 开头的标记（原样保留到结束位置），或者开始标签
+_MARKUP_START = re.compile(rb"<(?:(!--|!\[(?i:CDATA)\[|[!?/])|(" + _TAG_NAME + rb"))")
+_MARKUP_END = {b"!--": re.compile(rb"-->"), b"![CDATA[": re.compile(rb"\]\]>"), None: re.compile(rb">")}
+# 开始标签中 = 之后的属性值：data: URI（引号），普通的带引号的值，或者无引号的值
+_ATTRIBUTE_VALUE = re.compile(rb"""=+\s*(?:(["']?)(?i:data):|(["'])|[^>\s]*)""")
+# 被剥离内容的结束位置，结束标签与引号本身保留。结束标签的写法比各版本的 html.parser 都宽松，
+# 不会比解析器更晚结束剥离
+_SKIP_END = {
+    b"script": re.compile(rb"</\s*script(?=[\s/>])", re.IGNORECASE),
+    b"style": re.compile(rb"</\s*style(?=[\s/>])", re.IGNORECASE),
+    b'"': re.compile(rb'"'),
+    b"'": re.compile(rb"'"),
+    b"": re.compile(rb"(?=[\s>])"),
+}
+# 未读完时块末尾保留的字节数，防止标记被块边界切开
+_TAIL_BYTES = 32
+# 标记跨块时最多等待的字节数，超过后按已读到的部分处理
+_MAX_CARRY_BYTES = 64 * 1024
+
+class BudgetExceeded(Exception):
+    """页面超出内存或时间预算"""
+
+class _HtmlStripper:
+    """
+    分块剥离 HTML 的状态机（见 read_stripped_html）：在文字中、在开始标签中（tag 为标签名），
+    或者在复制/丢弃内容直到某个结束位置（until 为 (结束位置的正则, 是否丢弃, 之后所在的标签)）。
+    注释、CDATA 等标记原样保留，其中的 <script> 与 data: 不会被当作标签与属性。
+    """
+
+    def __init__(self):
+        self.out = bytearray()
+        self.buf = b""
+        self.pos = 0
+        self.tag = None
+        self.until = None
+
+    def feed(self, chunk, eof=False):
+        """处理新读到的一块，eof 为 True 表示已经读完；剥离后的字节追加到 out"""
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        while self._step(eof):
+            pass
+
+    def _step(self, eof):
+        """处理一步，返回 False 表示需要更多数据（或已经处理完）"""
+        if self.until is not None:
+            return self._skip(eof)
+        if self.tag is not None:
+            return self._read_tag(eof)
+        return self._read_text(eof)
+
+    def _advance(self, end, drop=False):
+        if not drop:
+            self.out += self.buf[self.pos:end]
+        self.pos = end
+
+    def _waiting(self, end, eof):
+        """end 离缓冲区末尾太近，可能被块边界切开，需要等下一块"""
+        return not eof and end > len(self.buf) - _TAIL_BYTES and len(self.buf) - self.pos < _MAX_CARRY_BYTES
+
+    def _skip(self, eof):
+        pattern, drop, tag = self.until
+        match = pattern.search(self.buf, self.pos)
+        if match is None:
+            self._advance(len(self.buf) if eof else max(self.pos, len(self.buf) - _TAIL_BYTES), drop)
+            return False
+        self._advance(match.start(), drop)
+        self._advance(match.end())
+        self.until, self.tag = None, tag
+        return True
+
+    def _read_text(self, eof):
+        self._advance(_PLAIN.match(self.buf, self.pos).end())
+        match = _MARKUP_START.match(self.buf, self.pos)
+        if match is None or self._waiting(match.end(), eof):
+            if eof:
+                self._advance(len(self.buf))
+            return False
+        self._advance(match.end())
+        declaration, name = match.groups()
+        if name is not None:
+            self.tag = name.lower()
+        else:
+            self.until = (_MARKUP_END.get(declaration.upper(), _MARKUP_END[None]), False, None)
+        return True
+
+    def _read_tag(self, eof):
+        self._advance(_PLAIN_TAG_ATTRIBUTES.match(self.buf, self.pos).end())
+        if self.pos == len(self.buf):
+            return False
+        if self.buf[self.pos] == ord(">"):
+            self._advance(self.pos + 1)
+            if self.tag in (b"script", b"style"):
+                self.until = (_SKIP_END[self.tag], True, None)
+            self.tag = None
+            return True
+        value = _ATTRIBUTE_VALUE.match(self.buf, self.pos)
+        if self._waiting(value.end(), eof):
+            return False
+        self._advance(value.end())
+        data_quote, quote = value.groups()
+        if data_quote is not None:
+            self.until = (_SKIP_END[data_quote], True, self.tag)
+        elif quote is not None:
+            self.until = (_SKIP_END[quote], False, self.tag)
+        return True
+
+def read_stripped_html(stream, max_bytes=None, deadline=None, digest=None, chunk_size=STRIP_CHUNK_BYTES):
+    """
+    从二进制流中分块读取 HTML，返回剥离脚本、样式内容与 data: URI 载荷后的字节。
+    - max_bytes 为剥离后允许的最大字节数，超过时抛出 BudgetExceeded，None 表示不限；
+    - deadline 为 time.monotonic() 的截止时间，每读一块检查一次；
+    - digest 为 hashlib 的哈希对象，原始字节会逐块更新进去，调用方不必再完整读一遍。
+    """
+    stripper = _HtmlStripper()
+    while True:
+        chunk = stream.read(chunk_size)
+        if digest is not None:
+            digest.update(chunk)
+        if deadline is not None and time.monotonic() > deadline:
+            raise BudgetExceeded("读取页面超过时间预算")
+        stripper.feed(chunk, eof=not chunk)
+        if max_bytes is not None and len(stripper.out) > max_bytes:
+            raise BudgetExceeded(f"页面剥离脚本、样式与 data URI 后仍超过内存预算 {max_bytes} 字节")
+        if not chunk:
+            return bytes(stripper.out)
+
+def time_limit_blocked():
+    """系统支持 SIGALRM，但当前线程不是主线程，time_limit 在这里不会生效（如图形界面的工作线程）"""
+    return hasattr(signal, "setitimer") and threading.current_thread() is not threading.main_thread()
+
+@contextmanager
+def time_limit(deadline):
+    """
+    在截止时间（time.monotonic()）到达时于当前代码中抛出 BudgetExceeded。
+    依赖 SIGALRM，只在类 Unix 系统的主线程中生效（进程池子进程中的任务都在主线程执行）；
+    在其他线程中（time_limit_blocked() 为 True）不做限制，需要时间预算的调用方应改在子进程中执行，
+    见 judgment_cleaner.TaskRunner。Windows 没有 SIGALRM，不支持时间预算，仅由 read_stripped_html 在读取时检查。
+    """
+    if deadline is None or not hasattr(signal, "setitimer") or time_limit_blocked():
+        yield
+        return
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise BudgetExceeded("处理页面超过时间预算")
+
+    def on_alarm(signum, frame):
+        raise BudgetExceeded("处理页面超过时间预算")
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
@@ -0,0 +1,1457 @@
+"""
+裁判文书 HTML 清洗的核心逻辑，不依赖任何界面，可直接 import 使用，也可以在命令行中运行：
+
+    python judgment_cleaner.py -i HTML目录 -o 输出目录 [-w 进程数] [--output-mode sharded] ...
+    python judgment_cleaner.py -i HTML目录 -o 输出目录 --watch    # 持续监视新文件，见 judgment_watch.py
+
+html cleaner.py 是它的 Tk 图形界面。bs4、zstandard 与进程池只在真正用到时才导入。
+"""
+import os
+import sys
+import json
+import hashlib
+import gzip
+import io
+import argparse
+import time
+import tarfile
+import zipfile
+import heapq
+import traceback
+from collections import deque
+from judgment_budget import (
+    DEFAULT_MAX_HTML_BYTES, DEFAULT_MAX_SECONDS, STRIP_THRESHOLD_BYTES, BudgetExceeded, read_stripped_html, time_limit,
+    time_limit_blocked,
+)
+from judgment_dedup import DEFAULT_MAX_DISTANCE, SimHashIndex, simhash
+from judgment_metadata import INDEX_FILE_NAME, extract_metadata, require_index_support, write_index
+from judgment_normalize import normalize_record
+from judgment_sections import segment_judgment
+from judgment_rules import DEFAULT_RULE_SETS, compile_rule_sets, detect_rule_set, load_rule_specs, rule_specs_digest
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+import re
+
+# 可选的解析方式：bs4 为完整构建 DOM 树，stream 为事件驱动的单遍提取
+EXTRACT_BACKENDS = ("bs4", "stream")
+
+# 提取规则版本：修改字段或提取逻辑后应加一，增量模式会据此重新处理全部文件
+EXTRACT_RULE_VERSION = 1
+# 增量清单保存在输出目录中
+MANIFEST_FILE_NAME = ".html_cleaner_manifest.json"
+
+# 输出方式：per_file 为每个 HTML 一个 -c.jsonl，sharded 为合并写入轮换的分片
+OUTPUT_MODES = ("per_file", "sharded")
+# 分片文件名前缀，以及各压缩方式对应的扩展名
+SHARD_PREFIX = "cases"
+SHARD_COMPRESSIONS = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+# 近重复处理方式：drop 为直接丢弃副本，tag 为保留并加上 duplicate_of 字段
+DEDUP_MODES = ("drop", "tag")
+
+# 计时的各阶段：读取（含哈希与解码）、解析、提取字段（含指纹）、写出
+TIMING_STAGES = ("read", "parse", "extract", "write")
+# 统计结果中保留的最慢文件数
+SLOWEST_FILES_KEPT = 10
+# 结构化错误报告（JSON Lines，每次运行重新生成），默认保存在输出目录中
+ERROR_REPORT_FILE_NAME = ".html_cleaner_errors.jsonl"
+
+# 可直接读取的压缩包类型（不解压到磁盘）
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# 每个进程池任务最多包含的文件数；从 tar 中读出的字节每攒够 TASK_BATCH_BYTES 也会提交一次
+TASK_BATCH_SIZE = 32
+TASK_BATCH_BYTES = 16 * 1024 * 1024
+
+def extract_case_fields(html_content, backend="bs4", rule_sets=None, timings=None):
+    """
+    从单个 HTML 文本中提取各字段（默认规则为“案件名称 ~ 正文 ~ 责任编辑”），返回字典。
+    rule_sets 为 compile_rule_sets 的结果，按页面特征自动选择其中一个规则集，默认只有内置规则。
+    timings 为字典时，把解析与提取字段的耗时（秒）累加到其中的 "parse" 与 "extract"；
+    stream 方式边解析边提取，耗时都计入 "parse"。
+    """
+    started = time.perf_counter()
+    rule_set = detect_rule_set(html_content, rule_sets or DEFAULT_RULE_SETS)
+    if backend == "stream":
+        extractor = StreamingCaseExtractor(rule_set)
+        try:
+            extractor.feed(html_content)
+            extractor.close()
+        except ExtractionFinished:
+            pass
+        result = extractor.result()
+        if timings is not None:
+            timings["parse"] += time.perf_counter() - started
+        return result
+    if backend != "bs4":
+        raise ValueError(f"未知的解析方式：{backend}")
+
+    # bs4 导入较慢，只在选用这种解析方式时加载
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, "html.parser")
+    parsed = time.perf_counter()
+
+    # 每个字段取第一个匹配元素的文字，找不到时为空字符串
+    result = {}
+    for field in rule_set.fields:
+        element = field.bs4_find(soup)
+        result[field.name] = element.get_text(field.separator, strip=True) if element else ""
+    if timings is not None:
+        timings["parse"] += parsed - started
+        timings["extract"] += time.perf_counter() - parsed
+    return result
+
+# ------------------ 事件驱动提取器 ------------------ #
+# 以下集合与 bs4 的 html.parser 建树规则保持一致，保证两种解析方式输出逐字节相同
+# 空元素：开始标签后立即闭合
+_VOID_TAGS = frozenset([
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link",
+    "menuitem", "meta", "param", "source", "track", "wbr", "basefont", "bgsound",
+    "command", "frame", "image", "isindex", "nextid", "spacer",
+])
+# 这些标签内部的文字在 bs4 中是 Script/Stylesheet 等特殊字符串，get_text 不会返回
+_STRING_CONTAINER_TAGS = frozenset(["rt", "rp", "style", "script", "template"])
+_NUMERIC_REF_WITH_DATA = {10: re.compile("^([0-9]+)(.*)"), 16: re.compile("^([0-9a-f]+)(.*)")}
+
+class ExtractionFinished(Exception):
+    """所有字段都已收集完毕，用于提前终止解析"""
+
+class StreamingCaseExtractor(HTMLParser):
+    """
+    事件驱动的单遍提取器：只维护一个标签名栈，遇到规则集中的目标元素时才收集其中的文字，
+    不构建完整 DOM。所有字段的元素都闭合后抛出 ExtractionFinished，不再解析文档剩余部分。
+
+    文字的切分、实体解码、strip 以及“找第一个匹配的元素”的规则均与
+    BeautifulSoup(html, "html.parser").find(tag, attrs=...).get_text(...) 相同。
+    注意 html.parser 对残缺实体（如 "&#x"）的处理依赖于 feed 的分块方式，
+    所以和 bs4 一样，整篇文本只 feed 一次。
+    """
+
+    def __init__(self, rule_set=DEFAULT_RULE_SETS[-1]):
+        super().__init__(convert_charrefs=False)
+        self._rule_set = rule_set
+        self._pending_fields = list(rule_set.fields)  # 尚未遇到的字段规则
+        self._strings = {}         # 已遇到的字段: 收集到的字符串列表
+        self._active = []          # 正在收集的字段: [(字段名, 所在栈深度), ...]
+        self._stack = []           # 当前打开的标签名
+        self._open_counts = {}     # 各标签名当前打开的数量
+        self._container_depth = 0  # 当前位于多少层 script/style 等标签之内
+        self._already_closed = {}  # 已自动闭合、等待被忽略的空元素结束标签
+        self._data = []            # 尚未提交的连续文字片段
+
+    def result(self):
+        """返回字段字典，未找到的字段为空字符串"""
+        self._flush()
+        return {
+            field.name: field.separator.join(self._strings[field.name]) if field.name in self._strings else ""
+            for field in self._rule_set.fields
+        }
+
+    def _flush(self, force_include=False):
+        """提交一段连续文字（相当于 bs4 的 endData）"""
+        if not self._data:
+            return
+        text = "".join(self._data).strip()
+        self._data = []
+        if text and self._active and (force_include or not self._container_depth):
+            for field, _ in self._active:
+                self._strings[field].append(text)
+
+    def _pop(self):
+        name = self._stack.pop()
+        self._open_counts[name] -= 1
+        if name in _STRING_CONTAINER_TAGS:
+            self._container_depth -= 1
+        depth = len(self._stack)
+        if self._active and self._active[-1][1] > depth:
+            self._active = [item for item in self._active if item[1] <= depth]
+            if not self._active and not self._pending_fields:
+                raise ExtractionFinished()
+
+    def _start(self, tag, attrs, handle_empty_element):
+        self._flush()
+        self._stack.append(tag)
+        self._open_counts[tag] = self._open_counts.get(tag, 0) + 1
+        if tag in _STRING_CONTAINER_TAGS:
+            self._container_depth += 1
+
+        tags = self._rule_set.tags
+        if self._pending_fields and (tags is None or tag in tags):
+            for field in list(self._pending_fields):
+                if field.matches(tag, attrs):
+                    self._pending_fields.remove(field)
+                    self._strings[field.name] = []
+                    self._active.append((field.name, len(self._stack)))
+
+        if handle_empty_element and tag in _VOID_TAGS:
+            self._end(tag, check_already_closed=False)
+            self._already_closed[tag] = self._already_closed.get(tag, 0) + 1
+
+    def _end(self, tag, check_already_closed=True):
+        if check_already_closed and self._already_closed.get(tag):
+            self._already_closed[tag] -= 1
+            return
+        self._flush()
+        if self._open_counts.get(tag):
+            while self._stack[-1] != tag:
+                self._pop()
+            self._pop()
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, True)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, False)
+        self._end(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag):
+        self._end(tag)
+
+    def handle_data(self, data):
+        if self._active:
+            self._data.append(data)
+
+    def handle_charref(self, name):
+        base = 10
+        if name.startswith(("x", "X")):
+            name = name[1:]
+            base = 16
+        extra_data = ""
+        try:
+            number = int(name, base)
+        except ValueError:
+            match = _NUMERIC_REF_WITH_DATA[base].search(name)
+            if match is None:
+                self.handle_data(name)
+                return
+            number = int(match.group(1), base)
+            extra_data = match.group(2)
+        if number > 0x10FFFF:
+            character = "\ufffd"
+        else:
+            # html.unescape 按 HTML5 规范处理 &#150; 之类的引用；对非字符码位它会返回空串，而 bs4 保留原字符
+            character = unescape(f"&#{number};") or chr(number)
+        self.handle_data(character + extra_data)
+
+    def handle_entityref(self, name):
+        self.handle_data(html5.get(name + ";", "&" + name))
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        # <![CDATA[...]]> 在 bs4 中是 CData 字符串，会出现在 get_text 结果里
+        if data.upper().startswith("CDATA[") and self._active:
+            self._data = [data[len("CDATA["):]]
+            self._flush(force_include=True)
+
+def output_file_name_for(source):
+    """输出的文件名：原文件名 + -c.jsonl；压缩包成员的路径分隔符替换为下划线"""
+    flat_name = "_".join(part for part in re.split(r"[:/\\]", source) if part)
+    base_name, _ = os.path.splitext(flat_name)
+    return base_name + "-c.jsonl"
+
+def load_manifest(input_dir, output_dir, settings=None):
+    """
+    读取输出目录中的增量清单，返回 {文件名: {"size", "mtime_ns", "sha1", "output"}}。
+    settings 为影响输出内容的运行设置（输出方式、去重、规则集摘要、分段等），须能 JSON 序列化。
+    清单不存在、损坏、规则版本或设置不同、或来自其他输入目录时，返回空字典（即全部重新处理）。
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (manifest.get("rule_version") != EXTRACT_RULE_VERSION
+            or manifest.get("input_dir") != os.path.abspath(input_dir)
+            or manifest.get("settings") != (settings or {})):
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(input_dir, output_dir, files, settings=None):
+    """写入增量清单；先写临时文件再替换，避免中途退出留下损坏的清单"""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+    manifest = {
+        "rule_version": EXTRACT_RULE_VERSION,
+        "input_dir": os.path.abspath(input_dir),
+        "settings": settings or {},
+        "files": files,
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+# ------------------ 合并分片输出 ------------------ #
+def _shard_pattern(prefix):
+    """匹配 <prefix>-00000.jsonl / .jsonl.gz / .jsonl.zst 形式的分片文件名"""
+    return re.compile(re.escape(prefix) + r"-(\d{5,})\.jsonl(?:\.gz|\.zst)?$")
+
+def list_shards(output_dir, prefix=SHARD_PREFIX):
+    """按编号顺序列出输出目录中已有的分片文件名"""
+    pattern = _shard_pattern(prefix)
+    shards = []
+    for name in os.listdir(output_dir):
+        match = pattern.match(name)
+        if match:
+            shards.append((int(match.group(1)), name))
+    return [name for _, name in sorted(shards)]
+
+def open_shard(path, mode):
+    """按扩展名以二进制方式打开分片，mode 为 "rb" 或 "wb"；zstd 需要安装 zstandard"""
+    if path.endswith(".gz"):
+        # 默认的 9 级压缩太慢，6 级在速度与体积之间更均衡
+        return gzip.open(path, mode, compresslevel=6)
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("使用 zstd 压缩需要先安装 zstandard：pip install zstandard")
+        raw = open(path, mode)
+        if mode == "rb":
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+    return open(path, mode)
+
+class ShardedJsonlWriter:
+    """
+    把记录依次追加到 <prefix>-00000.jsonl 这样的分片文件中，编号接在目录中已有分片之后。
+    单个分片达到 max_records 条或 max_bytes 字节（压缩前）后切换到下一个分片，
+    compression 见 SHARD_COMPRESSIONS。
+    """
+
+    def __init__(self, output_dir, prefix=SHARD_PREFIX, max_records=None, max_bytes=None, compression=None):
+        if compression not in SHARD_COMPRESSIONS:
+            raise ValueError(f"未知的压缩方式：{compression}")
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.extension = SHARD_COMPRESSIONS[compression]
+        existing = list_shards(output_dir, prefix)
+        self._next_index = int(_shard_pattern(prefix).match(existing[-1]).group(1)) + 1 if existing else 0
+        self._file = None
+        self.current_shard = None
+        self._records = 0
+        self._bytes = 0
+
+    def write(self, record):
+        """写入一条记录，返回它所在的分片文件名"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        if self._file is None or (self.max_records and self._records >= self.max_records) \
+                or (self.max_bytes and self._records and self._bytes + len(line) > self.max_bytes):
+            self._rotate()
+        self._file.write(line)
+        self._records += 1
+        self._bytes += len(line)
+        return self.current_shard
+
+    def _rotate(self):
+        self.close()
+        self.current_shard = f"{self.prefix}-{self._next_index:05d}{self.extension}"
+        self._next_index += 1
+        self._file = open_shard(os.path.join(self.output_dir, self.current_shard), "wb")
+        self._records = 0
+        self._bytes = 0
+
+    def flush(self):
+        """把已写入的记录刷到磁盘；gzip/zstd 会结束当前压缩块，读取方可以读到目前为止的全部记录"""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def drop_records_from_shards(output_dir, stale_by_shard):
+    """
+    从旧分片中删除指定来源文件的记录，stale_by_shard 为 {分片文件名: {来源文件名, ...}}。
+    先写临时文件再替换；删空的分片直接移除。
+    """
+    for shard, sources in stale_by_shard.items():
+        path = os.path.join(output_dir, shard)
+        if not os.path.exists(path):
+            continue
+        tmp_path = path + ".tmp" + os.path.splitext(path)[1]
+        kept = 0
+        with open_shard(path, "rb") as src, open_shard(tmp_path, "wb") as dst:
+            for line in src:
+                if json.loads(line).get("source") in sources:
+                    continue
+                dst.write(line)
+                kept += 1
+        if kept:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+            os.remove(path)
+
+def write_case_file(output_dir, source, filtered_content):
+    """per_file 模式：把一条记录写成 <来源>-c.jsonl（JSON Lines 格式，简单起见这里只写一行）"""
+    output_file_path = os.path.join(output_dir, output_file_name_for(source))
+    with open(output_file_path, "w", encoding="utf-8") as out_f:
+        json.dump(filtered_content, out_f, ensure_ascii=False)
+        out_f.write("\n")
+
+# 当前进程使用的提取规则集，由进程池的 initializer 在每个子进程启动时编译一次
+_worker_rule_sets = DEFAULT_RULE_SETS
+
+def _init_worker(rule_specs):
+    """进程池 initializer：编译规则集文件中的规则"""
+    global _worker_rule_sets
+    _worker_rule_sets = compile_rule_sets(rule_specs)
+
+def error_info(source, path, stage, exc):
+    """
+    错误报告中的一条记录：来源名、文件路径、出错阶段（见 TIMING_STAGES，
+    压缩包本身无法读取时为 "archive"）、异常类型、异常信息与 traceback。
+    超出处理预算（见 judgment_budget）的页面另有 "quarantined": True。
+    """
+    info = {
+        "source": source,
+        "path": path,
+        "stage": stage,
+        "exception": type(exc).__name__,
+        "message": str(exc),
+        "traceback": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+    }
+    if isinstance(exc, BudgetExceeded):
+        info["quarantined"] = True
+    return info
+
+def _failure(source, path, stage, exc, timings=None):
+    """处理失败时的返回值，错误信息见 error_info"""
+    return os.getpid(), False, error_info(source, path, stage, exc), None, False, None, None, None, timings
+
+def format_error(error):
+    """把错误字典转成一行可读的提示"""
+    if error["stage"] == "archive":
+        return f"读取压缩包 {error['source']} 时出现错误：{error['message']}"
+    if error.get("quarantined"):
+        return f"文件 {error['source']} 超出处理预算，已隔离：{error['message']}"
+    return f"处理文件 {error['source']} 时出现错误：{error['message']}"
+
+def _deadline(max_seconds):
+    """单个页面的处理截止时间（time.monotonic()），max_seconds 为空时不限"""
+    return time.monotonic() + max_seconds if max_seconds else None
+
+def needs_stripping(size, max_html_bytes=None):
+    """大小为 size 字节的页面是否需要边读边剥离"""
+    return size > STRIP_THRESHOLD_BYTES or bool(max_html_bytes and size > max_html_bytes)
+
+def read_html_within_budget(stream, size, max_html_bytes=None, deadline=None):
+    """
+    读取一份 HTML，返回 (字节, 原始字节的 SHA-1)。大小为 size 的页面需要剥离时（见 needs_stripping）
+    分块读入并剥离脚本、样式与 data URI（见 judgment_budget.read_stripped_html），超出预算时抛出 BudgetExceeded；
+    普通页面整体读入，结果与原始字节相同。
+    """
+    if needs_stripping(size, max_html_bytes):
+        digest = hashlib.sha1()
+        raw = read_stripped_html(stream, max_html_bytes or None, deadline, digest)
+        return raw, digest.hexdigest()
+    raw = stream.read()
+    return raw, hashlib.sha1(raw).hexdigest()
+
+def process_html_bytes(source, raw, output_dir, backend="bs4", previous_hash=None, write_output=True,
+                       fingerprint=False, rule_sets=None, path=None, read_seconds=0.0, sections=False,
+                       digest=None, max_seconds=None, deadline=None, normalize=False):
+    """
+    处理一份 HTML 的原始字节。该函数在进程池的子进程中运行，
+    返回 (进程号, 是否成功, 错误信息, 内容哈希, 是否有新结果, 记录, 正文指纹, 元数据, 各阶段耗时)。
+    - source 为来源名：目录中的文件为文件名，压缩包成员为“压缩包名:成员路径”；
+    - write_output 为 True 时在输出目录生成对应的 -c.jsonl 文件，记录为 None；
+      为 False 时不写文件，把带 source 字段的记录交回主进程统一写出；
+    - previous_hash 为清单中记录的上次哈希；内容未变时跳过解析，“是否有新结果”为 False；
+    - fingerprint 为 True 时顺带计算正文的 SimHash，供主进程做近重复检测，否则指纹为 None；
+    - rule_sets 为编译后的提取规则集，默认使用当前进程的规则（见 _init_worker）；
+    - path 为错误报告中记录的路径，默认同 source；read_seconds 为调用方读取原始字节所花的时间；
+    - sections 为 True 时对 content 分段，结果记在 sections 字段中（计入 extract 阶段）；
+    - normalize 为 True 时先规范化各字段的空白与标点（一条记录的各字段一次处理，见 judgment_normalize），再分段与计算指纹；
+    - raw 已由 read_html_within_budget 剥离过时，digest 为原始字节的哈希；
+    - 解析与提取超过 max_seconds 秒（或到达调用方给出的截止时间 deadline）时中断，页面记为已隔离。
+    成功时错误信息为空串，失败时为字典（见 error_info）；元数据见 judgment_metadata.extract_metadata，
+    只在有新结果时给出；各阶段耗时为 {阶段: 秒}。
+    """
+    timings = dict.fromkeys(TIMING_STAGES, 0.0)
+    timings["read"] = read_seconds
+    stage = "read"
+    started = time.perf_counter()
+    if deadline is None:
+        deadline = _deadline(max_seconds)
+    try:
+        digest = digest or hashlib.sha1(raw).hexdigest()
+        if digest == previous_hash and (
+                not write_output or os.path.exists(os.path.join(output_dir, output_file_name_for(source)))):
+            timings["read"] += time.perf_counter() - started
+            return os.getpid(), True, "", digest, False, None, None, None, timings
+
+        # 与文本模式 open 的通用换行处理保持一致
+        html_content = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        timings["read"] += time.perf_counter() - started
+        stage = "parse"
+        with time_limit(deadline):
+            filtered_content = extract_case_fields(html_content, backend, rule_sets or _worker_rule_sets, timings)
+            stage = "extract"
+            started = time.perf_counter()
+            if normalize:
+                filtered_content = normalize_record(filtered_content)
+            if sections and "content" in filtered_content:
+                filtered_content["sections"] = segment_judgment(filtered_content["content"])
+            content_hash = simhash(filtered_content.get("content", "")) if fingerprint else None
+            metadata = extract_metadata(filtered_content)
+            timings["extract"] += time.perf_counter() - started
+        if not write_output:
+            return (os.getpid(), True, "", digest, True, dict(source=source, **filtered_content), content_hash,
+                    metadata, timings)
+
+        stage = "write"
+        started = time.perf_counter()
+        write_case_file(output_dir, source, filtered_content)
+        timings["write"] += time.perf_counter() - started
+        return os.getpid(), True, "", digest, True, None, content_hash, metadata, timings
+    except Exception as e:
+        return _failure(source, path or source, stage, e, timings)
+
+def process_single_html(html_path, output_dir, backend="bs4", previous_hash=None, write_output=True,
+                        fingerprint=False, rule_sets=None, sections=False, source=None,
+                        max_html_bytes=None, max_seconds=None, normalize=False):
+    """
+    读取单个 HTML 文件并交给 process_html_bytes 处理，返回值相同；source 为来源名，默认为文件名。
+    max_html_bytes 与 max_seconds 为该页面的内存与时间预算，见 read_html_within_budget。
+    """
+    filename = source or os.path.basename(html_path)
+    started = time.perf_counter()
+    deadline = _deadline(max_seconds)
+    try:
+        with open(html_path, "rb") as f:
+            raw, digest = read_html_within_budget(f, os.fstat(f.fileno()).st_size, max_html_bytes, deadline)
+    except Exception as e:
+        return _failure(filename, html_path, "read", e)
+    return process_html_bytes(filename, raw, output_dir, backend, previous_hash, write_output, fingerprint,
+                              rule_sets, html_path, time.perf_counter() - started, sections,
+                              digest=digest, deadline=deadline, normalize=normalize)
+
+# ------------------ 压缩包输入 ------------------ #
+def is_html_name(name):
+    return name.lower().endswith(".html")
+
+def is_archive_name(name):
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+def archive_source(archive_name, member_name):
+    """压缩包成员的来源名，同时用作清单的键和分片记录的 source 字段"""
+    return f"{archive_name}:{member_name}"
+
+def _process_zip_members(archive_path, members, *options):
+    """
+    在子进程中打开 zip，逐个解压指定成员并处理；members 为 [(成员名, 上次哈希), ...]，
+    options 为 (输出目录, 解析方式, 是否写文件, 是否计算指纹, 是否分段, 是否规范化, 内存预算, 时间预算)。
+    """
+    output_dir, backend, write_output, fingerprint, sections, normalize, max_html_bytes, max_seconds = options
+    archive_name = os.path.basename(archive_path)
+    results = []
+    try:
+        zf = zipfile.ZipFile(archive_path)
+    except Exception as e:
+        return [_failure(archive_name, archive_path, "archive", e)] * len(members)
+    with zf:
+        for member, previous_hash in members:
+            source = archive_source(archive_name, member)
+            started = time.perf_counter()
+            deadline = _deadline(max_seconds)
+            try:
+                with zf.open(member) as f:
+                    raw, digest = read_html_within_budget(f, zf.getinfo(member).file_size, max_html_bytes, deadline)
+            except Exception as e:
+                results.append(_failure(source, archive_path, "read", e))
+                continue
+            results.append(process_html_bytes(
+                source, raw, output_dir, backend, previous_hash, write_output, fingerprint,
+                path=archive_path, read_seconds=time.perf_counter() - started, sections=sections,
+                digest=digest, deadline=deadline, normalize=normalize,
+            ))
+    return results
+
+def _process_tar_archive(archive_path, known, *options):
+    """
+    在子进程中顺序解压整个 tar 并处理其中的 HTML 成员，多个 tar 可以在不同进程中同时解压。
+    known 为 {来源名: (清单中的大小与修改时间, 上次哈希)}，只含增量模式下可以沿用清单记录的成员，
+    大小与修改时间都没变的成员不读取、不处理；options 同 _process_zip_members。
+    返回 ([(来源名, 大小与修改时间, 结果), ...], 压缩包本身的错误)：没有变化的成员结果为 None，
+    压缩包能完整读完时错误为 None，否则为 error_info 记录，此前读出的成员照常返回。
+    """
+    output_dir, backend, write_output, fingerprint, sections, normalize, max_html_bytes, max_seconds = options
+    archive_name = os.path.basename(archive_path)
+    members = []
+    try:
+        with tarfile.open(archive_path, "r|*") as tf:
+            for member in tf:
+                if not member.isfile() or not is_html_name(member.name):
+                    continue
+                source = archive_source(archive_name, member.name)
+                record = {"size": member.size, "mtime_ns": int(member.mtime) * 1_000_000_000}
+                old_record, previous_hash = known.get(source, (None, None))
+                if old_record == record:
+                    members.append((source, record, None))
+                    continue
+                started = time.perf_counter()
+                deadline = _deadline(max_seconds)
+                try:
+                    raw, digest = read_html_within_budget(
+                        tf.extractfile(member), member.size, max_html_bytes, deadline)
+                except BudgetExceeded as e:
+                    members.append((source, record, _failure(source, archive_path, "read", e)))
+                    continue
+                members.append((source, record, process_html_bytes(
+                    source, raw, output_dir, backend, previous_hash, write_output, fingerprint,
+                    path=archive_path, read_seconds=time.perf_counter() - started, sections=sections,
+                    digest=digest, deadline=deadline, normalize=normalize,
+                )))
+    except Exception as e:
+        return members, error_info(archive_name, archive_path, "archive", e)
+    return members, None
+
+def _process_task(task):
+    """
+    进程池的任务入口，task 为 (类型, 内容, 输出目录, 解析方式, 是否写文件, 是否计算指纹, 是否分段,
+    是否规范化, 内存预算, 时间预算)，返回逐项结果列表：
+    - "files"：内容为 [(HTML 路径, 上次哈希, 来源名), ...]
+    - "zip"：内容为 (压缩包路径, [(成员名, 上次哈希), ...])，由子进程自己解压
+    - "tar"：内容为 (压缩包路径, 可以沿用的成员)，由子进程自己解压整个包，返回值见 _process_tar_archive
+    - "bytes"：内容为 [(来源名, 字节, 上次哈希, 原始字节的哈希), ...]，由主进程从 tar 中顺序读出；
+      超大成员在读出时已剥离，哈希由主进程给出（否则为 None）；读取时超出预算的成员，字节处为错误字典
+    """
+    kind, payload, *options = task
+    output_dir, backend, write_output, fingerprint, sections, normalize, max_html_bytes, max_seconds = options
+    if kind == "files":
+        return [process_single_html(path, output_dir, backend, previous_hash, write_output, fingerprint,
+                                    sections=sections, source=source, max_html_bytes=max_html_bytes,
+                                    max_seconds=max_seconds, normalize=normalize)
+                for path, previous_hash, source in payload]
+    if kind == "zip":
+        archive_path, members = payload
+        return _process_zip_members(archive_path, members, *options)
+    if kind == "tar":
+        archive_path, known = payload
+        return _process_tar_archive(archive_path, known, *options)
+    return [(os.getpid(), False, raw, None, False, None, None, None, None) if isinstance(raw, dict) else
+            process_html_bytes(source, raw, output_dir, backend, previous_hash, write_output, fingerprint,
+                               sections=sections, digest=digest, max_seconds=max_seconds, normalize=normalize)
+            for source, raw, previous_hash, digest in payload]
+
+class TaskRunner:
+    """
+    执行 _process_task 任务的进程池，workers 为 1 时直接在当前进程中执行。
+    同一个 TaskRunner 可以执行多批任务，监视模式下不必每批都重新启动子进程。
+    rule_specs 为规则集文件中的规则，在每个执行进程中编译一次。
+    time_limited 为 True（有单个页面的时间预算）而当前线程无法中断超时的页面时（如图形界面的工作线程，
+    见 judgment_budget.time_limit），workers 为 1 也在一个子进程中执行。
+    """
+
+    def __init__(self, workers, rule_specs=(), time_limited=False):
+        self.workers = workers
+        self.rule_specs = rule_specs
+        self.in_process = workers == 1 and not (time_limited and time_limit_blocked())
+        self._executor = None
+        self._previous_rule_sets = None
+
+    def __enter__(self):
+        if self.in_process:
+            self._previous_rule_sets = _worker_rule_sets
+            _init_worker(self.rule_specs)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.rule_specs,)
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        global _worker_rule_sets
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        else:
+            _worker_rule_sets = self._previous_rule_sets
+
+    def run(self, tasks):
+        """
+        执行 (任务, 附带信息) 序列，按提交顺序产出 (结果列表, 附带信息)。
+        同时在途的任务数有上限，tar 中读出的字节不会无限堆积在内存里。
+        """
+        if self._executor is None:
+            for task, meta in tasks:
+                yield _process_task(task), meta
+            return
+        max_pending = self.workers * 4
+        pending = deque()
+        for task, meta in tasks:
+            pending.append((self._executor.submit(_process_task, task), meta))
+            if len(pending) >= max_pending:
+                future, meta = pending.popleft()
+                yield future.result(), meta
+        while pending:
+            future, meta = pending.popleft()
+            yield future.result(), meta
+
+def _run_tasks_in_order(tasks, workers, rule_specs=(), time_limited=False):
+    """用一个临时的 TaskRunner 执行任务序列，见 TaskRunner.run"""
+    with TaskRunner(workers, rule_specs, time_limited) as runner:
+        yield from runner.run(tasks)
+
+# ------------------ 批量运行的簿记 ------------------ #
+def _check_extraction_options(backend, output_mode, dedup):
+    if backend not in EXTRACT_BACKENDS:
+        raise ValueError(f"未知的解析方式：{backend}")
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"未知的输出方式：{output_mode}")
+    if dedup is not None and dedup not in DEDUP_MODES:
+        raise ValueError(f"未知的去重方式：{dedup}")
+
+def _list_inputs(input_dir, read_archives):
+    """input_dir 中要处理的 HTML（read_archives 为 True 时还有压缩包），按名称排序：[(文件名, stat), ...]"""
+    with os.scandir(input_dir) as it:
+        return sorted(
+            (entry.name, entry.stat())
+            for entry in it
+            if (is_html_name(entry.name) or (read_archives and is_archive_name(entry.name))) and entry.is_file()
+        )
+
+def _list_zip_members(input_dir, inputs):
+    """
+    zip 的成员列表只需读中央目录，预先读出用于统计总数；tar 的成员数在读取时才知道。
+    返回 ({压缩包名: HTML 成员列表，无法读取时为异常}, 已知的输入项总数)。
+    """
+    zip_members = {}
+    total = 0
+    for name, _ in inputs:
+        if is_html_name(name):
+            total += 1
+        elif name.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(os.path.join(input_dir, name)) as zf:
+                    zip_members[name] = [i for i in zf.infolist() if not i.is_dir() and is_html_name(i.filename)]
+            except Exception as e:
+                zip_members[name] = e
+                continue
+            total += len(zip_members[name])
+    return zip_members, total
+
+def _load_run_manifest(input_dir, output_dir, settings, sharded, incremental):
+    """读取清单；非增量的 sharded 运行先删除旧分片，清单也从空开始"""
+    if sharded and not incremental:
+        for shard in list_shards(output_dir):
+            os.remove(os.path.join(output_dir, shard))
+        return {}
+    return load_manifest(input_dir, output_dir, settings)
+
+class _Progress:
+    """进度回调不必每个文件都触发，大批量时按约 1% 的粒度汇报；tar 的成员数在读取时才知道，总数随之增长"""
+
+    def __init__(self, total, callback):
+        self.done = 0
+        self.total = total
+        self.callback = callback
+        self.every = max(1, total // 100)
+
+    def advance(self, count=1):
+        for _ in range(count):
+            self.done += 1
+            self.total = max(self.total, self.done)
+            if self.callback and (self.done % self.every == 0 or self.done == self.total):
+                self.callback(self.done, self.total)
+
+class _RunLog:
+    """一次运行中的失败与耗时：更新统计中的 errors、error_report、timings 与 slowest，失败逐行写入错误报告"""
+
+    def __init__(self, stats, error_report, error_callback=None):
+        self.stats = stats
+        self.error_report = error_report
+        self.error_callback = error_callback
+        self._error_file = None
+        # 最慢的文件：小顶堆 [(总耗时, 序号, 来源名, 各阶段耗时), ...]
+        self._slowest = []
+        self._timed_count = 0
+        if os.path.exists(error_report):
+            os.remove(error_report)
+
+    def error(self, error):
+        """记录一条失败：加入统计并追加到错误报告"""
+        self.stats["errors"].append(format_error(error))
+        if self.error_callback:
+            self.error_callback(error)
+        if self._error_file is None:
+            self._error_file = open(self.error_report, "w", encoding="utf-8")
+            self.stats["error_report"] = self.error_report
+        self._error_file.write(
+            json.dumps(dict(error, time=time.strftime("%Y-%m-%d %H:%M:%S")), ensure_ascii=False) + "\n")
+        self._error_file.flush()
+
+    def timings(self, source, timings):
+        """累加各阶段耗时，并更新最慢文件列表"""
+        for stage, seconds in timings.items():
+            self.stats["timings"][stage] += seconds
+        self._timed_count += 1
+        item = (sum(timings.values()), self._timed_count, source, timings)
+        if len(self._slowest) < SLOWEST_FILES_KEPT:
+            heapq.heappush(self._slowest, item)
+        elif item[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def close(self, run_started):
+        if self._error_file is not None:
+            self._error_file.close()
+        self.stats["timings"]["wall"] = time.perf_counter() - run_started
+        self.stats["slowest"] = [
+            dict(timings, source=source, seconds=seconds)
+            for seconds, _, source, timings in sorted(self._slowest, reverse=True)
+        ]
+
+class _RunManifest:
+    """
+    一次运行的清单簿记：manifest 为上次的清单，entries 为本次登记的记录；
+    增量模式下判断输入项能否沿用上次的记录（plan），运行结束时找出源文件已消失的项（missing）。
+    沿用的记录计入统计的 skipped，非副本的指纹放回近重复索引 index。
+    """
+
+    def __init__(self, manifest, inputs, output_dir, incremental, budget, metadata_index, index, stats, progress):
+        self.manifest = manifest
+        self.entries = {}
+        self.seen = set()
+        self.incremental = incremental
+        self.budget = budget
+        self.metadata_index = metadata_index
+        self.index = index
+        self.stats = stats
+        self.progress = progress
+        self.existing_outputs = set(os.listdir(output_dir))
+        self.input_names = {name for name, _ in inputs}
+        # 清单中各压缩包的成员：{压缩包名: [来源名, ...]}
+        self.archive_members = {}
+        for source in manifest:
+            if ":" in source:
+                self.archive_members.setdefault(source.split(":", 1)[0], []).append(source)
+
+    def remember(self, source, entry):
+        """未变化的文件沿用清单记录，并把非副本的指纹放回近重复索引"""
+        self.entries[source] = entry
+        self.stats["skipped"] += 1
+        if self.index is not None and entry.get("simhash") is not None and "duplicate_of" not in entry:
+            self.index.add(entry["simhash"], source)
+
+    def still_present(self, source):
+        """来源是否仍在本次输入中；压缩包成员只检查压缩包本身"""
+        return source in self.input_names or source.split(":", 1)[0] in self.input_names
+
+    def reusable(self, source):
+        """增量模式下可以沿用的清单记录：大小、修改时间等也没变时不必处理；不能沿用时为 None"""
+        old = self.manifest.get(source)
+        output = old.get("output", output_file_name_for(source)) if old else None
+        # 被 drop 的副本没有输出
+        if not (self.incremental and old and (output is None or output in self.existing_outputs)):
+            return None
+        # 副本对应的原文件已消失时要重新解析，让它有机会成为新的原文件
+        if "duplicate_of" in old and not self.still_present(old["duplicate_of"]):
+            return None
+        if "quarantined" in old and old.get("budget") != self.budget:
+            return None
+        # 刚启用索引时，以前的记录还没有元数据
+        if self.metadata_index and old.get("output") and "metadata" not in old:
+            return None
+        return old
+
+    def plan(self, source, record):
+        """
+        登记一个输入项，返回 (是否需要处理, 上次哈希)。
+        增量模式下，若清单中的大小、修改时间（zip 为 CRC）都没变，认为内容没变，连文件都不必读。
+        """
+        self.seen.add(source)
+        old = self.reusable(source)
+        if old is None:
+            return True, None
+        if all(old.get(key) == value for key, value in record.items()):
+            self.remember(source, old)
+            self.progress.advance()
+            return False, None
+        return True, old.get("sha1")
+
+    def known_members(self, name):
+        """整个 tar 交给子进程时，其中可以沿用清单记录的成员：{来源名: (大小与修改时间, 上次哈希)}"""
+        known = {}
+        for source in self.archive_members.get(name, ()):
+            old = self.reusable(source)
+            if old is not None:
+                known[source] = ({key: old.get(key) for key in ("size", "mtime_ns")}, old.get("sha1"))
+        return known
+
+    def keep_archive(self, name):
+        """压缩包无法读取时保留它旧成员的记录与输出，以免被当成已删除"""
+        self.seen.update(source for source in self.archive_members.get(name, ()))
+
+    def missing(self):
+        """上次清单中、本次输入里已经没有的项：[(来源名, 上次的记录), ...]"""
+        return [(source, old) for source, old in self.manifest.items() if source not in self.seen]
+
+    def final_entries(self):
+        """要保存的清单：全量模式不删除任何输出，保留旧记录供下次增量运行清理"""
+        if not self.incremental:
+            for source, old in self.manifest.items():
+                self.entries.setdefault(source, old)
+        return self.entries
+
+class _TaskPlanner:
+    """
+    按输入顺序把需要处理的文件与压缩包成员分批组成 _process_task 任务，附带信息为 [(来源名, 记录), ...]，
+    整个交给子进程的 tar 附带信息为压缩包名。是否需要处理由 _RunManifest.plan 判断。
+    """
+
+    def __init__(self, input_dir, inputs, zip_members, book, log, task_options, workers, total):
+        self.input_dir = input_dir
+        self.inputs = inputs
+        self.zip_members = zip_members
+        self.book = book
+        self.log = log
+        self.task_options = task_options
+        self.max_html_bytes, self.max_seconds = task_options[-2:]
+        # 多个 tar 时整个包交给子进程，各包同时解压；只有一个时由主进程边解压边分发成员，解析仍是并行的
+        self.tars_in_workers = workers > 1 and sum(
+            is_archive_name(name) and not name.lower().endswith(".zip") for name, _ in inputs) > 1
+        # 分批提交以减少进程间通信次数；批量不超过 TASK_BATCH_SIZE，且每个进程约分到 4 批以平衡负载
+        self.batch_size = max(1, min(TASK_BATCH_SIZE, total // (workers * 4)))
+
+    def fail_archive(self, name, error):
+        """压缩包无法读取：记一次失败（error 为 error_info 记录），并保留它旧成员的输出，以免被当成已删除"""
+        self.log.stats["fail"] += 1
+        self.log.error(error)
+        self.book.keep_archive(name)
+
+    def _iter_zip_tasks(self, name):
+        path = os.path.join(self.input_dir, name)
+        if isinstance(self.zip_members[name], Exception):
+            self.fail_archive(name, error_info(name, path, "archive", self.zip_members[name]))
+            return
+        batch, meta = [], []
+        for info in self.zip_members[name]:
+            source = archive_source(name, info.filename)
+            record = {"size": info.file_size, "crc": info.CRC}
+            needed, previous_hash = self.book.plan(source, record)
+            if needed:
+                batch.append((info.filename, previous_hash))
+                meta.append((source, record))
+            if len(batch) >= self.batch_size:
+                yield ("zip", (path, batch), *self.task_options), meta
+                batch, meta = [], []
+        if batch:
+            yield ("zip", (path, batch), *self.task_options), meta
+
+    def _read_tar_member(self, tf, member, source, path):
+        """
+        从 tar 流中读出一个成员，返回 (字节, 原始字节的哈希)：超大成员在读出时剥离并计算哈希，
+        超出预算时字节处为 error_info 记录，交给子进程原样返回，保持结果顺序；普通成员的哈希由子进程计算。
+        """
+        read_started = time.perf_counter()
+        raw, digest = None, None
+        if needs_stripping(member.size, self.max_html_bytes):
+            try:
+                raw, digest = read_html_within_budget(
+                    tf.extractfile(member), member.size, self.max_html_bytes, _deadline(self.max_seconds))
+            except BudgetExceeded as e:
+                raw = error_info(source, path, "read", e)
+        else:
+            raw = tf.extractfile(member).read()
+        self.log.stats["timings"]["read"] += time.perf_counter() - read_started
+        return raw, digest
+
+    def _iter_tar_members(self, name):
+        """由主进程顺序读出 tar 中需要处理的成员：产出 (来源名, 记录, 字节, 原始字节的哈希)"""
+        path = os.path.join(self.input_dir, name)
+        # 流式模式只能顺序读取，但不需要先把整个包解压或建立索引
+        with tarfile.open(path, "r|*") as tf:
+            for member in tf:
+                if not member.isfile() or not is_html_name(member.name):
+                    continue
+                source = archive_source(name, member.name)
+                record = {"size": member.size, "mtime_ns": int(member.mtime) * 1_000_000_000}
+                needed, previous_hash = self.book.plan(source, record)
+                if needed:
+                    yield (source, record, previous_hash, *self._read_tar_member(tf, member, source, path))
+
+    def _iter_tar_tasks(self, name):
+        batch, meta, batch_bytes = [], [], 0
+        try:
+            for source, record, previous_hash, raw, digest in self._iter_tar_members(name):
+                batch.append((source, raw, previous_hash, digest))
+                meta.append((source, record))
+                batch_bytes += len(raw) if isinstance(raw, bytes) else 0
+                if len(batch) >= self.batch_size or batch_bytes >= TASK_BATCH_BYTES:
+                    yield ("bytes", batch, *self.task_options), meta
+                    batch, meta, batch_bytes = [], [], 0
+        except Exception as e:
+            self.fail_archive(name, error_info(name, os.path.join(self.input_dir, name), "archive", e))
+        if batch:
+            yield ("bytes", batch, *self.task_options), meta
+
+    def _iter_archive_tasks(self, name):
+        if name.lower().endswith(".zip"):
+            yield from self._iter_zip_tasks(name)
+        elif self.tars_in_workers:
+            # 附带信息为压缩包名，成员在子进程读出后才知道
+            path = os.path.join(self.input_dir, name)
+            yield ("tar", (path, self.book.known_members(name)), *self.task_options), name
+        else:
+            yield from self._iter_tar_tasks(name)
+
+    def iter_tasks(self):
+        batch, meta = [], []
+        for name, st in self.inputs:
+            if not is_html_name(name):
+                # 先提交之前攒下的文件，保证结果顺序与输入顺序一致
+                if batch:
+                    yield ("files", batch, *self.task_options), meta
+                    batch, meta = [], []
+                yield from self._iter_archive_tasks(name)
+                continue
+            record = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            needed, previous_hash = self.book.plan(name, record)
+            if needed:
+                batch.append((os.path.join(self.input_dir, name), previous_hash, name))
+                meta.append((name, record))
+            if len(batch) >= self.batch_size:
+                yield ("files", batch, *self.task_options), meta
+                batch, meta = [], []
+        if batch:
+            yield ("files", batch, *self.task_options), meta
+
+    def iter_results(self, workers, rule_specs=(), time_limited=False):
+        """
+        按输入顺序产出 (结果列表, [(来源名, 记录), ...])。
+        子进程处理的整个 tar 在这里按成员顺序登记，去掉没有变化的成员；压缩包中途出错时在其成员之后记一次失败。
+        """
+        for results, meta in _run_tasks_in_order(self.iter_tasks(), workers, rule_specs, time_limited):
+            if not isinstance(meta, str):
+                yield results, meta
+                continue
+            members, archive_error = results
+            results, meta = [], []
+            for source, record, result in members:
+                if self.book.plan(source, record)[0]:
+                    results.append(result)
+                    meta.append((source, record))
+            yield results, meta
+            if archive_error is not None:
+                self.fail_archive(archive_error["source"], archive_error)
+
+class _ResultRecorder:
+    """
+    登记子进程交回的结果：主进程中的写出（分片、去重后的单文件）、近重复判定、清单记录与统计；
+    隔离与失败写入错误报告。增量的 sharded 运行中要从旧分片里删掉的记录攒在 stale_by_shard（{分片: {来源名}}）中，
+    close() 时一次删除。
+    """
+
+    def __init__(self, output_dir, book, log, writer, dedup, metadata_index, budget):
+        self.output_dir = output_dir
+        self.book = book
+        self.log = log
+        self.stats = log.stats
+        self.writer = writer
+        self.dedup = dedup
+        self.metadata_index = metadata_index
+        self.budget = budget
+        self.stale_by_shard = {}
+
+    def add(self, result, source, record):
+        pid, ok, error, digest, changed, case_record, fingerprint, metadata, timings = result
+        worker_stats = self.stats["per_worker"].setdefault(pid, {"success": 0, "fail": 0})
+        if ok and not changed:
+            self.book.remember(source, dict(self.book.manifest[source], **record))
+        elif ok:
+            entry = dict(record, sha1=digest)
+            if self.metadata_index:
+                entry["metadata"] = metadata
+            entry["output"] = self._write(source, case_record, self._check_duplicate(source, entry, fingerprint),
+                                          timings)
+            self.book.entries[source] = entry
+            self.stats["success"] += 1
+            worker_stats["success"] += 1
+        elif error.get("quarantined"):
+            self.stats["quarantined"] += 1
+            # 与丢弃的副本一样没有输出，以前的输出也一并删除
+            self._drop_output(source, self.book.manifest.get(source, {}).get("output"))
+            self.book.entries[source] = dict(record, quarantined=error["message"], budget=self.budget, output=None)
+            self.log.error(error)
+        else:
+            self.stats["fail"] += 1
+            worker_stats["fail"] += 1
+            self.log.error(error)
+        if timings:
+            self.log.timings(source, timings)
+
+    def _check_duplicate(self, source, entry, fingerprint):
+        """在近重复索引中查询正文指纹，返回先出现的来源名；不是副本时把指纹加入索引并返回 None"""
+        index = self.book.index
+        if index is None or fingerprint is None:
+            return None
+        entry["simhash"] = fingerprint
+        duplicate_of = index.find(fingerprint, exclude=source)
+        if duplicate_of is None:
+            index.add(fingerprint, source)
+        else:
+            entry["duplicate_of"] = duplicate_of
+            self.stats["duplicates"] += 1
+        return duplicate_of
+
+    def _write(self, source, case_record, duplicate_of, timings):
+        """写出一条新结果，返回输出（单文件名或分片名，丢弃的副本为 None）；旧分片中的旧记录留到 close() 时删除"""
+        old_output = self.book.manifest.get(source, {}).get("output")
+        if self.writer and old_output:
+            self.stale_by_shard.setdefault(old_output, set()).add(source)
+        if duplicate_of is not None and self.dedup == "drop":
+            # 以前写出过的输出也一并删除
+            self._drop_output(source, None)
+            return None
+        if duplicate_of is not None:
+            case_record["duplicate_of"] = duplicate_of
+        # 主进程中的写出也计入该文件的 write 阶段
+        write_started = time.perf_counter()
+        if self.writer:
+            output = self.writer.write(case_record)
+        else:
+            output = output_file_name_for(source)
+            if case_record is not None:
+                write_case_file(self.output_dir, source, {k: v for k, v in case_record.items() if k != "source"})
+        timings["write"] += time.perf_counter() - write_started
+        return output
+
+    def _drop_output(self, source, old_output):
+        """删除来源以前的输出：单文件直接删除，分片中的记录（old_output 为分片名）留到 close() 时删除"""
+        if self.writer:
+            if old_output:
+                self.stale_by_shard.setdefault(old_output, set()).add(source)
+            return
+        path = os.path.join(self.output_dir, output_file_name_for(source))
+        if os.path.exists(path):
+            os.remove(path)
+
+    def remove_missing(self):
+        """增量模式下删除源文件已消失的输出"""
+        for source, old in self.book.missing():
+            output = old.get("output", "")
+            # 源文件已消失，删除对应的输出
+            if output is None:
+                pass
+            elif self.writer:
+                self.stale_by_shard.setdefault(output, set()).add(source)
+            else:
+                output_file_path = os.path.join(self.output_dir, old.get("output", output_file_name_for(source)))
+                if os.path.exists(output_file_path):
+                    os.remove(output_file_path)
+            self.stats["removed"] += 1
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        if self.stale_by_shard:
+            drop_records_from_shards(self.output_dir, self.stale_by_shard)
+
+def run_parallel_extraction(input_dir, output_dir, workers=None, progress_callback=None, backend="bs4",
+                            incremental=False, output_mode="per_file", shard_max_records=None,
+                            shard_max_bytes=None, compression=None, read_archives=True, dedup=None,
+                            dedup_max_distance=DEFAULT_MAX_DISTANCE, rule_specs=None, error_report=None,
+                            sections=True, max_html_bytes=DEFAULT_MAX_HTML_BYTES, max_seconds=DEFAULT_MAX_SECONDS,
+                            normalize=True, metadata_index=False, error_callback=None):
+    """
+    使用进程池并行处理 input_dir 下的所有 HTML 文件。
+    - 输入按名称排序后分批分发，结果按同样的顺序回收，保证错误列表、进度与分片内记录顺序稳定；
+    - workers 为进程数，默认取 CPU 核数；为 1 时直接在当前进程中顺序处理（有时间预算而不在主线程中时改用一个子进程，见 TaskRunner）；
+    - progress_callback(已完成数, 总数) 用于汇报进度（在调用线程中执行）；
+    - error_callback(错误字典) 在每次失败或隔离时调用（在调用线程中执行，错误字典见 error_info，
+      可用 format_error 转成一行提示）；本函数自身不向终端输出任何内容；
+    - backend 为解析方式，见 EXTRACT_BACKENDS；
+    - incremental 为 True 时按输出目录中的清单只处理新增或修改的文件，
+      并删除源文件已不存在的输出。清单每次运行都会更新；
+    - output_mode 见 OUTPUT_MODES：per_file 为每个 HTML 一个 -c.jsonl，
+      sharded 为所有记录追加到 cases-00000.jsonl 等分片中，每条记录带 source 字段；
+      分片按 shard_max_records 条或 shard_max_bytes 字节轮换，compression 见 SHARD_COMPRESSIONS。
+      非增量的 sharded 运行会先删除旧分片；
+    - read_archives 为 True 时，目录中的 zip/tar 压缩包里的 HTML 成员也会被处理，且不解压到磁盘：
+      zip 由各子进程按成员分批随机读取，多个压缩包的成员同时并行；
+      tar 只能顺序读取：有多个 tar 时每个包整个交给一个子进程解压并处理，多个包同时进行，
+      只有一个 tar（或 workers 为 1）时由主进程边解压边把成员字节分批交给子进程解析；
+    - dedup 见 DEDUP_MODES：子进程顺带计算正文的 SimHash，主进程按输入顺序查询近重复索引，
+      与先出现的文档海明距离不超过 dedup_max_distance 的副本，drop 时不写出，
+      tag 时照常写出并加上 duplicate_of 字段（值为先出现的来源名）。
+      增量运行中未变化的文件沿用上次的判定，其指纹从清单中读回索引；
+    - rule_specs 为规则集文件中的规则（见 judgment_rules.load_rule_specs），与内置规则一起
+      按页面特征自动选用，同一目录中可以混有不同网站的页面；规则变化后增量模式会全部重新处理；
+    - error_report 为错误报告路径，默认为输出目录中的 ERROR_REPORT_FILE_NAME。每次运行先删除旧报告，
+      有失败时每行写一条 error_info 记录；
+    - sections 为 True 时对正文分段，记录中增加 sections 字段（见 judgment_sections.segment_judgment），
+      生成问答对时可以只发送需要的部分；
+    - normalize 为 True 时统一各字段的空白与标点并去掉空行（见 judgment_normalize），
+      在分段与近重复检测之前进行；
+    - metadata_index 为 True 时把每条记录的案号、法院、裁判日期、案由与责任编辑记入清单，
+      运行结束后写成输出目录中的 INDEX_FILE_NAME（Parquet，需要 pyarrow），可用
+      judgment_metadata.query_index 按条件筛选；未变化的文件沿用清单中的元数据；
+    - max_html_bytes 与 max_seconds 为单个页面的内存与时间预算（见 judgment_budget，None 表示不限）：
+      超大页面边读边剥离脚本、样式与 data URI，剥离后仍超过 max_html_bytes 字节或处理超过
+      max_seconds 秒的页面被隔离——不计入失败，写入错误报告（quarantined 为 true），
+      其旧输出被删除；增量模式下该文件在内容或预算变化之前不再重试。
+
+    返回统计字典:
+      {
+        "success": 成功数, "fail": 失败数, "quarantined": 隔离的页面数,
+        "skipped": 未变化而跳过的文件数, "removed": 删除的过期输出数,
+        "duplicates": 判定为近重复的文件数（只统计本次解析的文件）,
+        "per_worker": {进程号: {"success": n, "fail": n}, ...},
+        "errors": ["处理文件 xxx 时出现错误：...", ...],
+        "error_report": 错误报告路径（没有失败时为 None）,
+        "index": 元数据索引路径（未启用时为 None）,
+        "timings": {"read": 秒, "parse": 秒, "extract": 秒, "write": 秒, "wall": 总耗时},
+        "slowest": [{"source": 来源名, "seconds": 总耗时, "read": 秒, ...}, ...]（最慢的 SLOWEST_FILES_KEPT 个）
+      }
+    各阶段耗时为所有进程中相应阶段的累计时间，多进程时总和会大于 wall。
+    """
+    run_started = time.perf_counter()
+    _check_extraction_options(backend, output_mode, dedup)
+    rule_specs = list(rule_specs or ())
+    # 先在主进程中编译一遍，规则有误时立即报错
+    compile_rule_sets(rule_specs)
+    sharded = output_mode == "sharded"
+    # 这些设置会改变输出内容，任何一项变化时增量模式都会全部重新处理
+    settings = {
+        "output_mode": output_mode,
+        "dedup": {"mode": dedup, "max_distance": dedup_max_distance} if dedup else None,
+        "rules_digest": rule_specs_digest(rule_specs) if rule_specs else None,
+        "sections": bool(sections),
+        "normalize": bool(normalize),
+    }
+    if metadata_index:
+        require_index_support()
+    # 子进程的公共参数：去重时由主进程判定后再写出，子进程只交回记录
+    task_options = (output_dir, backend, not sharded and not dedup, dedup is not None, bool(sections),
+                    bool(normalize), max_html_bytes, max_seconds)
+    # 隔离记录中保存当时的预算，预算调整后重新尝试
+    budget = [max_html_bytes, max_seconds]
+    inputs = _list_inputs(input_dir, read_archives)
+    manifest = _load_run_manifest(input_dir, output_dir, settings, sharded, incremental)
+    stats = {"success": 0, "fail": 0, "quarantined": 0, "skipped": 0, "removed": 0, "duplicates": 0,
+             "per_worker": {}, "errors": [], "error_report": None, "index": None,
+             "timings": dict.fromkeys(TIMING_STAGES, 0.0), "slowest": []}
+    log = _RunLog(stats, error_report or os.path.join(output_dir, ERROR_REPORT_FILE_NAME), error_callback)
+    workers = max(1, workers or os.cpu_count() or 1)
+    zip_members, total = _list_zip_members(input_dir, inputs)
+    progress = _Progress(total, progress_callback)
+    book = _RunManifest(manifest, inputs, output_dir, incremental, budget, metadata_index,
+                        SimHashIndex(dedup_max_distance) if dedup else None, stats, progress)
+    planner = _TaskPlanner(input_dir, inputs, zip_members, book, log, task_options, workers, total)
+    writer = ShardedJsonlWriter(
+        output_dir, max_records=shard_max_records, max_bytes=shard_max_bytes, compression=compression
+    ) if sharded else None
+    recorder = _ResultRecorder(output_dir, book, log, writer, dedup, metadata_index, budget)
+
+    try:
+        for results, meta in planner.iter_results(workers, rule_specs, bool(max_seconds)):
+            for result, (source, record) in zip(results, meta):
+                recorder.add(result, source, record)
+            progress.advance(len(meta))
+        if incremental:
+            recorder.remove_missing()
+    finally:
+        log.close(run_started)
+        recorder.close()
+        # 即使中途出错，也记录已完成的文件，下次增量运行不必重做
+        entries = book.final_entries()
+        save_manifest(input_dir, output_dir, entries, settings)
+        if metadata_index:
+            stats["index"] = os.path.join(output_dir, INDEX_FILE_NAME)
+            write_index(stats["index"], [
+                dict(entry["metadata"], source=source, output=entry["output"])
+                for source, entry in entries.items() if entry.get("output") and entry.get("metadata")
+            ])
+    return stats
+
+def format_timings(stats, top=5):
+    """把统计中的各阶段耗时与最慢的 top 个文件整理成几行文字，供命令行与界面显示"""
+    timings = stats["timings"]
+    stage_total = sum(timings[stage] for stage in TIMING_STAGES) or 1.0
+    lines = ["各阶段耗时：" + "，".join(
+        f"{stage} {timings[stage]:.2f} 秒（{timings[stage] / stage_total:.0%}）" for stage in TIMING_STAGES
+    )]
+    for item in stats["slowest"][:top]:
+        lines.append(f"  {item['seconds']:.3f} 秒  {item['source']}")
+    if len(lines) > 1:
+        lines.insert(1, "最慢的文件：")
+    return lines
+
+# ------------------ 命令行入口 ------------------ #
+def build_arg_parser():
+    """命令行参数定义"""
+    parser = argparse.ArgumentParser(
+        description="从裁判文书 HTML 中提取案件名称、正文与责任编辑，导出为 JSONL"
+    )
+    parser.add_argument("-i", "--input", required=True, help="存放 HTML 文件或 zip/tar 压缩包的目录")
+    parser.add_argument("-o", "--output", required=True, help="输出目录")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="并行进程数，默认为 CPU 核数")
+    parser.add_argument("--backend", choices=EXTRACT_BACKENDS, default="bs4", help="解析方式")
+    parser.add_argument("--incremental", action="store_true", help="只处理新增或修改的文件，并删除过期输出")
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="per_file", help="输出方式")
+    parser.add_argument("--shard-records", type=int, default=None, help="sharded 模式下每个分片的最大条数")
+    parser.add_argument("--shard-bytes", type=int, default=None, help="sharded 模式下每个分片的最大字节数（压缩前）")
+    parser.add_argument("--compression", choices=[c for c in SHARD_COMPRESSIONS if c], default=None,
+                        help="sharded 模式下的分片压缩方式")
+    parser.add_argument("--no-archives", action="store_true", help="不读取目录中的 zip/tar 压缩包")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=None,
+                        help="近重复检测：drop 为丢弃副本，tag 为保留副本并标注 duplicate_of")
+    parser.add_argument("--dedup-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help="判定为近重复的最大 SimHash 海明距离（0-3）")
+    parser.add_argument("--no-sections", action="store_true", help="不对正文分段（不输出 sections 字段）")
+    parser.add_argument("--no-normalize", action="store_true", help="不规范化空白与标点，保留提取出的原文")
+    parser.add_argument("--index", action="store_true",
+                        help=f"提取案号、法院、裁判日期、案由等元数据，写成输出目录中的 {INDEX_FILE_NAME}（需要 pyarrow）")
+    parser.add_argument("--rules", default=None, help="提取规则集 JSON 文件，用于其他网站的页面模板")
+    parser.add_argument("--error-report", default=None,
+                        help=f"结构化错误报告（JSONL）的路径，默认为输出目录中的 {ERROR_REPORT_FILE_NAME}")
+    parser.add_argument("--max-html-mb", type=float, default=DEFAULT_MAX_HTML_BYTES / (1024 * 1024),
+                        help="单个页面剥离脚本、样式与 data URI 后的内存预算（MB），超出的页面被隔离，0 为不限")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS,
+                        help="单个页面的处理时间预算（秒），超出的页面被隔离，0 为不限")
+    parser.add_argument("--watch", action="store_true", help="持续监视输入目录（含子目录），分批处理新到达的 HTML")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="监视模式下的轮询间隔（秒）")
+    parser.add_argument("--settle", type=float, default=2.0, help="监视模式下文件需保持不变多少秒才处理")
+    parser.add_argument("--max-batch", type=int, default=1000, help="监视模式下每批最多处理的文件数")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+    return parser
+
+def main(argv=None):
+    """命令行入口，返回进程退出码：全部成功为 0，有文件失败为 1"""
+    args = build_arg_parser().parse_args(argv)
+    if not os.path.isdir(args.input):
+        print(f"错误：HTML目录不存在：{args.input}", file=sys.stderr)
+        return 2
+    try:
+        rule_specs = load_rule_specs(args.rules) if args.rules else None
+        compile_rule_sets(rule_specs or ())
+    except (OSError, ValueError) as e:
+        print(f"错误：无法读取规则集文件：{e}", file=sys.stderr)
+        return 2
+    if args.index:
+        try:
+            require_index_support()
+        except RuntimeError as e:
+            print(f"错误：{e}", file=sys.stderr)
+            return 2
+    os.makedirs(args.output, exist_ok=True)
+    args.max_html_bytes = int(args.max_html_mb * 1024 * 1024) or None
+    args.max_seconds = args.max_seconds or None
+
+    if args.watch:
+        return watch_main(args, rule_specs)
+
+    def print_error(error):
+        print(format_error(error), file=sys.stderr)
+
+    started = time.time()
+
+    def on_progress(done, total):
+        elapsed = time.time() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"处理中... {done}/{total}，{rate:.1f} 个/秒", file=sys.stderr)
+
+    stats = run_parallel_extraction(
+        args.input, args.output,
+        workers=args.workers,
+        progress_callback=None if args.quiet else on_progress,
+        error_callback=None if args.quiet else print_error,
+        backend=args.backend,
+        incremental=args.incremental,
+        output_mode=args.output_mode,
+        shard_max_records=args.shard_records,
+        shard_max_bytes=args.shard_bytes,
+        compression=args.compression,
+        read_archives=not args.no_archives,
+        dedup=args.dedup,
+        dedup_max_distance=args.dedup_distance,
+        rule_specs=rule_specs,
+        error_report=args.error_report,
+        sections=not args.no_sections,
+        normalize=not args.no_normalize,
+        max_html_bytes=args.max_html_bytes,
+        max_seconds=args.max_seconds,
+        metadata_index=args.index,
+    )
+    print_summary(stats, time.time() - started)
+    return 1 if stats["fail"] else 0
+
+def print_summary(stats, seconds):
+    """打印 run_parallel_extraction 的统计"""
+    print(
+        f"处理完成：成功 {stats['success']} 个，失败 {stats['fail']} 个，隔离 {stats['quarantined']} 个，"
+        f"未变化跳过 {stats['skipped']} 个，删除过期输出 {stats['removed']} 个，"
+        f"近重复 {stats['duplicates']} 个，用时 {seconds:.1f} 秒"
+    )
+    for line in format_timings(stats):
+        print(line)
+    if stats["error_report"]:
+        print(f"错误报告：{stats['error_report']}")
+    if stats["index"]:
+        print(f"元数据索引：{stats['index']}（用 judgment_metadata.py 按法院、案由、年份等筛选）")
+
+def watch_main(args, rule_specs):
+    """--watch：持续监视，按 Ctrl+C 退出"""
+    if args.dedup or args.index:
+        print("错误：监视模式不支持近重复检测与元数据索引", file=sys.stderr)
+        return 2
+    from judgment_watch import watch_directory
+
+    def on_batch(batch):
+        if not args.quiet:
+            print(
+                f"{time.strftime('%H:%M:%S')} 处理 {batch['files']} 个：成功 {batch['success']} 个，"
+                f"失败 {batch['fail']} 个，用时 {batch['seconds']:.2f} 秒，待处理 {batch['backlog']} 个",
+                file=sys.stderr,
+            )
+
+    def print_error(error):
+        print(format_error(error), file=sys.stderr)
+
+    print(f"正在监视 {args.input}，按 Ctrl+C 退出", file=sys.stderr)
+    totals = watch_directory(
+        args.input, args.output,
+        workers=args.workers,
+        backend=args.backend,
+        output_mode=args.output_mode,
+        shard_max_records=args.shard_records,
+        shard_max_bytes=args.shard_bytes,
+        compression=args.compression,
+        rule_specs=rule_specs,
+        sections=not args.no_sections,
+        normalize=not args.no_normalize,
+        error_report=args.error_report,
+        max_html_bytes=args.max_html_bytes,
+        max_seconds=args.max_seconds,
+        poll_interval=args.poll_interval,
+        settle_seconds=args.settle,
+        max_batch=args.max_batch,
+        batch_callback=on_batch,
+        error_callback=None if args.quiet else print_error,
+    )
+    print(f"监视结束：共 {totals['batches']} 批，成功 {totals['success']} 个，失败 {totals['fail']} 个")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+裁判文书正文的近重复检测：64 位 SimHash 指纹 + 分段索引（一种 LSH）。
+
+同一篇判决在不同抓取批次中常有细微差异，后续每份副本都要多花一次大模型调用，
+judgment_cleaner.py 在写出前用这里的 SimHashIndex 去掉或标记这些副本。
+"""
+from array import array
+from hashlib import blake2b
+
+# 以连续多少个字符作为一个特征（中文没有空格分词，用字符 shingle）
+SHINGLE_SIZE = 4
+# 默认认为海明距离不超过 3 的两个指纹是近重复
+DEFAULT_MAX_DISTANCE = 3
+
+# 第 bit 张表把字节值映射为它第 bit 位的值（0 或 1），配合 bytes.translate 在 C 层统计各位投票
+_BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """
+    计算文本的 64 位 SimHash，忽略所有空白；文本为空时返回 None。
+    每个字符 shingle 取 8 字节 blake2b 哈希，拼成一个 bytes 后按字节位置切片，
+    各位上的投票用 translate + count 完成，不需要逐特征逐位的 Python 循环。
+    """
+    text = "".join(text.split())
+    if not text:
+        return None
+    if len(text) <= shingle_size:
+        shingles = [text]
+    else:
+        shingles = [text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)]
+    digests = b"".join([blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles])
+    half = len(shingles) / 2
+    fingerprint = 0
+    for byte_index in range(8):
+        column = digests[byte_index::8]
+        for bit in range(8):
+            if column.translate(_BIT_TABLES[bit]).count(1) > half:
+                fingerprint |= 1 << (byte_index * 8 + bit)
+    return fingerprint
+
+class SimHashIndex:
+    """
+    内存中的近重复索引。指纹切成 4 段 16 位：海明距离不超过 3 的两个指纹至少有一段完全相同，
+    因此只需在 4 张“段值 -> 文档编号”表中取候选，再逐个比较海明距离。
+    每篇文档只占一个 8 字节指纹、4 个 4 字节编号和一个来源名，数百万篇也能放在内存里。
+    """
+
+    BLOCKS = 4
+    BLOCK_BITS = 16
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        if not 0 <= max_distance < self.BLOCKS:
+            raise ValueError(f"max_distance 必须在 0 到 {self.BLOCKS - 1} 之间")
+        self.max_distance = max_distance
+        self._fingerprints = array("Q")
+        self._labels = []
+        self._tables = [{} for _ in range(self.BLOCKS)]
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _blocks(self, fingerprint):
+        mask = (1 << self.BLOCK_BITS) - 1
+        return [(fingerprint >> (i * self.BLOCK_BITS)) & mask for i in range(self.BLOCKS)]
+
+    def find(self, fingerprint, exclude=None):
+        """返回最早加入、与 fingerprint 近重复的文档来源名；没有则返回 None。exclude 为要忽略的来源名"""
+        best = None
+        for table, block in zip(self._tables, self._blocks(fingerprint)):
+            for doc_id in table.get(block, ()):
+                if best is not None and doc_id >= best:
+                    continue
+                if (self._fingerprints[doc_id] ^ fingerprint).bit_count() <= self.max_distance \
+                        and self._labels[doc_id] != exclude:
+                    best = doc_id
+        return None if best is None else self._labels[best]
+
+    def add(self, fingerprint, label):
+        """把文档加入索引"""
+        doc_id = len(self._labels)
+        self._fingerprints.append(fingerprint)
+        self._labels.append(label)
+        for table, block in zip(self._tables, self._blocks(fingerprint)):
+            bucket = table.get(block)
+            if bucket is None:
+                table[block] = bucket = array("I")
+            bucket.append(doc_id)
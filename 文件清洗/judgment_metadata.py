@@ -0,0 +1,266 @@
+"""
+裁判文书的结构化元数据与列式索引。
+
+清洗时从每条记录中取出案号、法院、裁判日期、案由与责任编辑（extract_metadata），
+run_parallel_extraction(metadata_index=True) 把它们连同来源名、输出文件写成输出目录中的
+cases_index.parquet。之后按法院、案由、年份等筛选只需读这一个列式文件，不必翻遍 JSONL：
+
+    python judgment_metadata.py 输出目录 --court 最高人民法院 --cause 合同 --year 2023
+    python judgment_metadata.py 输出目录 --cause 民间借贷 --export 选中案件.jsonl   # 交给 text-generate.py
+    python judgment_metadata.py 输出目录 --year 2023 --list 文件列表.txt            # per_file 输出的路径
+
+规则集（见 judgment_rules）中名为 case_number、court、decision_date、cause 的字段优先使用；
+没有时从正文中识别：法院取开头部分单独成行的法院名，案号取标题与开头部分中第一个“（年份）……号”，
+裁判日期取结尾部分的最后一个日期，案由取标题去掉当事人姓名后、文书类型之前的部分。
+索引的读写需要安装 pyarrow，只在用到时才导入。
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import datetime
+
+# 索引文件名，保存在输出目录中
+INDEX_FILE_NAME = "cases_index.parquet"
+# 元数据字段；索引中另有 source（来源名）、output（输出文件或分片）与 year（裁判年份）列
+METADATA_FIELDS = ("case_number", "court", "decision_date", "cause", "editor", "case_name")
+
+# 识别范围：开头与结尾部分各取多少字符（没有分段信息时）
+_HEAD_CHARS = 500
+_TAIL_CHARS = 300
+
+_CASE_NUMBER = re.compile(r"[（(][12]\d{3}[）)][\u4e00-\u9fff\d\-]{1,30}?号")
+_COURT_LINE = re.compile(r"^\s*([\u4e00-\u9fff]{2,40}(?:人民法院|法院|法庭))\s*$", re.MULTILINE)
+_CHINESE_DATE = re.compile(r"([〇○零一二三四五六七八九]{4})年([一二三四五六七八九十]{1,2})月([一二三四五六七八九十]{1,3})日")
+_ARABIC_DATE = re.compile(
+    r"((?:19|20)\d{2})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日|((?:19|20)\d{2})[-/.](\d{1,2})[-/.](\d{1,2})")
+_PARTY_NAME = re.compile(
+    r"^(?:原告|被告|第三人|上诉人|被上诉人|申请人|被申请人|再审申请人|申请执行人|被执行人|被告人|自诉人)"
+    r"(?:（[^）]*）|\([^)]*\))?[：:]?\s*([^，,。；;（(：:\s]{1,40})",
+    re.MULTILINE,
+)
+# 标题中去掉当事人后，案由之后的文书类型部分
+_CAUSE_IN_TITLE = re.compile(
+    r"^[、与和及诉等\s]*(.+?)\s*(?:一审|二审|再审|终审|执行|复议|申诉|民事|刑事|行政|赔偿|判决书|裁定书|调解书|决定书|$)"
+)
+_EDITOR_PREFIX = re.compile(r"^\s*(?:责任编辑|编辑)\s*[：:]\s*")
+_CHINESE_DIGITS = {char: index for index, char in enumerate("〇一二三四五六七八九")}
+_CHINESE_DIGITS.update({"○": 0, "零": 0})
+
+def _chinese_number(text):
+    """一至三十一的中文写法转为整数"""
+    if "十" not in text:
+        return _CHINESE_DIGITS[text]
+    tens, _, ones = text.partition("十")
+    return (_CHINESE_DIGITS[tens] if tens else 1) * 10 + (_CHINESE_DIGITS[ones] if ones else 0)
+
+def parse_decision_date(text):
+    """取文字中最后一个日期（中文、阿拉伯数字或 YYYY-MM-DD 写法），返回 YYYY-MM-DD，识别不出时返回 None"""
+    candidates = []
+    for match in _CHINESE_DATE.finditer(text):
+        try:
+            year = int("".join(str(_CHINESE_DIGITS[char]) for char in match.group(1)))
+            candidates.append((match.end(), year, _chinese_number(match.group(2)), _chinese_number(match.group(3))))
+        except KeyError:
+            continue
+    for match in _ARABIC_DATE.finditer(text):
+        candidates.append((match.end(), *(int(group) for group in match.groups() if group is not None)))
+    for _, year, month, day in sorted(candidates, reverse=True):
+        try:
+            return datetime.date(year, month, day).isoformat()
+        except ValueError:
+            continue
+    return None
+
+def _section(record, name, default):
+    """按 sections 字段取出正文的一部分，没有分段信息时返回 default"""
+    span = (record.get("sections") or {}).get(name)
+    if span is None:
+        return default
+    return record.get("content", "")[span[0]:span[1]]
+
+def extract_metadata(record):
+    """从一条清洗结果中取出元数据，返回 {字段: 值}（见 METADATA_FIELDS），识别不出的字段为 None"""
+    content = record.get("content", "") or ""
+    case_name = (record.get("case_name") or "").strip()
+    head = _section(record, "header", "") + "\n" + _section(record, "parties", content[:_HEAD_CHARS])
+    tail = _section(record, "tail", content[-_TAIL_CHARS:])
+
+    case_number = record.get("case_number")
+    if not case_number:
+        match = _CASE_NUMBER.search(case_name) or _CASE_NUMBER.search(head) or _CASE_NUMBER.search(content)
+        case_number = match.group() if match else None
+
+    court = record.get("court")
+    if not court:
+        match = _COURT_LINE.search(head)
+        court = match.group(1) if match else None
+
+    decision_date = parse_decision_date(record["decision_date"]) if record.get("decision_date") \
+        else parse_decision_date(tail)
+
+    cause = record.get("cause")
+    if not cause and case_name:
+        title = case_name
+        # 先去掉较长的姓名，避免“张三”先于“张三丰”被替换
+        for name in sorted(set(_PARTY_NAME.findall(head)), key=len, reverse=True):
+            title = title.replace(name, "")
+        match = _CAUSE_IN_TITLE.match(title)
+        if match and len(match.group(1)) <= 30:
+            cause = match.group(1)
+
+    editor = record.get("editor")
+    editor = (_EDITOR_PREFIX.sub("", editor).strip() or None) if editor else None
+
+    return {
+        "case_number": case_number or None,
+        "court": court or None,
+        "decision_date": decision_date,
+        "cause": cause or None,
+        "editor": editor,
+        "case_name": case_name or None,
+    }
+
+# ------------------ 列式索引 ------------------ #
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("元数据索引需要先安装 pyarrow：pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+def require_index_support():
+    """检查能否写索引，不能时抛出 RuntimeError；在处理开始前调用，避免处理完才发现"""
+    _import_pyarrow()
+
+def write_index(path, rows):
+    """
+    把 [{"source", "output", 元数据字段...}, ...] 写成 Parquet 索引（先写临时文件再替换）。
+    行按来源名排序；法院、案由、编辑等取值重复多的列做字典编码，裁判日期存为 date32。
+    """
+    pa, pq = _import_pyarrow()
+    rows = sorted(rows, key=lambda row: row["source"])
+    dates = [datetime.date.fromisoformat(row["decision_date"]) if row.get("decision_date") else None
+             for row in rows]
+    table = pa.table({
+        "source": pa.array([row["source"] for row in rows], pa.string()),
+        "output": pa.array([row.get("output") for row in rows], pa.string()),
+        "case_number": pa.array([row.get("case_number") for row in rows], pa.string()),
+        "court": pa.array([row.get("court") for row in rows], pa.string()).dictionary_encode(),
+        "decision_date": pa.array(dates, pa.date32()),
+        "year": pa.array([date.year if date else None for date in dates], pa.int16()),
+        "cause": pa.array([row.get("cause") for row in rows], pa.string()).dictionary_encode(),
+        "editor": pa.array([row.get("editor") for row in rows], pa.string()).dictionary_encode(),
+        "case_name": pa.array([row.get("case_name") for row in rows], pa.string()),
+    })
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return len(rows)
+
+def index_path_for(location):
+    """location 可以是索引文件本身或其所在的输出目录"""
+    return os.path.join(location, INDEX_FILE_NAME) if os.path.isdir(location) else location
+
+def query_index(location, court=None, cause=None, year=None, date_from=None, date_to=None,
+                case_number=None, editor=None, columns=None):
+    """
+    按条件筛选索引，返回 pyarrow.Table。court、cause、case_number、editor 为子串匹配
+    （如 cause="合同" 匹配所有合同纠纷），year 为整数或整数列表，date_from/date_to 为
+    YYYY-MM-DD（含两端）；未给出的条件不限，字段为空的行不满足该字段上的任何条件。
+    """
+    pa, pq = _import_pyarrow()
+    import pyarrow.compute as pc
+
+    filters = []
+    if year is not None:
+        years = [year] if isinstance(year, int) else list(year)
+        filters.append(("year", "in", years))
+    if date_from:
+        filters.append(("decision_date", ">=", datetime.date.fromisoformat(date_from)))
+    if date_to:
+        filters.append(("decision_date", "<=", datetime.date.fromisoformat(date_to)))
+    table = pq.read_table(index_path_for(location), columns=columns, filters=filters or None)
+    for name, value in (("court", court), ("cause", cause), ("case_number", case_number), ("editor", editor)):
+        if value:
+            column = table[name]
+            if pa.types.is_dictionary(column.type):
+                column = column.cast(pa.string())
+            table = table.filter(pc.fill_null(pc.match_substring(column, value), False))
+    return table
+
+def selected_output_paths(output_dir, table):
+    """筛选结果对应的输出文件路径（去重并保持顺序）；sharded 输出为包含这些记录的分片"""
+    return [os.path.join(output_dir, name) for name in dict.fromkeys(table["output"].to_pylist()) if name]
+
+def export_cases(output_dir, table, destination):
+    """
+    把筛选出的记录写成一个 JSONL 文件（每条记录带 source 字段），可直接作为 text-generate.py 的输入。
+    per_file 输出逐个读取，sharded 输出只扫描包含选中记录的分片。返回写出的条数。
+    """
+    from judgment_cleaner import open_shard
+
+    wanted = {}
+    for source, output in zip(table["source"].to_pylist(), table["output"].to_pylist()):
+        wanted.setdefault(output, set()).add(source)
+    count = 0
+    with open(destination, "w", encoding="utf-8") as out_f:
+        for output, sources in wanted.items():
+            path = os.path.join(output_dir, output)
+            if not os.path.exists(path):
+                continue
+            with open_shard(path, "rb") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "source" not in record:
+                        # per_file 输出的记录不带来源名，一个文件只有一条
+                        record = dict(source=next(iter(sources)), **record)
+                    if record["source"] in sources:
+                        out_f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        count += 1
+    return count
+
+# ------------------ 命令行入口 ------------------ #
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="按元数据筛选清洗后的裁判文书")
+    parser.add_argument("index", help=f"输出目录或 {INDEX_FILE_NAME} 的路径")
+    parser.add_argument("--court", default=None, help="法院（子串匹配）")
+    parser.add_argument("--cause", default=None, help="案由（子串匹配）")
+    parser.add_argument("--year", type=int, nargs="+", default=None, help="裁判年份，可给出多个")
+    parser.add_argument("--from", dest="date_from", default=None, help="裁判日期下限 YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", default=None, help="裁判日期上限 YYYY-MM-DD")
+    parser.add_argument("--case-number", default=None, help="案号（子串匹配）")
+    parser.add_argument("--editor", default=None, help="责任编辑（子串匹配）")
+    parser.add_argument("--list", default=None, help="把对应的输出文件路径逐行写入该文件")
+    parser.add_argument("--export", default=None, help="把选中的记录合并写入该 JSONL 文件")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    path = index_path_for(args.index)
+    if not os.path.exists(path):
+        print(f"错误：索引不存在：{path}（清洗时需加 --index）", file=sys.stderr)
+        return 2
+    output_dir = os.path.dirname(os.path.abspath(path))
+    table = query_index(
+        path, court=args.court, cause=args.cause, year=args.year, date_from=args.date_from,
+        date_to=args.date_to, case_number=args.case_number, editor=args.editor,
+    )
+    print(f"符合条件的案件：{table.num_rows} 件", file=sys.stderr)
+    if args.list:
+        paths = selected_output_paths(output_dir, table)
+        with open(args.list, "w", encoding="utf-8") as f:
+            f.writelines(p + "\n" for p in paths)
+        print(f"已写出 {len(paths)} 个文件路径：{args.list}", file=sys.stderr)
+    if args.export:
+        count = export_cases(output_dir, table, args.export)
+        print(f"已导出 {count} 条记录：{args.export}", file=sys.stderr)
+    if not args.list and not args.export:
+        for row in table.select(["source", "case_number", "court", "decision_date", "cause"]).to_pylist():
+            print("\t".join("" if value is None else str(value) for value in row.values()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
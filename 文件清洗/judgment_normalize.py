@@ -0,0 +1,79 @@
+"""
+提取结果的文本规范化：统一空白与标点，去掉空行，减少生成问答对时浪费的 token，也让近重复检测更准确。
+
+- 不换行空格、全角空格、各种宽度的空格与制表符统一为半角空格，零宽字符与软连字符删除；
+- 全角的英文字母与数字转为半角（全角标点保留，中文正文以全角标点为准）；
+- 紧跟在汉字后面的半角 , ; : ? ! 转为全角，如“原告:张三”→“原告：张三”，“10:30”不受影响；
+- 行内连续空格合并为一个，去掉每行首尾的空白（含段首的全角空格缩进）与空行。
+
+所有替换都是预先编译好的字符映射表与正则表达式，由 C 代码完成，不在 Python 中逐行逐字处理。
+需要替换的字符很少，用正则字符类找出它们再查表，比 str.translate 对中文文本逐字查表快一个数量级；
+多段文字用 \\x00 连接后一次处理完再切开，省去每段的调用开销：normalize_record 把一条记录的各字段一次处理，
+normalize_texts 也可以一次处理一批记录的文字。judgment_cleaner 在每个页面提取后立即按记录规范化，
+因为分段（sections 记录的是 content 的下标）与计算 SimHash 要用规范化后的正文；
+跨记录合并省下的调用开销与解析页面的耗时相比可以忽略。
+"""
+import re
+
+# 连接多段文字的分隔符；输入中本来就有的 \x00 会先被删除，不会与分隔符混淆
+_SEPARATOR = "\x00"
+
+def _build_table():
+    """{原字符: 替换后的字符}，删除的字符替换为空串"""
+    table = {}
+    for code in (0x09, 0x0B, 0x0C, 0xA0, 0x3000, 0x202F, 0x205F, *range(0x2000, 0x200B)):
+        table[chr(code)] = " "
+    for code in (0xAD, 0x200B, 0x200C, 0x200D, 0x2060, 0xFEFF):
+        table[chr(code)] = ""
+    # 全角数字与字母：０-９、Ａ-Ｚ、ａ-ｚ
+    for start, end in ((0xFF10, 0xFF19), (0xFF21, 0xFF3A), (0xFF41, 0xFF5A)):
+        for code in range(start, end + 1):
+            table[chr(code)] = chr(code - 0xFEE0)
+    return table
+
+NORMALIZE_TABLE = _build_table()
+_MAPPED_CHARS = re.compile("[" + "".join(re.escape(char) for char in NORMALIZE_TABLE) + "]")
+
+_MULTI_SPACE = re.compile(r" {2,}")
+# 行首行尾的空白与空行：把“空白 + 若干换行 + 空白”整体换成一个换行
+_LINE_BREAKS = re.compile(r" *\n[ \n]*")
+# 每段文字首尾的空白
+_SEGMENT_EDGES = re.compile(r"[ \n]*\x00[ \n]*")
+_CJK_PUNCTUATION = re.compile(r"(?<=[\u3400-\u9fff\uf900-\ufaff])[,;:?!]")
+_FULL_WIDTH = {",": "，", ";": "；", ":": "：", "?": "？", "!": "！"}
+
+def _map_char(match):
+    return NORMALIZE_TABLE[match.group()]
+
+def _full_width(match):
+    return _FULL_WIDTH[match.group()]
+
+def _normalize_joined(text):
+    text = _MAPPED_CHARS.sub(_map_char, text)
+    text = _MULTI_SPACE.sub(" ", text)
+    text = _LINE_BREAKS.sub("\n", text)
+    text = _CJK_PUNCTUATION.sub(_full_width, text)
+    return text
+
+def normalize_texts(texts):
+    """规范化一批文字，返回同样长度的列表"""
+    texts = list(texts)
+    if not texts:
+        return []
+    joined = _SEPARATOR.join(text.replace(_SEPARATOR, "") if _SEPARATOR in text else text for text in texts)
+    joined = _normalize_joined(joined)
+    if len(texts) > 1:
+        joined = _SEGMENT_EDGES.sub(_SEPARATOR, joined)
+    return joined.strip(" \n").split(_SEPARATOR)
+
+def normalize_text(text):
+    """规范化一段文字"""
+    return normalize_texts([text])[0]
+
+def normalize_record(record, skip=("source",)):
+    """规范化记录中的所有字符串字段（skip 中的字段除外），各字段一次处理，返回新的记录"""
+    keys = [key for key, value in record.items() if isinstance(value, str) and key not in skip]
+    normalized = dict(record)
+    for key, text in zip(keys, normalize_texts(record[key] for key in keys)):
+        normalized[key] = text
+    return normalized
@@ -0,0 +1,162 @@
+"""
+提取规则集：把不同裁判文书网站的页面模板映射到各字段的选择器。
+
+规则集文件为 JSON，格式如下（rule_sets 按顺序尝试，第一个 markers 全部出现在页面中的规则集生效）：
+
+    {
+      "rule_sets": [
+        {
+          "name": "某法院网",
+          "markers": ["wenshu-detail", "裁判文书"],
+          "fields": [
+            {"name": "case_name", "selector": "h1.title"},
+            {"name": "content", "selector": "div#article", "separator": "\\n"},
+            {"name": "editor", "selector": "span[data-role=editor]"}
+          ]
+        }
+      ]
+    }
+
+选择器只支持单个元素：tag、tag.class、tag#id、tag[属性=值]，可省略 tag（如 .class）；
+每个字段取第一个匹配元素的文字（strip 后以 separator 连接，默认为空串）。
+文件中的规则集排在内置的 DEFAULT_RULE_SET 之前，没有任何规则集命中时使用内置规则；
+文件中同名为 "default" 的规则集会替换内置规则。
+规则集在启动时编译一次（compile_rule_sets），之后每个页面只需做几次子串查找来判断模板。
+"""
+import hashlib
+import json
+import re
+
+# 内置规则：原有页面模板，class 分别为 detail_bigtitle / detail_txt / compile
+DEFAULT_RULE_SET = {
+    "name": "default",
+    "markers": [],
+    "fields": [
+        {"name": "case_name", "selector": "div.detail_bigtitle"},
+        {"name": "content", "selector": "div.detail_txt", "separator": "\n"},
+        # 比如这里可能是 "责任编辑：XX"，如果只想要人名，可以再做进一步处理
+        {"name": "editor", "selector": "div.compile"},
+    ],
+}
+
+_SELECTOR_PATTERN = re.compile(
+    r"""^(?P<tag>[A-Za-z][\w-]*)?
+        (?:\.(?P<class>[^\s.#\[\]]+)
+          |\#(?P<id>[^\s.#\[\]]+)
+          |\[(?P<attr>[\w-]+)=(?P<quote>["']?)(?P<value>[^\]"']*)(?P=quote)\])?$""",
+    re.VERBOSE,
+)
+
+class FieldRule:
+    """编译后的字段规则：匹配 tag（None 表示任意标签）且属性 attr 等于 value（attr 为 None 表示不限）的第一个元素"""
+
+    __slots__ = ("name", "tag", "attr", "value", "separator")
+
+    def __init__(self, name, tag, attr, value, separator):
+        self.name = name
+        self.tag = tag
+        self.attr = attr
+        self.value = value
+        self.separator = separator
+
+    def matches(self, tag, attrs):
+        """判断开始标签是否匹配；attrs 为 html.parser 给出的 [(属性名, 值), ...]，重复属性以最后一个为准"""
+        if self.tag is not None and tag != self.tag:
+            return False
+        if self.attr is None:
+            return True
+        found = None
+        for key, value in attrs:
+            if key == self.attr:
+                found = value or ""
+        if found is None:
+            return False
+        # 与 bs4 一致：class 是多值属性，任一取值或整个属性串相等即算匹配
+        if self.attr == "class":
+            return self.value in found.split() or self.value == found
+        return self.value == found
+
+    def bs4_find(self, soup):
+        """在 BeautifulSoup 树中查找第一个匹配元素，找不到返回 None"""
+        attrs = {self.attr: self.value} if self.attr else {}
+        return soup.find(self.tag, attrs=attrs)
+
+class RuleSet:
+    """编译后的规则集"""
+
+    __slots__ = ("name", "markers", "fields", "tags")
+
+    def __init__(self, name, markers, fields):
+        self.name = name
+        self.markers = tuple(markers)
+        self.fields = tuple(fields)
+        # 流式提取时只需检查这些标签；有字段不限标签时为 None
+        tags = {field.tag for field in self.fields}
+        self.tags = None if None in tags else frozenset(tags)
+
+    def matches(self, html_content):
+        return all(marker in html_content for marker in self.markers)
+
+def parse_selector(selector):
+    """把选择器字符串解析为 (tag, 属性名, 属性值)，格式不支持时抛出 ValueError"""
+    match = _SELECTOR_PATTERN.match(selector.strip())
+    if not match or not (match.group("tag") or match.group("class") or match.group("id") or match.group("attr")):
+        raise ValueError(f"不支持的选择器：{selector!r}")
+    tag = match.group("tag").lower() if match.group("tag") else None
+    if match.group("class"):
+        return tag, "class", match.group("class")
+    if match.group("id"):
+        return tag, "id", match.group("id")
+    if match.group("attr"):
+        return tag, match.group("attr").lower(), match.group("value")
+    return tag, None, None
+
+def compile_rule_set(spec):
+    """编译单个规则集字典"""
+    try:
+        name = spec["name"]
+        fields = [
+            FieldRule(field["name"], *parse_selector(field["selector"]), field.get("separator", ""))
+            for field in spec["fields"]
+        ]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"规则集格式错误：{e!r}") from None
+    if not fields:
+        raise ValueError(f"规则集 {name} 没有字段")
+    return RuleSet(name, spec.get("markers", ()), fields)
+
+def compile_rule_sets(specs=()):
+    """
+    编译规则集列表，返回 RuleSet 元组；内置规则集总是排在最后作为兜底，
+    specs 中名为 "default" 的规则集会替换它。
+    """
+    specs = list(specs)
+    if not any(spec.get("name") == DEFAULT_RULE_SET["name"] for spec in specs):
+        specs.append(DEFAULT_RULE_SET)
+    else:
+        specs.sort(key=lambda spec: spec.get("name") == DEFAULT_RULE_SET["name"])
+    return tuple(compile_rule_set(spec) for spec in specs)
+
+def load_rule_specs(path):
+    """读取规则集文件，返回规则集字典列表（未编译）"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    specs = data.get("rule_sets") if isinstance(data, dict) else data
+    if not isinstance(specs, list):
+        raise ValueError(f"规则集文件 {path} 中缺少 rule_sets 列表")
+    return specs
+
+def rule_specs_digest(specs=()):
+    """规则集内容的摘要，写入增量清单；规则有变化时增量模式会重新处理全部文件"""
+    text = json.dumps(list(specs), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def detect_rule_set(html_content, rule_sets):
+    """按顺序返回第一个命中的规则集；都未命中时返回最后一个（内置兜底规则）"""
+    for rule_set in rule_sets:
+        if rule_set.matches(html_content):
+            return rule_set
+    return rule_sets[-1]
+
+# 内置规则编译后的结果，未指定规则集时使用
+DEFAULT_RULE_SETS = compile_rule_sets()
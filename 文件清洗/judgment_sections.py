@@ -0,0 +1,96 @@
+"""
+裁判文书正文分段：把 content 按段落切成当事人、审理经过、诉辩意见、查明事实、本院认为、判决主文等部分。
+
+分段结果以 {段名: [起始位置, 结束位置]} 的形式记录在 sections 字段中（content 的字符下标，左闭右开），
+不重复保存文字；下游只需 content[起始:结束] 即可取出需要的部分，例如生成问答对时省去
+审理经过与落款（build_case_content，names 可指定要发送的部分），而不必把整篇判决都发给模型。
+"""
+import re
+import json
+
+# 各段按在判决书中出现的先后排列；段落只会从前一段进入后一段，不会回退，
+# 这样事实部分引用的“本院认为”“判决如下”等字样不会打乱分段
+SECTION_NAMES = (
+    "header",      # 标题、法院、案号等开头部分
+    "parties",     # 当事人及代理人
+    "procedure",   # 审理经过
+    "claims",      # 诉讼请求、上诉请求与答辩意见
+    "facts",       # 查明的事实
+    "reasoning",   # 本院认为
+    "judgment",    # 判决/裁定主文及上诉权利告知
+    "tail",        # 审判人员、日期、书记员
+)
+
+# 每一段开头段落的特征，按顺序检查；审理经过的段落通常也以“原告”等开头，所以排在当事人之前
+_SECTION_CUES = (
+    ("procedure", re.compile(r"一案.{0,80}(?:本院|立案|受理|审理)|(?:本院|本庭)(?:于.{0,20})?(?:立案|受理)")),
+    ("parties", re.compile(
+        r"^(?:原告|被告|第三人|上诉人|被上诉人|申请人|被申请人|再审申请人|申请执行人|被执行人|"
+        r"原审|公诉机关|抗诉机关|被告人|自诉人|罪犯|委托诉讼代理人|委托代理人|法定代表人|法定代理人|"
+        r"负责人|辩护人|诉讼代表人)")),
+    ("claims", re.compile(r"^.{0,60}?(?:(?:诉讼|上诉|再审|仲裁)请求|辩称|诉称|述称|申请称|抗诉称|上诉称|意见称)")),
+    ("facts", re.compile(
+        r"^(?:本院|经审理|一审法院|原审法院|二审)?(?:再审|二审|一审|经审理)?(?:查明|认定(?:的)?事实|"
+        r"认定如下)|^(?:经审理|本院经审理|二审|本院二审|本院再审)(?:查明|认定)")),
+    ("reasoning", re.compile(r"^(?:本院|本庭)(?:经审查)?认为")),
+    ("judgment", re.compile(r"^(?:判决|裁定|调解协议|决定)如下")),
+    ("tail", re.compile(
+        r"^(?:审\s*判\s*长|审\s*判\s*员|代理审判员|人民陪审员|陪\s*审\s*员|法官助理|书\s*记\s*员|"
+        r"[〇○零一二三四五六七八九]{4}年[一二三四五六七八九十]{1,2}月[一二三四五六七八九十]{1,3}日\s*$)")),
+)
+# 生成问答对时默认发给模型的部分：开头（法院、案号）与当事人也是问答的依据，
+# 只省去审理经过与落款这类各案相同的程式文字
+PROMPT_SECTIONS = ("header", "parties", "claims", "facts", "reasoning", "judgment")
+# 以“……判决如下：”结尾的段落仍属于本院认为，下一段起为判决主文
+_JUDGMENT_LEAD = re.compile(r"(?:判决|裁定|调解协议|决定)如下[：:]?\s*$")
+_SECTION_ORDER = {name: index for index, name in enumerate(SECTION_NAMES)}
+
+def segment_judgment(content):
+    """
+    按段落（以换行分隔）对正文分段，返回 {段名: [起始位置, 结束位置]}，只包含出现的段。
+    无法识别的开头部分归入 header；识别不出任何段落特征时整篇都在 header 中。
+    """
+    spans = {}
+    current = "header"
+    start = 0
+    position = 0
+    force_next = None
+    for paragraph in content.split("\n"):
+        next_section = force_next
+        force_next = None
+        if next_section is None:
+            for name, cue in _SECTION_CUES:
+                if _SECTION_ORDER[name] > _SECTION_ORDER[current] and cue.search(paragraph):
+                    # 当事人只能紧接在开头部分之后
+                    if name == "parties" and current != "header":
+                        continue
+                    next_section = name
+                    break
+        if next_section is not None and next_section != current:
+            if position > start:
+                spans[current] = [start, position - 1]
+            current, start = next_section, position
+        if _SECTION_ORDER[current] < _SECTION_ORDER["judgment"] and _JUDGMENT_LEAD.search(paragraph):
+            force_next = "judgment"
+        position += len(paragraph) + 1
+    if len(content) > start:
+        spans[current] = [start, len(content)]
+    return spans
+
+def section_text(record, names):
+    """从带 sections 字段的记录中取出若干段的文字，按正文中的先后顺序以换行连接"""
+    content = record.get("content", "")
+    spans = record.get("sections") or {}
+    parts = [spans[name] for name in SECTION_NAMES if name in names and name in spans]
+    return "\n".join(content[start:end] for start, end in parts)
+
+def build_case_content(record, names=PROMPT_SECTIONS):
+    """
+    把一条清洗后的记录转成提示词中的案件内容（JSON 文本）：带 sections 字段时 content 只保留 names 中的部分，
+    并去掉 sections 字段；没有分段信息时原样发送整条记录，分段没有识别出所需部分时仍发送全文。
+    """
+    if not record.get("sections") or "content" not in record:
+        return json.dumps(record, ensure_ascii=False, indent=2)
+    case = {key: value for key, value in record.items() if key != "sections"}
+    case["content"] = section_text(record, names) or record["content"]
+    return json.dumps(case, ensure_ascii=False, indent=2)
@@ -0,0 +1,309 @@
+"""
+监视模式：持续监视输入目录（含子目录），把新到达的 HTML 分批交给 judgment_cleaner 处理。
+
+    python judgment_cleaner.py -i HTML目录 -o 输出目录 --watch [--poll-interval 1] [--settle 2]
+
+轮询只对修改时间变化过的目录重新列举（新增、删除文件都会改变所在目录的修改时间），
+其余目录每轮只需一次 stat；原地改写不改变目录的修改时间，已处理的文件每轮轮流 stat 一部分来发现。
+刚出现的文件要等大小与修改时间稳定 settle_seconds 秒后才处理，
+避免读到爬虫尚未写完的页面。已处理的文件记在输出目录的日志中（每批追加一次），
+重启后不会重复处理；日志在启动时压缩为每个文件一行。
+每批最多 max_batch 个文件，同时在途的只有一批，内存占用与目录总量无关（已处理文件的名单除外）。
+"""
+import os
+import json
+import time
+
+import judgment_cleaner
+from judgment_budget import DEFAULT_MAX_HTML_BYTES, DEFAULT_MAX_SECONDS
+from judgment_cleaner import (
+    OUTPUT_MODES, TASK_BATCH_SIZE, ShardedJsonlWriter, TaskRunner, drop_records_from_shards,
+    is_html_name, output_file_name_for,
+)
+
+# 已处理文件的日志，保存在输出目录中
+WATCH_JOURNAL_FILE_NAME = ".html_cleaner_watch.jsonl"
+
+class DirectoryPoller:
+    """
+    基于 os.scandir 的递归轮询器。poll() 返回自上次以来新出现或发生变化、且已经稳定的 HTML 文件，
+    形式为 [(来源名, 路径, 大小, 修改时间), ...]，来源名为相对输入目录、以 / 分隔的路径。
+    known 为 {来源名: (大小, 修改时间)}，记录已经处理过的文件，由调用方在处理后更新。
+    """
+
+    def __init__(self, root, known=None, settle_seconds=2.0, rescan_interval=600.0, recheck_per_poll=1000):
+        self.root = root
+        self.known = known if known is not None else {}
+        self.settle_seconds = settle_seconds
+        # 原地改写文件不会改变目录的修改时间：每轮轮流 stat recheck_per_poll 个已处理的文件，
+        # 另外每隔 rescan_interval 秒完整扫描一次，兜底其余情况
+        self.rescan_interval = rescan_interval
+        self.recheck_per_poll = recheck_per_poll
+        self._dir_mtimes = {}   # 目录路径: 上次列举时的修改时间
+        self._pending = {}      # 来源名: (路径, 大小, 修改时间)，等待稳定的文件
+        self._recheck = []      # 本轮还没有 stat 过的已处理文件
+        self._last_full_scan = 0.0
+        self._full_scan = False
+
+    def _scan_dir(self, path, relative):
+        """列举一个目录：文件与 known/pending 比较，子目录若未跟踪或有变化则递归列举"""
+        try:
+            self._dir_mtimes[path] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            self._dir_mtimes.pop(path, None)
+            return
+        for entry in entries:
+            source = f"{relative}/{entry.name}" if relative else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    mtime = entry.stat(follow_symlinks=False).st_mtime_ns
+                    if self._full_scan or self._dir_mtimes.get(entry.path) != mtime:
+                        self._scan_dir(entry.path, source)
+                elif is_html_name(entry.name) and entry.is_file() and source not in self._pending:
+                    self._check_file(source, entry.path, entry.stat())
+            except OSError:
+                continue
+
+    def _check_file(self, source, path, st):
+        """文件与 known 中的大小、修改时间不同时，加入等待稳定的文件"""
+        if self.known.get(source) != (st.st_size, st.st_mtime_ns):
+            self._pending[source] = (path, st.st_size, st.st_mtime_ns)
+
+    def _scan_changed_dirs(self):
+        """重新列举修改时间变化过的目录"""
+        for path, mtime in list(self._dir_mtimes.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                del self._dir_mtimes[path]
+                continue
+            if current != mtime:
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                self._scan_dir(path, "" if relative == "." else relative)
+
+    def _recheck_known(self):
+        """轮流 stat 已处理的文件，发现原地改写；每个文件约每 len(known) / recheck_per_poll 轮检查一次"""
+        if not self._recheck:
+            self._recheck = list(self.known)
+        for _ in range(min(self.recheck_per_poll, len(self._recheck))):
+            source = self._recheck.pop()
+            if source in self._pending:
+                continue
+            path = os.path.join(self.root, *source.split("/"))
+            try:
+                self._check_file(source, path, os.stat(path))
+            except OSError:
+                # 已删除的文件由所在目录的修改时间发现
+                continue
+
+    def _take_ready(self, now, max_files):
+        """从等待的文件中取出已稳定的，最多 max_files 个"""
+        ready = []
+        for source, (path, size, mtime) in list(self._pending.items()):
+            if max_files is not None and len(ready) >= max_files:
+                break
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[source]
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                # 仍在写入，下一轮再看
+                self._pending[source] = (path, st.st_size, st.st_mtime_ns)
+            elif now - mtime / 1e9 >= self.settle_seconds:
+                del self._pending[source]
+                ready.append((source, path, size, mtime))
+        ready.sort()
+        return ready
+
+    def poll(self, max_files=None):
+        """扫描一轮，返回已稳定的文件，最多 max_files 个（其余留到下一轮）"""
+        now = time.time()
+        self._full_scan = not self._dir_mtimes or now - self._last_full_scan >= self.rescan_interval
+        if self._full_scan:
+            self._last_full_scan = now
+            self._recheck = []
+            self._scan_dir(self.root, "")
+        else:
+            self._scan_changed_dirs()
+            self._recheck_known()
+        return self._take_ready(now, max_files)
+
+    @property
+    def backlog(self):
+        """已发现但尚未交出的文件数"""
+        return len(self._pending)
+
+def load_watch_journal(output_dir, settings):
+    """
+    读取已处理文件的日志，返回 {来源名: 记录}；设置与上次不同时返回空字典。
+    随后把日志压缩为每个来源一行，防止长期运行后无限增长。
+    """
+    path = os.path.join(output_dir, WATCH_JOURNAL_FILE_NAME)
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("rule_version") == judgment_cleaner.EXTRACT_RULE_VERSION \
+                    and header.get("settings") == settings:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 上次退出时写了一半的行
+                        continue
+                    entries[entry["source"]] = entry
+    except (OSError, ValueError):
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"rule_version": judgment_cleaner.EXTRACT_RULE_VERSION, "settings": settings}) + "\n")
+        for entry in entries.values():
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+    return entries
+
+class _WatchRecorder:
+    """
+    监视模式中一批批地执行任务并登记结果：写出分片、追加日志与错误报告、更新轮询器的 known。
+    journal 为 {来源名: 日志记录}，writer 为 sharded 模式的 ShardedJsonlWriter（其余为 None）。
+    """
+
+    def __init__(self, output_dir, journal, poller, writer, error_report, error_callback=None):
+        self.output_dir = output_dir
+        self.journal = journal
+        self.poller = poller
+        self.writer = writer
+        self.error_report = error_report
+        self.error_callback = error_callback
+        self.journal_file = open(os.path.join(output_dir, WATCH_JOURNAL_FILE_NAME), "a", encoding="utf-8")
+
+    def run_batch(self, runner, ready, task_options):
+        """用 runner（TaskRunner）处理 poll() 交出的一批文件，返回批次统计 {"files", "success", "fail"}"""
+        batch_stats = {"files": len(ready), "success": 0, "fail": 0}
+        stale_by_shard = {}
+        tasks = (
+            (("files", [(path, None, source) for source, path, _, _ in ready[i:i + TASK_BATCH_SIZE]],
+              *task_options), ready[i:i + TASK_BATCH_SIZE])
+            for i in range(0, len(ready), TASK_BATCH_SIZE)
+        )
+        for results, meta in runner.run(tasks):
+            for result, (source, _, size, mtime) in zip(results, meta):
+                entry = {"source": source, "size": size, "mtime_ns": mtime}
+                ok = self._add(result, entry, stale_by_shard)
+                batch_stats["success" if ok else "fail"] += 1
+                self.journal[source] = entry
+                self.poller.known[source] = (size, mtime)
+                self.journal_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if self.writer:
+            self.writer.flush()
+            if stale_by_shard:
+                # 当前分片也可能含旧记录，先关闭，下一条记录会写入新分片
+                self.writer.close()
+                drop_records_from_shards(self.output_dir, stale_by_shard)
+        self.journal_file.flush()
+        return batch_stats
+
+    def _add(self, result, entry, stale_by_shard):
+        """登记一个结果，补全日志记录 entry，返回是否成功"""
+        _, ok, error, digest, _, case_record, _, _, _ = result
+        source = entry["source"]
+        previous_output = (self.journal.get(source) or {}).get("output")
+        if ok:
+            if self.writer:
+                entry["output"] = self.writer.write(case_record)
+            else:
+                entry["output"] = output_file_name_for(source)
+            entry["sha1"] = digest
+        else:
+            # 失败与隔离的文件也记下来，文件再次变化前不再重试
+            entry["error"] = error["message"]
+            self._report(error)
+        if self.writer and previous_output and (ok or error.get("quarantined")):
+            stale_by_shard.setdefault(previous_output, set()).add(source)
+        elif not ok and error.get("quarantined") and previous_output:
+            # 与批量模式一样，被隔离的页面没有输出，以前的输出一并删除
+            path = os.path.join(self.output_dir, previous_output)
+            if os.path.exists(path):
+                os.remove(path)
+        return ok
+
+    def _report(self, error):
+        if self.error_callback:
+            self.error_callback(error)
+        with open(self.error_report, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(error, time=time.strftime("%Y-%m-%d %H:%M:%S")), ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.journal_file.close()
+        if self.writer:
+            self.writer.close()
+
+def watch_directory(input_dir, output_dir, workers=None, backend="bs4", output_mode="per_file",
+                    shard_max_records=None, shard_max_bytes=None, compression=None, rule_specs=None,
+                    sections=True, normalize=True, error_report=None, max_html_bytes=DEFAULT_MAX_HTML_BYTES,
+                    max_seconds=DEFAULT_MAX_SECONDS, poll_interval=1.0, settle_seconds=2.0,
+                    max_batch=1000, rescan_interval=600.0, recheck_per_poll=1000, stop_event=None, batch_callback=None,
+                    error_callback=None):
+    """
+    持续监视 input_dir，直到 stop_event（threading.Event）被设置或收到 KeyboardInterrupt。
+    提取相关参数（含单个页面的内存与时间预算）与 run_parallel_extraction 相同；sharded 模式下分片保持打开，每批结束时 flush。
+    源文件被修改时重新处理（sharded 模式会从旧分片中删除旧记录），被隔离时删除以前的输出；
+    删除源文件不会删除已有输出。原地改写的文件由每轮轮流 stat recheck_per_poll 个已处理文件发现（见 DirectoryPoller）。
+    近重复检测、元数据索引与压缩包读取只在批量模式（run_parallel_extraction）中提供。
+    batch_callback(批次统计) 在每批处理完后调用，批次统计含 files、success、fail、seconds、backlog；
+    error_callback(错误字典) 在每次失败或隔离时调用，见 run_parallel_extraction。本函数自身不向终端输出任何内容。
+    返回整个运行期间的累计统计 {"success", "fail", "batches"}。
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"未知的输出方式：{output_mode}")
+    rule_specs = list(rule_specs or ())
+    judgment_cleaner.compile_rule_sets(rule_specs)
+    sharded = output_mode == "sharded"
+    settings = {
+        "output_mode": output_mode,
+        "rules_digest": judgment_cleaner.rule_specs_digest(rule_specs) if rule_specs else None,
+        "sections": bool(sections),
+        "normalize": bool(normalize),
+    }
+    workers = max(1, workers or os.cpu_count() or 1)
+    task_options = (output_dir, backend, not sharded, False, bool(sections), bool(normalize), max_html_bytes,
+                    max_seconds)
+    error_report = error_report or os.path.join(output_dir, judgment_cleaner.ERROR_REPORT_FILE_NAME)
+
+    journal = load_watch_journal(output_dir, settings)
+    poller = DirectoryPoller(
+        input_dir,
+        {source: (entry["size"], entry["mtime_ns"]) for source, entry in journal.items()},
+        settle_seconds, rescan_interval, recheck_per_poll,
+    )
+    totals = {"success": 0, "fail": 0, "batches": 0}
+    writer = ShardedJsonlWriter(
+        output_dir, max_records=shard_max_records, max_bytes=shard_max_bytes, compression=compression
+    ) if sharded else None
+    recorder = _WatchRecorder(output_dir, journal, poller, writer, error_report, error_callback)
+    wait = stop_event.wait if stop_event is not None else time.sleep
+
+    try:
+        with TaskRunner(workers, rule_specs, bool(max_seconds)) as runner:
+            while stop_event is None or not stop_event.is_set():
+                ready = poller.poll(max_batch)
+                if not ready:
+                    wait(poll_interval)
+                    continue
+                started = time.perf_counter()
+                batch_stats = recorder.run_batch(runner, ready, task_options)
+                totals["success"] += batch_stats["success"]
+                totals["fail"] += batch_stats["fail"]
+                totals["batches"] += 1
+                batch_stats["seconds"] = time.perf_counter() - started
+                batch_stats["backlog"] = poller.backlog
+                if batch_callback:
+                    batch_callback(batch_stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+    return totals
@@ -1,37 +1,39 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox
+"""
+训练日志转换工具的 Tk 图形界面，解析与导出都在 training_log.py 中。
+tkinter 只在打开界面时才导入，本文件可以在没有图形环境的机器上 import；带参数运行时不打开界面，
+直接按 training_log 的命令行批量转换：
+
+    python los2.py                                   # 打开界面
+    python los2.py 日志1.jsonl 日志2.jsonl -o 输出目录   # 同 python training_log.py ...
+"""
+import sys
 import threading
-import re
-import pandas as pd
 import os
+import numpy as np
+import training_log
+from training_log import (
+    FOLLOW_INTERVAL_SECONDS, SMOOTHING_METHODS, concat_columns, convert_log, follow_log, lttb, merge_runs,
+    parse_logs, write_table,
+)
+
+# 平滑方式下拉框中“不平滑”的选项
+NO_SMOOTHING = "不平滑"
 
-def convert_file(file_path, output_path, status_callback):
+def convert_file(file_path, output_path, status_callback, smoothing=None, amount=None, points=None):
     """
-    读取 jsonl 或 txt 文件，提取步数、损失率和 lr 数据，然后保存为 Excel 文件。
-    lr 的值将放大 10000 倍。
+    读取 jsonl 或 txt 文件，提取步数与日志中出现的全部指标（损失率、lr、grad_norm、epoch 等），
+    然后保存为 CSV、Parquet、Feather 或 Excel 文件。lr 的值将放大 10000 倍。解析过程见 training_log.parse_log，输出格式的选择见 training_log.write_table。
+    smoothing 为平滑方式（training_log.SMOOTHING_METHODS 中的 ema 或 moving_average，参数为 amount），
+    平滑后的值作为新列与原始值并列；points 不为 None 时再用 LTTB 把每条曲线降采样到约 points 个点。
     status_callback 为更新状态信息的回调函数。
     """
     try:
-        data = []
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                # 提取括号内的步数，例如：(8400/44160) 提取 8400
-                step_match = re.search(r'\((\d+)/', line)
-                # 提取 loss 后面的数字，例如 loss:2.485
-                loss_match = re.search(r'loss:(\d+\.?\d*)', line)
-                # 提取 lr 后面的数字，例如 lr:0.000506674126
-                lr_match = re.search(r'lr:(\d+\.?\d*)', line)
-                if step_match and loss_match and lr_match:
-                    step = step_match.group(1)
-                    loss = loss_match.group(1)
-                    lr_value = float(lr_match.group(1)) * 10000  # 放大 10000 倍
-                    data.append([step, loss, lr_value])
-        
-        # 利用 pandas 创建 DataFrame，列依次为步数、损失率和 lr（放大 10000 倍）
-        df = pd.DataFrame(data, columns=["步数", "损失率", "lr*10000"])
-        # 保存为 Excel 文件，不保存行索引
-        df.to_excel(output_path, index=False)
-        status_callback("转换完成，Excel 文件已保存为:\n" + output_path)
+        # 列依次为步数、损失率、lr（放大 10000 倍）和其余指标，步数为整数，其余为浮点数，
+        # 某行没有的指标为空值；用全部 CPU 核心并行解析。
+        # 按扩展名选择输出格式，扩展名无法识别时按行数自动选择；不保存行索引
+        result = convert_log(file_path, output_path, smoothing=smoothing, amount=amount, points=points, workers=None)
+        status_callback(f"转换完成，共 {result['rows']} 行，指标：{'、'.join(result['metrics']) or '无'}，已保存为:\n"
+                        + result["output"])
     except Exception as e:
         status_callback("发生错误: " + str(e))
 
@@ -39,26 +41,190 @@ def start_conversion():
     """
     开始转换操作：获取文件路径，选择保存路径，并在新线程中执行转换操作。
     """
+    from tkinter import filedialog, messagebox
+
     file_path = file_entry.get()
     if not file_path or not os.path.exists(file_path):
         messagebox.showerror("错误", "请选择有效的文件 (.jsonl 或 .txt)")
         return
-    
-    # 选择保存 Excel 文件的路径
-    output_path = filedialog.asksaveasfilename(defaultextension=".xlsx", 
-                                               filetypes=[("Excel 文件", "*.xlsx")],
-                                               title="保存 Excel 文件")
+    smoothing = smoothing_var.get()
+    smoothing = None if smoothing == NO_SMOOTHING else smoothing
+    amount_text = smoothing_amount_entry.get().strip()
+    try:
+        amount = float(amount_text) if smoothing and amount_text else None
+        if smoothing == "ema" and amount is not None and not 0 <= amount < 1:
+            raise ValueError
+        if smoothing == "moving_average" and amount is not None:
+            if amount != int(amount) or amount < 1:
+                raise ValueError
+            amount = int(amount)
+    except ValueError:
+        messagebox.showerror("错误", "ema 的平滑系数应在 0 到 1 之间，滑动平均的窗口应为正整数，留空则用默认值")
+        return
+    points_text = points_entry.get().strip()
+    try:
+        points = int(points_text) if points_text else None
+        if points is not None and points < 3:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("错误", "降采样点数应为不小于 3 的整数，留空则不降采样")
+        return
+
+    # 选择保存路径，按扩展名决定格式；Excel 只适合较小的表（最多 1048575 行）
+    output_path = filedialog.asksaveasfilename(defaultextension=".parquet",
+                                               filetypes=[("Parquet 文件", "*.parquet"),
+                                                          ("CSV 文件", "*.csv"),
+                                                          ("Feather 文件", "*.feather"),
+                                                          ("Excel 文件", "*.xlsx")],
+                                               title="保存转换结果")
     if not output_path:
         return
-    
+
     status_label.config(text="转换中...")
     # 在新线程中执行转换，防止界面卡顿
     convert_thread = threading.Thread(
-        target=convert_file, 
-        args=(file_path, output_path, lambda msg: root.after(0, update_status, msg))
+        target=convert_file,
+        args=(file_path, output_path, lambda msg: root.after(0, update_status, msg), smoothing, amount, points)
     )
     convert_thread.start()
 
+def compare_files(file_paths, output_path, grid_step, status_callback):
+    """
+    并行解析多次运行的日志，按步数对齐成一张宽表（每次运行的每个指标各一列）后保存。
+    grid_step 不为 None 时重采样到每 grid_step 步一行的公共网格，见 training_log.merge_runs。
+    """
+    try:
+        df = merge_runs(parse_logs(file_paths), grid_step=grid_step)
+        output_path = write_table(df, output_path)
+        status_callback(f"对比完成，{len(file_paths)} 次运行，共 {len(df)} 行，已保存为:\n" + output_path)
+    except Exception as e:
+        status_callback("发生错误: " + str(e))
+
+def start_comparison():
+    """
+    批量对比：选择多个日志文件与保存路径，在新线程中合并。
+    """
+    from tkinter import filedialog, messagebox
+
+    grid_text = grid_step_entry.get().strip()
+    try:
+        grid_step = int(grid_text) if grid_text else None
+        if grid_step is not None and grid_step <= 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("错误", "重采样步长应为正整数，留空则不重采样")
+        return
+    file_paths = filedialog.askopenfilenames(filetypes=[("JSONL和TXT文件", "*.jsonl *.txt"), ("所有文件", "*.*")],
+                                             title="选择要对比的多个日志文件")
+    if not file_paths:
+        return
+    output_path = filedialog.asksaveasfilename(defaultextension=".parquet",
+                                               filetypes=[("Parquet 文件", "*.parquet"),
+                                                          ("CSV 文件", "*.csv"),
+                                                          ("Feather 文件", "*.feather"),
+                                                          ("Excel 文件", "*.xlsx")],
+                                               title="保存对比结果")
+    if not output_path:
+        return
+
+    status_label.config(text=f"对比中（{len(file_paths)} 个文件）...")
+    compare_thread = threading.Thread(
+        target=compare_files,
+        args=(list(file_paths), output_path, grid_step, lambda msg: root.after(0, update_status, msg))
+    )
+    compare_thread.start()
+
+class LiveChart:
+    """
+    跟踪模式的实时曲线：在 Canvas 上画 loss（蓝）与 lr（橙，单独缩放）随步数的变化。
+    新记录以数组块的形式追加，重画时用 LTTB 降采样到不超过画布宽度两倍的点，峰谷不会被跳过，点数与日志长度无关；
+    只画有数值的记录，日志中没有 loss 或 lr 时不画对应的曲线。
+    """
+
+    def __init__(self, master, width=640, height=320, margin=30):
+        import tkinter as tk
+
+        self.width, self.height, self.margin = width, height, margin
+        self.canvas = tk.Canvas(master, width=width, height=height, background="white")
+        self.canvas.pack(padx=10, pady=10)
+        self.loss_line = self.canvas.create_line(0, 0, 0, 0, fill="#1f77b4")
+        self.lr_line = self.canvas.create_line(0, 0, 0, 0, fill="#ff7f0e")
+        self.label = self.canvas.create_text(margin, margin // 2, anchor="w", text="等待新记录...")
+        self.parts = []
+        self.count = 0
+
+    def extend(self, columns):
+        """追加 training_log 返回的一批新记录并重画；窗口关闭后排队的更新直接丢弃"""
+        if len(columns["step"]) and self.canvas.winfo_exists():
+            self.parts.append(columns)
+            self.count += len(columns["step"])
+            self.redraw()
+
+    def _points(self, steps, values):
+        """把 (步数, 数值) 缩放到画布坐标，返回 create_line 需要的扁平坐标列表"""
+        low, high = values.min(), values.max()
+        x = self.margin + (steps - steps[0]) / max(steps[-1] - steps[0], 1) * (self.width - 2 * self.margin)
+        y = self.height - self.margin - (values - low) / ((high - low) or 1) * (self.height - 2 * self.margin)
+        return np.column_stack((x, y)).ravel().tolist()
+
+    def redraw(self):
+        if len(self.parts) > 1:
+            self.parts = [concat_columns(self.parts)]
+        columns = self.parts[0]
+        text = f"{self.count} 条记录，步数 {int(columns['step'][-1])}"
+        for name, line, fmt in (("loss", self.loss_line, ".4f"), ("lr", self.lr_line, ".3e")):
+            if name not in columns:
+                continue
+            present = np.flatnonzero(~np.isnan(columns[name]))
+            if not len(present):
+                continue
+            steps = columns["step"][present].astype(np.float64)
+            index = lttb(steps, columns[name][present], 2 * self.width)
+            if len(index) >= 2:
+                self.canvas.coords(line, *self._points(steps[index], columns[name][present][index]))
+            text += f"，{name} {columns[name][present[-1]]:{fmt}}"
+        self.canvas.itemconfig(self.label, text=text)
+
+def start_follow():
+    """
+    跟踪模式：持续读取日志新追加的行，在新窗口中显示实时曲线，并追加到 CSV 文件。
+    CSV 旁边保存读取位置的检查点，下次跟踪同一个日志时从上次的位置继续。
+    """
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+
+    file_path = file_entry.get()
+    if not file_path or not os.path.exists(file_path):
+        messagebox.showerror("错误", "请选择有效的文件 (.jsonl 或 .txt)")
+        return
+    output_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                               filetypes=[("CSV 文件", "*.csv")],
+                                               title="跟踪结果追加到 CSV 文件")
+    if not output_path:
+        return
+
+    window = tk.Toplevel(root)
+    window.title("跟踪: " + os.path.basename(file_path))
+    chart = LiveChart(window)
+    stop_event = threading.Event()
+
+    def stop():
+        stop_event.set()
+        window.destroy()
+
+    tk.Button(window, text="停止跟踪", command=stop).pack(pady=(0, 10))
+    window.protocol("WM_DELETE_WINDOW", stop)
+
+    def run():
+        try:
+            follow_log(file_path, output_path, interval=FOLLOW_INTERVAL_SECONDS, stop_event=stop_event,
+                       callback=lambda columns: root.after(0, chart.extend, columns))
+        except Exception as e:
+            root.after(0, update_status, "跟踪出错: " + str(e))
+
+    threading.Thread(target=run, daemon=True).start()
+    update_status("跟踪中，结果追加到:\n" + output_path)
+
 def update_status(message):
     """
     更新状态标签显示的信息。
@@ -69,32 +235,74 @@ def browse_file():
     """
     弹出文件选择对话框，选择 jsonl 或 txt 文件。
     """
+    from tkinter import filedialog
+
     file_path = filedialog.askopenfilename(filetypes=[("JSONL和TXT文件", "*.jsonl *.txt"), ("所有文件", "*.*")],
                                            title="选择 jsonl 或 txt 文件")
     if file_path:
-        file_entry.delete(0, tk.END)
+        file_entry.delete(0, "end")
         file_entry.insert(0, file_path)
 
-# 创建主窗口
-root = tk.Tk()
-root.title("文件转换工具 (.jsonl/.txt 转 Excel)")
+# ------------------ GUI 部分 ------------------ #
+def run_gui():
+    """创建主窗口并进入主循环；各回调通过模块级变量访问界面控件"""
+    global root, file_entry, status_label, grid_step_entry, smoothing_var, smoothing_amount_entry, points_entry
+    import tkinter as tk
+
+    # 创建主窗口
+    root = tk.Tk()
+    root.title("文件转换工具 (.jsonl/.txt 转 CSV/Parquet/Excel)")
+
+    # 文件选择区域
+    file_frame = tk.Frame(root)
+    file_frame.pack(padx=10, pady=10)
+
+    file_entry = tk.Entry(file_frame, width=50)
+    file_entry.pack(side=tk.LEFT, padx=(0, 5))
+
+    browse_button = tk.Button(file_frame, text="选择文件", command=browse_file)
+    browse_button.pack(side=tk.LEFT)
 
-# 文件选择区域
-file_frame = tk.Frame(root)
-file_frame.pack(padx=10, pady=10)
+    # 转换按钮
+    button_frame = tk.Frame(root)
+    button_frame.pack(pady=(0, 10))
+    convert_button = tk.Button(button_frame, text="开始转换", command=start_conversion)
+    convert_button.pack(side=tk.LEFT, padx=5)
+    # 跟踪仍在训练的任务的日志
+    follow_button = tk.Button(button_frame, text="跟踪日志", command=start_follow)
+    follow_button.pack(side=tk.LEFT, padx=5)
 
-file_entry = tk.Entry(file_frame, width=50)
-file_entry.pack(side=tk.LEFT, padx=(0, 5))
+    # 导出前的平滑与降采样：平滑值作为新列与原始值并列，降采样用 LTTB 保留曲线形状
+    smoothing_frame = tk.Frame(root)
+    smoothing_frame.pack(pady=(0, 10))
+    tk.Label(smoothing_frame, text="平滑:").pack(side=tk.LEFT)
+    smoothing_var = tk.StringVar(value=NO_SMOOTHING)
+    tk.OptionMenu(smoothing_frame, smoothing_var, NO_SMOOTHING, *SMOOTHING_METHODS).pack(side=tk.LEFT)
+    tk.Label(smoothing_frame, text="参数（留空用默认值）:").pack(side=tk.LEFT)
+    smoothing_amount_entry = tk.Entry(smoothing_frame, width=8)
+    smoothing_amount_entry.pack(side=tk.LEFT, padx=5)
+    tk.Label(smoothing_frame, text="降采样点数（留空不降采样）:").pack(side=tk.LEFT)
+    points_entry = tk.Entry(smoothing_frame, width=8)
+    points_entry.pack(side=tk.LEFT, padx=5)
 
-browse_button = tk.Button(file_frame, text="选择文件", command=browse_file)
-browse_button.pack(side=tk.LEFT)
+    # 批量对比多次运行：按步数对齐成一张宽表，可重采样到公共步数网格
+    compare_frame = tk.Frame(root)
+    compare_frame.pack(pady=(0, 10))
+    tk.Label(compare_frame, text="重采样步长（留空不重采样）:").pack(side=tk.LEFT)
+    grid_step_entry = tk.Entry(compare_frame, width=8)
+    grid_step_entry.pack(side=tk.LEFT, padx=5)
+    compare_button = tk.Button(compare_frame, text="批量对比", command=start_comparison)
+    compare_button.pack(side=tk.LEFT, padx=5)
 
-# 转换按钮
-convert_button = tk.Button(root, text="开始转换", command=start_conversion)
-convert_button.pack(pady=(0, 10))
+    # 状态显示标签
+    status_label = tk.Label(root, text="等待转换")
+    status_label.pack(pady=(0, 10))
 
-# 状态显示标签
-status_label = tk.Label(root, text="等待转换")
-status_label.pack(pady=(0, 10))
+    root.mainloop()
 
-root.mainloop()
+# 解析时用到进程池，Windows 下以 spawn 方式启动子进程会重新导入本文件，
+# 因此界面只能在 __main__ 中创建
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(training_log.main())
+    run_gui()
@@ -0,0 +1,1121 @@
+"""
+训练日志解析的核心逻辑，不依赖任何界面：从 jsonl/txt 训练日志中提取步数与所有“键:数值”形式的指标
+（loss、lr、grad_norm、epoch、eval_loss、tokens/s 等），每个指标一列，评估等稀疏指标在没有的行为空值。
+可直接 import 使用（convert_log、convert_logs），也可以在命令行中批量转换，训练流程结束后直接调用：
+
+    python training_log.py run1/trainer_log.jsonl run2/trainer_log.jsonl -o 输出目录 [-f parquet] [-m loss lr]
+    python training_log.py 日志目录 --smoothing ema --points 5000
+
+los2.py 是它的 Tk 图形界面。pandas、pyarrow 与进程池只在真正用到时才导入，本模块从不导入 tkinter。
+parse_logs 与 merge_runs 把多次运行的日志按步数对齐成一张宽表；
+跟踪模式（LogFollower、follow_log）只解析日志新追加的行，用于观察仍在训练的任务。
+
+日志文件以 mmap 映射，按约 READ_CHUNK_BYTES 字节在换行处切块，把块当作 NumPy 字节数组整体扫描：
+先找出所有分隔符与换行，取出每个分隔符之前的几个字节作为上下文，每种上下文只交给 KEY_PATTERN 判断一次（以字典缓存），只对需要的键取出数值，再按键分组成列；各块的列先放在列表里，全部解析完后拼接一次。
+不逐行调用 Python 代码，不把文件复制成 Python 字符串，也不保存逐行的 Python 对象，
+几 GB 的日志也只占用“块内扫描用的数组 + 每行每个指标 8 字节”的内存（映射的页面由操作系统按需换入换出）。
+指定多个进程时各块在进程池中并行解析。
+
+导出前可以平滑（ema、moving_average，向量化计算）并用 LTTB 降采样（lttb、downsample_columns），
+几百万个点的曲线降到几千个点，外部工具打开、作图都快得多，形状几乎不变。
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import time
+from itertools import compress
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# 每次解析的字节数；块内的扫描数组与数值大约是块的若干倍，块越大占用的内存越多
+READ_CHUNK_BYTES = 4 * 1024 * 1024
+# 块内所有的“键:数值”（也接受 键=数值、JSON 的 "键": 数值 与 Python 字典的 '键': 数值）及步数，例如
+#   ... (8400/44160) ... loss:2.485 ... lr:0.000506674126 grad_norm:0.91 tokens/s:5123.4 ...
+#   ... eval step 500: eval_loss:2.61 ...
+#   {"current_steps": 10, "loss": 2.485, "learning_rate": 5.06e-04, "epoch": 0.01}
+#   {'loss': 2.485, 'learning_rate': 5.06e-04, 'epoch': 0.01}
+# 键以字母或下划线开头，由字母、数字、_、/、- 组成，前面不能紧挨字母、数字或“.”（[INFO|trainer.py:3000] 中的 py 不是键），
+# 与分隔符之间可以有引号与空格（KEY_PATTERN 匹配分隔符之前文字末尾的键）；分隔符之后可以有空格，
+# 数值为 NUMBER_PATTERN 形式的十进制数。步数另有 (步数/总步数) 与 “step 步数” 两种写法。
+SEPARATORS = b":="
+KEY_PATTERN = re.compile(rb'(?<![\w.])([A-Za-z_][\w/-]*)["\']?[ \t]*\Z')
+NUMBER_PATTERN = re.compile(rb'-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+# 这些键的数值作为步数，其余的键各成一个指标列
+STEP_KEYS = {"step", "steps", "global_step", "current_steps"}
+# 步数列的名称；步数为 int64，其余指标为 float64
+STEP = "step"
+# 导出时 lr 放大的倍数，以及各列在表格中的列名（其余指标以键名为列名）
+LR_SCALE = 10000
+COLUMN_TITLES = {"step": "步数", "loss": "损失率", "lr": f"lr*{LR_SCALE}"}
+# 导出时排在前面的指标，其余指标按在日志中首次出现的顺序
+LEADING_METRICS = ("loss", "lr")
+# 平滑后的列名为原指标名加该后缀（见 smooth_columns），与原始值并列导出
+SMOOTHED_SUFFIX = "_smoothed"
+
+# 输出格式与扩展名；auto 按行数自动选择（见 choose_format）
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather", "excel": ".xlsx"}
+# Excel 工作表最多 1048576 行，其中一行是表头
+EXCEL_MAX_ROWS = 1048576 - 1
+# auto 时不超过该行数才导出 Excel，更大的表 Excel 打开也很慢
+AUTO_EXCEL_MAX_ROWS = 100_000
+
+def chunk_bounds(data, chunk_size=READ_CHUNK_BYTES):
+    """把 data（bytes 或 mmap）切成约 chunk_size 字节、在换行之后结束的区间，返回 [(起, 止), ...]"""
+    bounds = []
+    start, size = 0, len(data)
+    while start < size:
+        end = data.find(b"\n", min(start + chunk_size, size) - 1)
+        end = size if end < 0 else end + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+# ------------------ 字节扫描 ------------------ #
+# 以下函数都在补了换行的 uint8 数组（见 parse_chunk）上整体计算；字节类别用几次比较得到，比查表快
+def _is_digit(data):
+    return data - np.uint8(48) < 10
+
+def _is_letter(data):
+    return (data | 32) - np.uint8(97) < 26
+
+def _is_key_char(data):
+    """字母、数字、_、/、-"""
+    return _is_letter(data) | _is_digit(data) | (data == 95) | (data == 47) | (data == 45)
+
+def _is_word_char(data):
+    """字母、数字、_、."""
+    return _is_letter(data) | _is_digit(data) | (data == 95) | (data == 46)
+
+def _is_blank(data):
+    return (data == 32) | (data == 9)
+
+def _is_quote(data):
+    return (data == 34) | (data == 39)
+
+def _is_number_char(data):
+    """数字、+、-、.、e、E（+ 到 9 之间除去 , 与 /）"""
+    return ((data - np.uint8(43) < 15) & (data != 44) & (data != 47)) | ((data | 32) == 101)
+
+def _is_number_start(data):
+    return _is_digit(data) | (data == 46) | (data == 45)
+
+# 依次取分隔符之前这么多字节作为键的上下文；更长的键（极少）逐个在所在行中查找
+_CONTEXT_WIDTHS = (16, 64)
+# 数值与步数先各取这么多字节，更长的再补齐；完整的 float64（如 4.999999999999999e-05）不超过 24 个字节
+_TOKEN_WIDTH = 24
+# 块前后补的换行：向前取上下文、向后取数值时不会越界，换行也正是键与数值的边界
+_PADDING = 64
+
+def _first_false(mask):
+    """二维布尔数组每行第一个 False 的列号，没有时为列数"""
+    first = mask.argmin(axis=1)
+    first[mask[np.arange(len(mask)), first]] = mask.shape[1]
+    return first
+
+def _rows(view, positions, width, backward=False):
+    """从 view 的各位置起向后（backward 时为各位置之前、由近及远）取 width 个字节，组成二维数组（副本）"""
+    if backward:
+        return as_strided(view[width - 1:], (len(view) - width + 1, width), (1, -1))[positions - width]
+    return as_strided(view, (len(view) - width + 1, width), (1, 1))[positions]
+
+def _strings(rows, lengths):
+    """二维 uint8 数组每行的前 lengths 个字节组成的字节串列表；整体转换，不逐行切片"""
+    rows *= np.arange(rows.shape[1]) < lengths[:, None]
+    return rows.view(f"S{rows.shape[1]}").ravel().tolist()
+
+def _skip(view, positions, is_skipped):
+    """各位置向后跳过 is_skipped 的字节"""
+    positions = positions.copy()
+    active = np.flatnonzero(is_skipped(view[positions]))
+    while len(active):
+        positions[active] += 1
+        active = active[is_skipped(view[positions[active]])]
+    return positions
+
+def _tokens(view, positions, is_token_char, is_token_start=None):
+    """
+    从各位置起由 is_token_char 的字节组成的一段（is_token_start 限定第一个字节，不符合时为空），
+    返回 (字节串列表, 各段的结束位置)。超过 _TOKEN_WIDTH 个字节的段再逐段向后补齐。
+    """
+    rows = _rows(view, positions, _TOKEN_WIDTH)
+    lengths = _first_false(is_token_char(rows))
+    if is_token_start is not None:
+        lengths[~is_token_start(rows[:, 0])] = 0
+    tokens = _strings(rows, lengths)
+    ends = positions + lengths
+    long = pending = np.flatnonzero(lengths == _TOKEN_WIDTH)
+    while len(pending):
+        more = _first_false(is_token_char(_rows(view, ends[pending], _TOKEN_WIDTH)))
+        ends[pending] += more
+        pending = pending[more == _TOKEN_WIDTH]
+    for index in long.tolist():
+        tokens[index] = view[positions[index]:ends[index]].tobytes()
+    return tokens, ends
+
+def _number(token):
+    """float() 不接受的数值取开头符合 NUMBER_PATTERN 的部分，没有时为 NaN"""
+    try:
+        return float(token)
+    except ValueError:
+        match = NUMBER_PATTERN.match(token)
+        return float(match.group()) if match else np.nan
+
+def _numbers(tokens):
+    """把 _tokens 取出的数值转为 float64 数组，返回 (数组, 各数值在 tokens 中的下标)；空的与不是数值的跳过"""
+    selected = np.flatnonzero(np.fromiter(map(len, tokens), np.int64, len(tokens)))
+    if len(selected) < len(tokens):
+        tokens = [tokens[index] for index in selected.tolist()]
+    try:
+        numbers = np.fromiter(map(float, tokens), np.float64, len(tokens))
+    except ValueError:
+        numbers = np.fromiter(map(_number, tokens), np.float64, len(tokens))
+        valid = ~np.isnan(numbers)
+        numbers, selected = numbers[valid], selected[valid]
+    return numbers, selected
+
+def _key_contexts(view, positions, width):
+    """
+    各分隔符之前 width 个字节中决定键的部分（由近及远）：紧挨分隔符的空格与引号、一段键字符，以及这一段之前的一个字节。
+    同一个键的上下文只有少数几种。返回 (上下文字节串列表, 是否完整)；这一段在 width 个字节内没有结束时不完整。
+    """
+    rows = _rows(view, positions, width, backward=True)
+    inside = _is_key_char(rows)
+    # 紧挨分隔符的空格与引号也算在上下文之内；只有少数分隔符如此，单独处理这些行
+    special = np.flatnonzero(_is_blank(rows[:, 0]) | _is_quote(rows[:, 0]))
+    if len(special):
+        near = rows[special]
+        blanks = _first_false(_is_blank(near))
+        quoted = np.zeros(len(near), dtype=bool)
+        within = blanks < width
+        quoted[within] = _is_quote(near[within, blanks[within]])
+        inside[special] |= np.arange(width) < (blanks + quoted)[:, None]
+    boundary = _first_false(inside)
+    return _strings(rows, boundary + 1), boundary < width
+
+class _KeyIds(dict):
+    """{键的上下文（由近及远）: 键的编号}，新出现的键依次从 1 编号，keys 为 {键: 编号}；上下文中没有键时为 0"""
+
+    def __init__(self):
+        super().__init__()
+        self.keys = {}
+
+    def __missing__(self, context):
+        self[context] = key_id = self.add(KEY_PATTERN.search(context[::-1]))
+        return key_id
+
+    def add(self, match):
+        return self.keys.setdefault(match.group(1), len(self.keys) + 1) if match else 0
+
+def _key_ids(data, start, view, positions, key_ids):
+    """
+    各分隔符之前的键的编号（见 _KeyIds），positions 是分隔符在 view（前面补了 _PADDING 个字节）中的位置。
+    同一个键的上下文大量重复，每种上下文只用 KEY_PATTERN 判断一次。
+    """
+    ids = np.zeros(len(positions), np.int64)
+    pending = np.arange(len(positions))
+    for width in _CONTEXT_WIDTHS:
+        if not len(pending):
+            break
+        contexts, complete = _key_contexts(view, positions[pending], width)
+        contexts = list(compress(contexts, complete.tolist()))
+        ids[pending[complete]] = np.fromiter(map(key_ids.__getitem__, contexts), np.int64, len(contexts))
+        pending = pending[~complete]
+    for index in pending.tolist():
+        end = start + int(positions[index]) - _PADDING
+        ids[index] = key_ids.add(KEY_PATTERN.search(data[data.rfind(b"\n", start, end) + 1 or start:end]))
+    return ids
+
+def _step_markers(data, start, end, view):
+    """块内 (步数/ 与 step 步数 两种写法的步数，返回 [(位置, 步数), ...]"""
+    parts = []
+    if data.find(b"(", start, end) >= 0:
+        positions = np.flatnonzero(view == ord("("))
+        tokens, ends = _tokens(view, positions + 1, _is_digit)
+        found = (ends > positions + 1) & (view[ends] == ord("/"))
+        parts.append((positions[found], list(compress(tokens, found.tolist()))))
+    if data.find(b"step", start, end) >= 0:
+        positions = np.flatnonzero(view == ord("s"))
+        for offset, byte in enumerate(b"tep", 1):
+            positions = positions[view[positions + offset] == byte]
+        positions = positions[~_is_word_char(view[positions - 1])]
+        digits = _skip(view, positions + 4, _is_blank)
+        tokens, ends = _tokens(view, digits, _is_digit)
+        found = (digits > positions + 4) & (ends > digits)
+        parts.append((positions[found], list(compress(tokens, found.tolist()))))
+    return [(positions, _numbers(tokens)[0]) for positions, tokens in parts]
+
+def _empty_columns():
+    return {STEP: np.empty(0, np.int64)}
+
+def parse_chunk(data, start=0, end=None, metrics=None):
+    """
+    解析 data[start:end] 中的日志，返回 (columns, last_step)。columns 为 {"step": int64 数组, 指标名: float64 数组, ...}，
+    每行日志一条记录，只含步数、没有任何指标的行不产生记录；某行没有的指标为 NaN。metrics 不为 None 时只提取其中的指标。
+    没有步数的行（如部分评估行）沿用前面最近一行的步数，块内第一个步数之前的行步数为 -1，由 concat_columns 补齐；
+    last_step 是块内最后一个有步数的行的步数（包括只有步数、没有指标的行，如保存检查点的提示），块内没有步数时为 None。
+    data 可以是 bytes 或 mmap。分隔符、步数标记与换行的位置由 NumPy 在整块上找出，分隔符之前的几个字节
+    以字典缓存，每种只判断一次（_key_ids），只对需要的键取出数值（_tokens）；不逐行、逐个匹配地执行 Python 代码，也不用正则逐字节扫描。
+    """
+    end = len(data) if end is None else end
+    size = end - start
+    view = np.full(size + 2 * _PADDING, ord("\n"), np.uint8)
+    view[_PADDING:_PADDING + size] = np.frombuffer(data, np.uint8, size, start)
+    key_ids = _KeyIds()
+    separators = [np.flatnonzero(view == sep) for sep in SEPARATORS]
+    separators = [(positions, _key_ids(data, start, view, positions, key_ids)) for positions in separators]
+
+    # 需要的键映射为指标编号（从 1 起），步数键为 0，其余为 -1
+    names = {}
+    metric_ids = np.full(len(key_ids.keys) + 1, -1, np.int64)
+    for key, key_id in key_ids.keys.items():
+        name = key.decode("ascii")
+        if name in STEP_KEYS:
+            metric_ids[key_id] = 0
+        elif metrics is None or name in metrics:
+            metric_ids[key_id] = names.setdefault(name, len(names) + 1)
+    found = []
+    for positions, ids in separators:
+        ids = metric_ids[ids]
+        keep = ids >= 0
+        positions, ids = positions[keep], ids[keep]
+        tokens, _ = _tokens(view, _skip(view, positions + 1, _is_blank), _is_number_char, _is_number_start)
+        values, selected = _numbers(tokens)
+        found.append((positions[selected], ids[selected], values))
+    positions, ids, values = (np.concatenate(column) for column in zip(*found))
+    if sum(len(part[0]) > 0 for part in found) > 1:
+        order = np.argsort(positions, kind="stable")
+        positions, ids, values = positions[order], ids[order], values[order]
+    is_step = ids == 0
+    step_parts = [(positions[is_step], values[is_step]), *_step_markers(data, start, end, view)]
+    is_metric = ~is_step
+    positions, ids, values = positions[is_metric], ids[is_metric], values[is_metric]
+
+    # 行号为位置之前的换行数；位置递增，行号单调不减，与前一个不同处即为新的一行
+    newlines = np.flatnonzero(view[_PADDING:_PADDING + size] == ord("\n")) + _PADDING
+    del view
+    step_lines, step_values = _line_steps(step_parts, newlines)
+    last_step = int(step_values[-1]) if len(step_values) else None
+    if not len(positions):
+        return _empty_columns(), last_step
+    lines = np.searchsorted(newlines, positions)
+    row_starts = _run_starts(lines)
+    row_lines = lines[row_starts]
+    rows = np.cumsum(row_starts) - 1
+    count = len(row_lines)
+
+    # 没有步数的行沿用前面最近一行的步数
+    steps = np.full(count, -1, np.int64)
+    position = np.searchsorted(step_lines, row_lines, side="right") - 1
+    has_step = position >= 0
+    steps[has_step] = step_values[position[has_step]]
+
+    # 各指标按在块中首次出现的顺序成列
+    columns = {STEP: steps}
+    by_id = {metric_id: name for name, metric_id in names.items()}
+    first = np.full(len(names) + 1, len(ids))
+    first[ids[::-1]] = np.arange(len(ids) - 1, -1, -1)
+    for metric_id in np.argsort(first)[:np.count_nonzero(first < len(ids))].tolist():
+        selected = ids == metric_id
+        column = np.full(count, np.nan)
+        column[rows[selected]] = values[selected]
+        columns[by_id[metric_id]] = column
+    return columns, last_step
+
+def _line_steps(step_parts, newlines):
+    """各步数所在的行号（newlines 中位置之前的换行数）：返回 (有步数的行号, 该行的步数)，行号递增；同一行有多个步数时取第一个"""
+    positions = np.concatenate([part[0] for part in step_parts])
+    order = np.argsort(positions, kind="stable")
+    values = np.concatenate([part[1] for part in step_parts])[order].astype(np.int64)
+    lines = np.searchsorted(newlines, positions[order])
+    first = _run_starts(lines)
+    return lines[first], values[first]
+
+def _run_starts(sorted_values):
+    """有序数组中每段相同值的第一个位置（布尔数组）"""
+    starts = np.empty(len(sorted_values), dtype=bool)
+    starts[:1] = True
+    np.not_equal(sorted_values[1:], sorted_values[:-1], out=starts[1:])
+    return starts
+
+def concat_columns(parts, previous_step=None, last_steps=None):
+    """
+    把各块的解析结果按顺序拼接；某块没有的指标补 NaN。
+    块开头沿用步数（-1）的记录取之前各块中最后出现的步数：last_steps 为各块的 last_step（见 parse_chunk）时
+    按它计算，只有步数、没有指标的行也算在内，结果与切块的位置无关；没有 last_steps 时取前一块最后一条记录的步数。
+    整个日志第一个步数之前的记录取 previous_step（跟踪模式下为上一次读到的最后步数），没有时丢弃（多为训练开始前打印的配置）。
+    所有记录都没有步数时（如 HF Trainer 在标准输出打印的字典）不丢弃，按记录的先后从 previous_step + 1 起编号。
+    """
+    if last_steps is not None:
+        parts = list(_carry_steps(parts, previous_step, last_steps))
+    parts = [part for part in parts if len(part[STEP])]
+    if not parts:
+        return _empty_columns()
+    names = list(dict.fromkeys(name for part in parts for name in part))
+    columns = {}
+    for name in names:
+        columns[name] = np.concatenate([
+            part[name] if name in part else np.full(len(part[STEP]), np.nan) for part in parts
+        ]) if len(parts) > 1 else parts[0][name]
+    steps = columns[STEP]
+    unknown = steps < 0
+    if unknown.all():
+        columns[STEP] = np.arange(1, len(steps) + 1, dtype=np.int64) + (previous_step or 0)
+    elif unknown.any():
+        index = np.maximum.accumulate(np.where(unknown, 0, np.arange(len(steps))))
+        steps = steps[index]
+        if previous_step is not None:
+            steps[steps < 0] = previous_step
+        known = steps >= 0
+        columns[STEP] = steps
+        if not known.all():
+            # 只在丢弃的记录中出现的指标（如配置中的 warmup=100）不保留空列
+            columns = {name: column[known] for name, column in columns.items()}
+            columns = {name: column for name, column in columns.items()
+                       if name == STEP or not np.isnan(column).all()}
+    return columns
+
+def _carry_steps(parts, previous_step, last_steps):
+    """各块开头步数为 -1 的记录取之前各块中最后出现的步数（第一块之前为 previous_step）"""
+    carried = previous_step
+    for part, last_step in zip(parts, last_steps):
+        if carried is not None and len(part[STEP]) and part[STEP][0] < 0:
+            part = {**part, STEP: np.where(part[STEP] < 0, carried, part[STEP])}
+        yield part
+        if last_step is not None:
+            carried = last_step
+
+def _base_metric(name):
+    """平滑列对应的原指标名，其余列原样返回"""
+    return name[:-len(SMOOTHED_SUFFIX)] if name.endswith(SMOOTHED_SUFFIX) else name
+
+def metric_names(columns):
+    """结果中的指标名（不含步数），LEADING_METRICS 在前，其余按首次出现的顺序；平滑列紧跟在原指标之后"""
+    names = [name for name in columns if name != STEP]
+    lead = {name: i for i, name in enumerate(LEADING_METRICS)}
+    return sorted(names, key=lambda name: lead.get(_base_metric(name), len(lead)))
+
+def _parse_file_range(task):
+    """进程池任务：映射文件并解析 [起, 止) 区间"""
+    path, start, end, metrics = task
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_chunk(data, start, end, metrics)
+
+def _concat_chunks(results, previous_step=None):
+    """拼接 parse_chunk 的各块结果 [(columns, last_step), ...]"""
+    if not results:
+        return _empty_columns()
+    parts, last_steps = zip(*results)
+    return concat_columns(parts, previous_step, last_steps)
+
+def parse_log(path, chunk_size=READ_CHUNK_BYTES, workers=1, metrics=None):
+    """
+    解析整个日志文件，返回 {"step": 数组, 指标名: 数组, ...}（见 parse_chunk），按日志中的先后顺序；
+    metrics 不为 None 时只提取其中的指标。
+    文件以 mmap 映射，按 chunk_bounds 切块；workers 大于 1 时各块在进程池中解析，
+    每个子进程自己映射同一文件，只传回解析出的数组，再按块的顺序拼接；workers 为 None 时使用全部 CPU 核心。
+    """
+    if not os.path.getsize(path):
+        return _empty_columns()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        workers = max(1, workers or os.cpu_count() or 1)
+        if workers > 1:
+            # 块数至少是进程数的 4 倍，各进程的负载更均衡
+            chunk_size = max(1024 * 1024, min(chunk_size, len(data) // (workers * 4) + 1))
+        bounds = chunk_bounds(data, chunk_size)
+        if workers == 1 or len(bounds) == 1:
+            return _concat_chunks([parse_chunk(data, start, end, metrics) for start, end in bounds])
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(bounds))) as executor:
+        metrics = None if metrics is None else tuple(metrics)
+        tasks = [(path, start, end, metrics) for start, end in bounds]
+        results = list(executor.map(_parse_file_range, tasks))
+    return _concat_chunks(results)
+
+def column_title(name):
+    base = _base_metric(name)
+    return COLUMN_TITLES.get(base, base) + name[len(base):]
+
+def to_dataframe(columns, metrics=None):
+    """
+    把 parse_log 的结果转为 DataFrame：第一列为步数，其后为 metrics 中的指标（默认全部，见 metric_names），
+    步数、loss、lr 使用 COLUMN_TITLES 中的中文列名，lr（及其平滑列）放大 LR_SCALE 倍；结果中没有的指标整列为空值。
+    """
+    import pandas as pd
+
+    count = len(columns[STEP])
+    table = {column_title(STEP): columns[STEP]}
+    for name in metric_names(columns) if metrics is None else metrics:
+        column = columns.get(name)
+        if column is None:
+            column = np.full(count, np.nan)
+        table[column_title(name)] = column * LR_SCALE if _base_metric(name) == "lr" else column
+    return pd.DataFrame(table)
+
+# ------------------ 多次运行对比 ------------------ #
+def run_names(paths):
+    """
+    每个日志的运行名：文件名去掉扩展名；重名时（如各运行目录下都叫 trainer_log.jsonl）
+    向上逐级加上所在目录名，直到互不相同。同一文件给了多次时，后面的加上 #序号。
+    """
+    full_paths = [os.path.normpath(os.path.abspath(path)) for path in paths]
+    unique = list(dict.fromkeys(full_paths))
+    parts = [path.split(os.sep) for path in unique]
+    parts = [[part for part in dirs if part] + [os.path.splitext(name)[0]] for *dirs, name in parts]
+    depth = [1] * len(parts)
+    while True:
+        names = ["/".join(part[-d:]) for part, d in zip(parts, depth)]
+        clashes = [i for i, name in enumerate(names) if names.count(name) > 1 and depth[i] < len(parts[i])]
+        if not clashes:
+            break
+        for i in clashes:
+            depth[i] += 1
+    by_path = dict(zip(unique, names))
+    result, seen = [], {}
+    for path in full_paths:
+        seen[path] = seen.get(path, 0) + 1
+        result.append(by_path[path] if seen[path] == 1 else f"{by_path[path]}#{seen[path]}")
+    return result
+
+def _parse_whole_log(path):
+    return parse_log(path)
+
+def parse_logs(paths, workers=None):
+    """
+    并行解析多个日志，每个文件一个任务；返回 {运行名: parse_log 的结果}，顺序与 paths 相同。
+    workers 为进程数，默认使用全部 CPU 核心，为 1 时在当前进程中依次解析。
+    """
+    paths = list(paths)
+    workers = min(max(1, workers or os.cpu_count() or 1), len(paths))
+    if workers <= 1:
+        results = [parse_log(path) for path in paths]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_parse_whole_log, paths))
+    return dict(zip(run_names(paths), results))
+
+def _last_per_step(steps, *values):
+    """按步数排序并去重；同一步数出现多次（如从检查点恢复训练）时取最后一次"""
+    order = np.argsort(steps, kind="stable")
+    steps = steps[order]
+    last = np.ones(len(steps), dtype=bool)
+    last[:-1] = steps[1:] != steps[:-1]
+    return (steps[last], *(value[order][last] for value in values))
+
+def merge_runs(runs, metrics=None, grid_step=None):
+    """
+    把多次运行按步数对齐成一张宽表：第一列为步数，其后每个 (运行, 指标) 一列，列名为“运行名:指标列名”，
+    某次运行在某一步没有该指标时为空值（NaN）。metrics 默认为各运行中出现过的全部指标（见 metric_names），
+    运行中没有的指标跳过；lr 与 to_dataframe 一样放大 LR_SCALE 倍。
+    grid_step 不为 None 时重采样到公共的步数网格（从各运行的最小步数起，每 grid_step 步一行），
+    各运行在自己的步数范围内线性插值，范围外为空值；长短悬殊的运行合并后也只有“总步数 / grid_step”行。
+    """
+    import pandas as pd
+
+    if metrics is None:
+        metrics = metric_names(dict.fromkeys(name for columns in runs.values() for name in columns))
+    prepared = {}
+    for name, columns in runs.items():
+        for metric in metrics:
+            if metric not in columns:
+                continue
+            # 各指标分别去掉空值后再按步数去重，只在部分行出现的指标（如 eval_loss）不会被空值覆盖
+            present = ~np.isnan(columns[metric])
+            prepared[name, metric] = _last_per_step(columns[STEP][present], columns[metric][present])
+    non_empty = [steps for steps, _ in prepared.values() if len(steps)]
+    if grid_step is not None:
+        if grid_step <= 0:
+            raise ValueError("重采样步长必须为正整数")
+        if non_empty:
+            low = min(int(steps[0]) for steps in non_empty)
+            high = max(int(steps[-1]) for steps in non_empty)
+            grid = np.arange(low, high + 1, grid_step, dtype=np.int64)
+            if grid[-1] != high:
+                grid = np.append(grid, high)
+        else:
+            grid = np.empty(0, np.int64)
+    else:
+        grid = np.unique(np.concatenate(non_empty)) if non_empty else np.empty(0, np.int64)
+
+    table = {COLUMN_TITLES["step"]: grid}
+    for (name, metric), (steps, value) in prepared.items():
+        if _base_metric(metric) == "lr":
+            value = value * LR_SCALE
+        column = np.full(len(grid), np.nan)
+        if len(steps):
+            if grid_step is None:
+                column[np.searchsorted(grid, steps)] = value
+            else:
+                inside = (grid >= steps[0]) & (grid <= steps[-1])
+                column[inside] = np.interp(grid[inside], steps, value)
+        table[f"{name}:{column_title(metric)}"] = column
+    return pd.DataFrame(table)
+
+# ------------------ 平滑与降采样 ------------------ #
+# 平滑方式：ema 的参数为平滑系数（0 到 1 之间，越大越平滑，与 TensorBoard 的 smoothing 相同），
+# moving_average 的参数为窗口大小（点数）
+SMOOTHING_METHODS = {"ema": 0.6, "moving_average": 100}
+# ema 分块计算时每块内权重的最大衰减（e 的指数）；超过后前一块的影响已小于浮点精度
+_EMA_BLOCK_DECAY = 40.0
+
+def _present(values):
+    """values 中不是 NaN 的位置；稀疏指标只在这些位置上平滑与降采样"""
+    return np.flatnonzero(~np.isnan(values))
+
+def ema(values, weight=SMOOTHING_METHODS["ema"]):
+    """
+    指数移动平均 y[t] = weight * y[t-1] + (1 - weight) * x[t]，从 0 开始并做偏差修正（除以 1 - weight^(t+1)），
+    与 TensorBoard 的平滑曲线相同；NaN 跳过，结果中仍为 NaN。
+    递推本身是串行的，这里把序列切成等长的块排成二维数组：块内用“乘以 weight^-k 后累加再乘回 weight^k”
+    的闭式整体计算，块间只需把前一块的末值按 weight^(k+1) 衰减后加上；
+    块长取到 weight^块长 小于浮点精度为止，前一块之前的影响可以忽略，结果与逐点递推在浮点误差内一致。
+    """
+    if not 0 <= weight < 1:
+        raise ValueError("ema 的平滑系数应在 [0, 1) 之间")
+    values = np.asarray(values, dtype=np.float64)
+    result = values.copy()
+    present = _present(values)
+    x = values[present]
+    n = len(x)
+    if not n or weight == 0:
+        return result
+    block = max(1, min(n, int(_EMA_BLOCK_DECAY / -np.log(weight))))
+    blocks = -(-n // block)
+    padded = np.zeros(blocks * block)
+    padded[:n] = x
+    padded = padded.reshape(blocks, block)
+    decay = weight ** np.arange(block)
+    # 块内从 0 开始的指数移动平均
+    local = (1 - weight) * decay * np.cumsum(padded / decay, axis=1)
+    # 加上前一块末值的衰减
+    local[1:] += np.outer(local[:-1, -1], decay * weight)
+    y = local.ravel()[:n]
+    # 偏差修正只影响开头（weight^(t+1) 在第一块之后已小于浮点精度）
+    head = min(n, block)
+    y[:head] /= 1 - decay[:head] * weight
+    result[present] = y
+    return result
+
+def moving_average(values, window=SMOOTHING_METHODS["moving_average"]):
+    """
+    向后的滑动平均：每个点取它和之前共 window 个点的平均，开头不足 window 个点时取已有的点；NaN 跳过，结果中仍为 NaN。
+    用累加和相减得到各窗口之和，先减去均值再累加，长序列的累计误差更小。
+    """
+    window = int(window)
+    if window < 1:
+        raise ValueError("滑动平均的窗口应为正整数")
+    values = np.asarray(values, dtype=np.float64)
+    result = values.copy()
+    present = _present(values)
+    x = values[present]
+    if not len(x):
+        return result
+    center = x.mean()
+    total = np.concatenate(([0.0], np.cumsum(x - center)))
+    end = np.arange(1, len(x) + 1)
+    start = np.maximum(end - window, 0)
+    result[present] = (total[end] - total[start]) / (end - start) + center
+    return result
+
+def smooth_columns(columns, method="ema", amount=None, metrics=None):
+    """
+    给 parse_log 的结果加上平滑后的列：metrics 中的每个指标（默认全部）在其后加一列“指标名 + SMOOTHED_SUFFIX”。
+    method 为 SMOOTHING_METHODS 中的方式，amount 为其参数，默认取 SMOOTHING_METHODS 中的值。返回新的字典，不修改 columns。
+    """
+    if method not in SMOOTHING_METHODS:
+        raise ValueError(f"未知的平滑方式：{method}")
+    if amount is None:
+        amount = SMOOTHING_METHODS[method]
+    smooth = ema if method == "ema" else moving_average
+    names = metric_names(columns) if metrics is None else [name for name in metrics if name in columns]
+    result = {}
+    for name, column in columns.items():
+        result[name] = column
+        if name in names:
+            result[name + SMOOTHED_SUFFIX] = smooth(column, amount)
+    return result
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留的点的下标（升序）：首尾两点必留，其余的点按 x 的顺序
+    均分成 points - 2 个桶，每个桶留下与“上一个留下的点”和“下一个桶的平均点”构成的三角形面积最大的点。
+    峰谷与拐点得以保留，几千个点画出的曲线与原曲线几乎无法区分。x 应单调不减，不能含 NaN。
+    各桶的平均点用 np.add.reduceat 一次算出，桶内的面积也整体计算，循环次数只与 points 有关。
+    """
+    n = len(x)
+    if points >= n or n <= 2:
+        return np.arange(n)
+    if points < 3:
+        raise ValueError("降采样的目标点数至少为 3")
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 第 i 个桶为 [edges[i], edges[i + 1])，最后一个边界是末点，作为最后一个桶的“下一个桶”
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    sizes = np.diff(np.append(edges, n))
+    mean_x = np.add.reduceat(x, edges) / sizes
+    mean_y = np.add.reduceat(y, edges) / sizes
+    selected = np.empty(points, np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, stop = edges[i], edges[i + 1]
+        # 三角形面积的两倍；同一桶内比较大小，不必除以 2
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (mean_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def downsample_columns(columns, points, metrics=None):
+    """
+    用 LTTB 把 parse_log 的结果降采样：metrics 中的每个指标（默认全部）按（步数, 数值）各自选出至多 points 个点，
+    保留这些点所在的行（取并集），其余行丢弃。结果至多有“points × 指标数”行，
+    各指标的曲线在视觉上与原曲线一致；稀疏指标（如 eval_loss）只在有数值的行中选点。
+    """
+    steps = columns[STEP]
+    names = metric_names(columns) if metrics is None else [name for name in metrics if name in columns]
+    keep = np.zeros(len(steps), dtype=bool)
+    for name in names:
+        present = _present(columns[name])
+        keep[present[lttb(steps[present], columns[name][present], points)]] = True
+    if keep.all():
+        return columns
+    return {name: column[keep] for name, column in columns.items()}
+
+# ------------------ 输出 ------------------ #
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def format_for_path(path):
+    """按扩展名判断输出格式，无法识别时返回 None"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".xls":
+        return "excel"
+    for fmt, suffix in OUTPUT_FORMATS.items():
+        if extension == suffix:
+            return fmt
+    return None
+
+def choose_format(rows):
+    """
+    auto 时的输出格式：不超过 AUTO_EXCEL_MAX_ROWS 行导出 Excel，
+    更大的表在装有 pyarrow 时导出 Parquet（写入快、体积小、保留类型），否则导出 CSV。
+    """
+    if rows <= AUTO_EXCEL_MAX_ROWS:
+        return "excel"
+    return "parquet" if _has_pyarrow() else "csv"
+
+def write_table(df, output_path, fmt="auto"):
+    """
+    把表格写入 output_path，返回实际写出的路径。fmt 为 OUTPUT_FORMATS 中的格式或 "auto"：
+    auto 时先按 output_path 的扩展名，扩展名无法识别时按行数选择（见 choose_format），
+    并把扩展名换成所选格式的。Excel 超过 EXCEL_MAX_ROWS 行时抛出 ValueError，不会静默截断。
+    CSV 在装有 pyarrow 时用 pyarrow.csv 写出，比 DataFrame.to_csv 快得多。
+    """
+    if fmt == "auto":
+        fmt = format_for_path(output_path)
+        if fmt is None:
+            fmt = choose_format(len(df))
+            output_path = os.path.splitext(output_path)[0] + OUTPUT_FORMATS[fmt]
+    elif fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式：{fmt}")
+
+    if fmt == "excel":
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(
+                f"共 {len(df)} 行，超过 Excel 的行数上限 {EXCEL_MAX_ROWS}，请改用 csv、parquet 或 feather 格式"
+            )
+        df.to_excel(output_path, index=False)
+    elif fmt == "csv":
+        if _has_pyarrow():
+            import pyarrow
+            import pyarrow.csv
+            pyarrow.csv.write_csv(pyarrow.Table.from_pandas(df, preserve_index=False), output_path)
+        else:
+            df.to_csv(output_path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(output_path, index=False)
+    else:
+        # feather 不支持非默认索引，先重置
+        df.reset_index(drop=True).to_feather(output_path)
+    return output_path
+
+# ------------------ 跟踪模式 ------------------ #
+# 跟踪时轮询日志的间隔（秒）
+FOLLOW_INTERVAL_SECONDS = 1.0
+# 记住 offset 之前的这么多字节，文件被改写时用来判断截断
+FOLLOW_TAIL_BYTES = 64
+
+def _file_identity(stat):
+    """[设备号, inode]，日志被轮转（改名后新建同名文件）时会变化"""
+    return [stat.st_dev, stat.st_ino]
+
+class LogFollower:
+    """
+    跟踪仍在写入的日志。poll() 只读取上次之后追加的完整行，返回与 parse_log 相同形式的新记录。
+    offset 是已经解析到的字节位置（总在换行之后），末尾尚未写完的半行留到下一次再读；
+    identity 记录文件的 [设备号, inode]，tail 是 offset 之前的最后 FOLLOW_TAIL_BYTES 个字节，
+    last_step 是已读到的最后一个步数，新读到的行在第一个步数之前的记录沿用它；
+    四者构成检查点（checkpoint()），重启后从这里继续。metrics 不为 None 时只提取其中的指标。
+
+    - 轮转：同名路径换成了另一个文件时，先把旧文件剩余的完整行读完，再从新文件开头读起；
+    - 截断：文件变得比 offset 短，或修改时间变化且 offset 之前的字节与 tail 不同时，从头读起。
+    没有新内容时每次轮询只需两次 stat。
+    """
+
+    def __init__(self, path, offset=0, identity=None, tail=b"", last_step=None, chunk_size=READ_CHUNK_BYTES,
+                 metrics=None):
+        self.path = path
+        self.offset = offset
+        self.identity = identity
+        self.tail = tail
+        self.last_step = last_step
+        self.chunk_size = chunk_size
+        self.metrics = None if metrics is None else tuple(metrics)
+        self.rotations = 0
+        self.truncations = 0
+        self._file = None
+        self._mtime_ns = None
+
+    def checkpoint(self):
+        return {"path": os.path.abspath(self.path), "offset": self.offset, "identity": self.identity,
+                "tail": self.tail.hex(), "last_step": self.last_step}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_appended(self):
+        """从 offset 读到文件末尾，解析其中的完整行，返回各块 parse_chunk 的结果"""
+        results = []
+        rest = b""
+        self._file.seek(self.offset)
+        while True:
+            data = self._file.read(self.chunk_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b"\n")
+            if end < 0:
+                rest = data
+                continue
+            results.append(parse_chunk(data[:end + 1], metrics=self.metrics))
+            self.offset += end + 1
+            self.tail = (self.tail + data[:end + 1])[-FOLLOW_TAIL_BYTES:]
+            rest = data[end + 1:]
+        return results
+
+    def _rewritten(self):
+        """offset 之前的字节是否已经不是 tail（文件被截断后重新写到了 offset 以上）"""
+        if not self.tail or self.offset < len(self.tail):
+            return False
+        self._file.seek(self.offset - len(self.tail))
+        return self._file.read(len(self.tail)) != self.tail
+
+    def poll(self):
+        """返回自上次以来追加的记录（形式同 parse_log），没有新记录时各数组为空"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        results = []
+        if self._file is not None and (stat is None or _file_identity(stat) != self.identity):
+            # 日志已被轮转：读完旧文件中剩余的行
+            results += self._read_appended()
+            self.close()
+            self.offset = 0
+            self.identity = None
+            self.tail = b""
+            self.rotations += 1
+        if stat is None:
+            return self._concat(results)
+        if self._file is None:
+            self._file = open(self.path, "rb")
+            identity = _file_identity(os.fstat(self._file.fileno()))
+            if self.identity is not None and identity != self.identity:
+                # 检查点记录的是轮转前的文件
+                self.offset = 0
+                self.tail = b""
+                self.rotations += 1
+            self.identity = identity
+        stat = os.fstat(self._file.fileno())
+        if stat.st_mtime_ns != self._mtime_ns:
+            if stat.st_size < self.offset or self._rewritten():
+                self.offset = 0
+                self.tail = b""
+                self.truncations += 1
+            self._mtime_ns = stat.st_mtime_ns
+        if stat.st_size > self.offset:
+            results += self._read_appended()
+        return self._concat(results)
+
+    def _concat(self, results):
+        columns = _concat_chunks(results, self.last_step)
+        last_steps = [last_step for _, last_step in results if last_step is not None]
+        if last_steps:
+            self.last_step = last_steps[-1]
+        elif len(columns[STEP]):
+            self.last_step = int(columns[STEP][-1])
+        return columns
+
+def checkpoint_path_for(output_path):
+    """跟踪模式的检查点文件，放在输出文件旁边"""
+    return output_path + ".offset.json"
+
+def load_checkpoint(checkpoint_path, log_path):
+    """读取检查点，返回 (offset, identity, tail, last_step)；没有检查点或记录的是另一个日志时从头开始"""
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("path") == os.path.abspath(log_path):
+            return (checkpoint.get("offset", 0), checkpoint.get("identity"),
+                    bytes.fromhex(checkpoint.get("tail", "")), checkpoint.get("last_step"))
+    except (OSError, ValueError):
+        pass
+    return 0, None, b"", None
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """写入检查点；先写临时文件再替换，避免中途退出留下损坏的检查点"""
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
+def _csv_header(path):
+    """CSV 文件的表头（列名列表），文件不存在或为空时返回 None"""
+    import csv
+
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return next(csv.reader(f), None)
+    except FileNotFoundError:
+        return None
+
+def append_csv(df, output_path):
+    """
+    把新行追加到 CSV 文件末尾，文件不存在或为空时先写表头。
+    新行缺少表头中的列时留空；新行带来了表头中没有的指标（日志中途才开始输出的指标）时，
+    读入已有内容、加上新列后整个重写一次，之后的追加照常进行。
+    """
+    import pandas as pd
+
+    header = _csv_header(output_path)
+    if header is None:
+        df.to_csv(output_path, index=False)
+        return
+    added = [column for column in df.columns if column not in header]
+    if added:
+        existing = pd.read_csv(output_path, encoding="utf-8")
+        pd.concat([existing, df], ignore_index=True)[header + added].to_csv(output_path, index=False)
+        return
+    with open(output_path, "a", encoding="utf-8", newline="") as f:
+        df.reindex(columns=header).to_csv(f, header=False, index=False)
+
+def follow_log(path, output_path=None, checkpoint_path=None, interval=FOLLOW_INTERVAL_SECONDS,
+               stop_event=None, callback=None, metrics=None):
+    """
+    持续跟踪日志，直到 stop_event（threading.Event）被设置或收到 KeyboardInterrupt。
+    新记录追加到 CSV 文件 output_path（可选），之后更新检查点，重启后从检查点继续；
+    检查点默认放在 output_path 旁边，没有 output_path 时不保存检查点。
+    先追加再写检查点，两者之间退出的话，重启后最后一批记录会重复一次，但不会丢失。
+    callback(新记录) 在每次读到新记录时调用。metrics 不为 None 时只提取其中的指标。返回本次运行读到的记录数。
+    """
+    if checkpoint_path is None and output_path:
+        checkpoint_path = checkpoint_path_for(output_path)
+    offset, identity, tail, last_step = (
+        load_checkpoint(checkpoint_path, path) if checkpoint_path else (0, None, b"", None)
+    )
+    saved = (offset, identity)
+    total = 0
+    with LogFollower(path, offset, identity, tail, last_step, metrics=metrics) as follower:
+        try:
+            while True:
+                columns = follower.poll()
+                count = len(columns["step"])
+                if count:
+                    total += count
+                    if output_path:
+                        append_csv(to_dataframe(columns, metrics), output_path)
+                    if callback:
+                        callback(columns)
+                if checkpoint_path and (follower.offset, follower.identity) != saved:
+                    save_checkpoint(checkpoint_path, follower.checkpoint())
+                    saved = (follower.offset, follower.identity)
+                if stop_event is not None:
+                    if stop_event.wait(interval):
+                        break
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+    return total
+
+# ------------------ 批量转换 ------------------ #
+# 输入为目录时转换其中这些扩展名的日志（不含子目录）
+LOG_EXTENSIONS = (".jsonl", ".txt", ".log")
+
+def expand_inputs(inputs):
+    """把输入中的目录展开为其中的日志文件（LOG_EXTENSIONS，按文件名排序），文件原样保留"""
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths += sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(LOG_EXTENSIONS) and os.path.isfile(os.path.join(path, name))
+            )
+        else:
+            paths.append(path)
+    return paths
+
+def convert_log(path, output_path, fmt="auto", metrics=None, smoothing=None, amount=None, points=None, workers=1):
+    """
+    转换一个日志：parse_log 解析（workers 个进程，见 parse_log），smoothing 不为 None 时按 smooth_columns 加上平滑列，
+    points 不为 None 时用 downsample_columns 降采样，再用 write_table 写出。metrics 为要导出的指标，默认全部。
+    返回 {"input", "output"（实际写出的路径）, "rows", "metrics"}。
+    """
+    columns = parse_log(path, workers=workers, metrics=metrics)
+    # 先在全部数据上平滑，再降采样，平滑曲线不受降采样影响
+    if smoothing:
+        columns = smooth_columns(columns, smoothing, amount, metrics)
+    if points:
+        columns = downsample_columns(columns, points)
+    names = metric_names(columns)
+    if metrics is not None:
+        # 指定的指标即使日志中没有也导出一列空值，各次运行的表结构一致
+        names = [name for metric in metrics for name in (metric, metric + SMOOTHED_SUFFIX)
+                 if name in columns or name == metric]
+    df = to_dataframe(columns, names)
+    output_path = write_table(df, output_path, fmt)
+    return {"input": path, "output": output_path, "rows": len(df), "metrics": names}
+
+def _convert_task(task):
+    """进程池任务：转换一个日志，出错时返回错误信息而不是抛出，不影响其他文件"""
+    path, output_path, options = task
+    try:
+        return convert_log(path, output_path, **options)
+    except Exception as e:
+        return {"input": path, "output": None, "error": f"{type(e).__name__}: {e}"}
+
+def output_path_for(path, name, output_dir=None, fmt="auto"):
+    """
+    批量转换时 path 的输出路径：output_dir 为 None 时放在日志旁边，否则放在 output_dir 中并以运行名 name
+    （见 run_names，目录分隔符换成 “_”）为文件名，避免各运行目录下的同名日志互相覆盖。
+    fmt 为 auto 时不带扩展名，由 write_table 按行数选择格式并补上。
+    """
+    if output_dir is None:
+        base = os.path.splitext(path)[0]
+    else:
+        base = os.path.join(output_dir, name.replace("/", "_"))
+    return base if fmt == "auto" else base + OUTPUT_FORMATS[fmt]
+
+def convert_logs(paths, output_dir=None, fmt="auto", metrics=None, smoothing=None, amount=None, points=None,
+                 workers=None, progress_callback=None):
+    """
+    批量转换多个日志，返回与 paths 顺序相同的结果列表（见 convert_log），失败的文件带 "error" 且 output 为 None。
+    多个文件时每个文件一个进程池任务（workers 个进程，默认全部 CPU 核心，为 1 时在当前进程中依次转换）；
+    只有一个文件时改为在该文件内部按块并行。progress_callback(已完成数, 总数) 在调用线程中执行。
+    """
+    paths = list(paths)
+    if fmt != "auto" and fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式：{fmt}")
+    if smoothing is not None and smoothing not in SMOOTHING_METHODS:
+        raise ValueError(f"未知的平滑方式：{smoothing}")
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    options = {"fmt": fmt, "metrics": None if metrics is None else tuple(metrics),
+               "smoothing": smoothing, "amount": amount, "points": points}
+    tasks = [(path, output_path_for(path, name, output_dir, fmt), options)
+             for path, name in zip(paths, run_names(paths))]
+    workers = max(1, workers or os.cpu_count() or 1)
+    results = []
+    if len(tasks) == 1 or workers == 1:
+        for path, output_path, task_options in tasks:
+            results.append(_convert_task((path, output_path, dict(task_options, workers=workers))))
+            if progress_callback:
+                progress_callback(len(results), len(tasks))
+        return results
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        for result in executor.map(_convert_task, tasks):
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results), len(tasks))
+    return results
+
+# ------------------ 命令行入口 ------------------ #
+def build_arg_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="把训练日志批量转换为 CSV/Parquet/Feather/Excel 表格（步数与各指标各一列）"
+    )
+    parser.add_argument("inputs", nargs="+", help="日志文件或目录（目录中的 .jsonl/.txt/.log 文件）")
+    parser.add_argument("-o", "--output-dir", default=None, help="输出目录，默认放在各日志旁边")
+    parser.add_argument("-f", "--format", choices=["auto", *OUTPUT_FORMATS], default="auto",
+                        help="输出格式，auto 按行数选择（见 choose_format）")
+    parser.add_argument("-m", "--metrics", nargs="+", default=None,
+                        help="只导出这些指标（如 loss lr grad_norm），默认导出日志中出现的全部指标；指定后解析也更快")
+    parser.add_argument("--smoothing", choices=list(SMOOTHING_METHODS), default=None, help="平滑方式，平滑值作为新列导出")
+    parser.add_argument("--smoothing-amount", type=float, default=None,
+                        help="ema 的平滑系数（0 到 1）或滑动平均的窗口大小，默认见 SMOOTHING_METHODS")
+    parser.add_argument("--points", type=int, default=None, help="用 LTTB 把每条曲线降采样到约这么多个点")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="并行进程数，默认为 CPU 核数")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+    return parser
+
+def main(argv=None):
+    """命令行入口，返回进程退出码：全部成功为 0，有文件失败为 1，参数错误为 2"""
+    args = build_arg_parser().parse_args(argv)
+    paths = expand_inputs(args.inputs)
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing or not paths:
+        print(f"错误：找不到日志文件：{'、'.join(missing) or '、'.join(args.inputs)}", file=sys.stderr)
+        return 2
+    amount = args.smoothing_amount
+    if args.smoothing == "ema" and amount is not None and not 0 <= amount < 1:
+        print("错误：ema 的平滑系数应在 [0, 1) 之间", file=sys.stderr)
+        return 2
+    if args.smoothing == "moving_average" and amount is not None:
+        if amount != int(amount) or amount < 1:
+            print("错误：滑动平均的窗口应为正整数", file=sys.stderr)
+            return 2
+        amount = int(amount)
+    if args.points is not None and args.points < 3:
+        print("错误：降采样的目标点数至少为 3", file=sys.stderr)
+        return 2
+
+    def on_progress(done, total):
+        print(f"转换中... {done}/{total}", file=sys.stderr)
+
+    results = convert_logs(
+        paths, args.output_dir, args.format,
+        metrics=args.metrics, smoothing=args.smoothing, amount=amount, points=args.points,
+        workers=args.workers, progress_callback=None if args.quiet else on_progress,
+    )
+    failed = 0
+    for result in results:
+        if result.get("error"):
+            failed += 1
+            print(f"失败：{result['input']}：{result['error']}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{result['input']} -> {result['output']}（{result['rows']} 行）", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
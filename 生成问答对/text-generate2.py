@@ -1,5 +1,6 @@
 import os
 import json
+import importlib.util
 import requests
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -11,6 +12,18 @@ from PyQt5.QtCore import Qt, pyqtSignal, QObject, QTimer, QSettings, QThread
 from PyQt5.QtGui import QTextCursor, QFont, QIcon, QTextCharFormat, QColor
 CONFIG_FILE = "config.ini"
 
+def _load_cleaner_module(name):
+    """按文件路径导入 文件清洗/ 中的模块；两个目录都不是包，这样不必改动 sys.path"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "文件清洗", name + ".py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# 清洗工具对正文分段后（记录中带 sections 字段），只把需要的部分发给模型；
+# 案件内容的组织与清洗工具共用 文件清洗/judgment_sections.py
+build_case_content = _load_cleaner_module("judgment_sections").build_case_content
+
 def calculate_auto_max_tokens(prompt, context_limit=4096):
     # 粗略估算：每4个字符大约对应1个token
     estimated_tokens = len(prompt) // 4
@@ -267,7 +280,7 @@ class Worker(QObject):
 
                     try:
                         data = json.loads(line.strip())
-                        case_content = json.dumps(data, ensure_ascii=False, indent=2)
+                        case_content = build_case_content(data)
                         
                         result_line = self.process_single_item(case_content)
                         if result_line: